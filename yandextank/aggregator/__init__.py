@@ -1,2 +1,2 @@
-from .chopper import TimeChopper  # noqa
+from .chopper import TimeChopper, BufferedTimeChopper  # noqa
 from .tank_aggregator import TankAggregator  # noqa
@@ -1,9 +1,12 @@
 # -*- coding: UTF-8 -*-
 import logging
 import numpy as np
+import pandas as pd
 import time
 from collections import Counter
 
+from .histogram import LogLinearBins, counts_percentiles, counts_to_aggregate
+
 logger = logging.getLogger(__name__)
 
 phout_columns = [
@@ -40,8 +43,17 @@ class Worker(object):
     Aggregate Pandas dataframe or dict with numpy ndarrays in it
     """
 
-    def __init__(self, config, verbose_histogram):
-        if verbose_histogram:
+    def __init__(self, config, verbose_histogram, histogram_digits=None):
+        """
+        :param histogram_digits: significant digits of log-linear (HdrHistogram-style)
+            response time histograms used in verbose mode. Quantiles are then read
+            from histograms too. If None, verbose mode uses fixed bins and exact quantiles
+        """
+        self.log_linear_bins = None
+        if verbose_histogram and histogram_digits:
+            self.log_linear_bins = LogLinearBins(histogram_digits)
+            bins = self.log_linear_bins.edges
+        elif verbose_histogram:
             bins = np.linspace(0, 4990, 500)  # 10µs accuracy
             bins = np.append(bins, np.linspace(5000, 9900, 50))  # 100µs accuracy
             bins = np.append(bins, np.linspace(10, 499, 490) * 1000)  # 1ms accuracy
@@ -77,6 +89,19 @@ class Worker(object):
             "count": self._count,
             "len": self._len,
         }
+        self.grouped_aggregators = {
+            "hist": self._grouped_histogram,
+            "q": self._grouped_quantiles,
+            "mean": self._grouped_mean,
+            "total": self._grouped_total,
+            "min": self._grouped_min,
+            "max": self._grouped_max,
+            "count": self._grouped_count,
+            "len": self._grouped_len,
+        }
+        if self.log_linear_bins is not None:
+            self.grouped_aggregators["hist"] = self._grouped_log_linear_histogram
+            self.grouped_aggregators["q"] = self._grouped_log_linear_quantiles
 
     def _histogram(self, series):
         data, bins = np.histogram(series, bins=self.bins)
@@ -111,11 +136,206 @@ class Worker(object):
         }
 
     def aggregate(self, data):
+        if self.log_linear_bins is not None:
+            size = len(data[next(iter(self.config))])
+            return self._aggregate_grouped(data, np.zeros(size, dtype=np.intp), [], 1)[1]
         return {
             key: {aggregate: self.aggregators.get(aggregate)(data[key]) for aggregate in self.config[key]}
             for key in self.config
         }
 
+    def aggregate_grouped(self, data, groupby):
+        """
+        Aggregate every group and the whole chunk in one pass per column.
+
+        Rows are ordered by group once, per-group statistics are computed with
+        ufunc.reduceat / bincount and overall statistics are merged from the
+        per-group ones. Rows with an empty group key only go to overall, as
+        with DataFrame.groupby.
+
+        :returns: (tagged, overall), same dicts as aggregate() gives for each
+            group and for the whole chunk
+        """
+        codes, groups = pd.factorize(data[groupby], sort=True)
+        n_groups = len(groups)
+        if (codes < 0).any():
+            codes = np.where(codes < 0, n_groups, codes)
+            n_groups += 1
+        return self._aggregate_grouped(data, codes, groups, n_groups)
+
+    def _aggregate_grouped(self, data, codes, groups, n_groups):
+        order = np.argsort(codes, kind='stable')
+        grouping = _Grouping(codes, order, np.bincount(codes, minlength=n_groups))
+        tagged = {group: {} for group in groups}
+        overall = {}
+        for key in self.config:
+            values = np.asarray(data[key])
+            for aggregate in self.config[key]:
+                by_group, total = self.grouped_aggregators[aggregate](values, grouping)
+                overall.setdefault(key, {})[aggregate] = total
+                for group, result in zip(groups, by_group):
+                    tagged[group].setdefault(key, {})[aggregate] = result
+        return tagged, overall
+
+    def _grouped_histogram(self, values, grouping):
+        n_bins = len(self.bins) - 1
+        idx = np.searchsorted(self.bins, values, side='right') - 1
+        idx[values == self.bins[-1]] = n_bins - 1
+        valid = (idx >= 0) & (idx < n_bins)
+        hists = np.bincount(
+            grouping.codes[valid] * n_bins + idx[valid], minlength=grouping.n_groups * n_bins
+        ).reshape(grouping.n_groups, n_bins)
+        labels = self.bins[1:]
+
+        def to_dict(hist):
+            mask = hist > 0
+            return {"data": hist[mask].tolist(), "bins": labels[mask].tolist()}
+
+        return [to_dict(hist) for hist in hists], to_dict(hists.sum(axis=0))
+
+    def _grouped_quantiles(self, values, grouping):
+        ordered = values[np.lexsort((values, grouping.codes))]
+        percentiles = list(self.percentiles)
+        by_group = _sorted_percentiles(ordered, grouping.starts, grouping.sizes, self.percentiles)
+        total = _sorted_percentiles(np.sort(values), np.array([0]), np.array([len(values)]), self.percentiles)
+        return (
+            [{"q": percentiles, "value": list(row)} for row in by_group],
+            {"q": percentiles, "value": list(total[0])},
+        )
+
+    def _log_linear_counts(self, values, grouping):
+        """
+        Per-group counts of log-linear bins, only bins hit by any value are kept
+
+        :returns: (counts of shape (n_groups, n_present), indexes of present bins)
+        """
+        idx = self.log_linear_bins.index(values)
+        present = np.flatnonzero(np.bincount(idx, minlength=self.log_linear_bins.size))
+        compact = np.zeros(self.log_linear_bins.size, dtype=np.intp)
+        compact[present] = np.arange(len(present))
+        counts = np.bincount(
+            grouping.codes * len(present) + compact[idx], minlength=grouping.n_groups * len(present)
+        ).reshape(grouping.n_groups, len(present))
+        return counts, present
+
+    def _grouped_log_linear_histogram(self, values, grouping):
+        counts, present = grouping.cached(self._log_linear_counts, values)
+        labels = self.log_linear_bins.labels[present]
+        return (
+            [counts_to_aggregate(row, labels) for row in counts],
+            counts_to_aggregate(counts.sum(axis=0), labels),
+        )
+
+    def _grouped_log_linear_quantiles(self, values, grouping):
+        counts, present = grouping.cached(self._log_linear_counts, values)
+        highest_equivalent = self.log_linear_bins.labels[present] - 1
+        ordered = grouping.sort(values)
+        mins = np.minimum.reduceat(ordered, grouping.starts)
+        maxes = np.maximum.reduceat(ordered, grouping.starts)
+        by_group = counts_percentiles(counts, highest_equivalent, self.percentiles, mins, maxes)
+        total = counts_percentiles(
+            counts.sum(axis=0, keepdims=True), highest_equivalent, self.percentiles, [mins.min()], [maxes.max()]
+        )
+        percentiles = list(self.percentiles)
+        return (
+            [{"q": percentiles, "value": list(row)} for row in by_group],
+            {"q": percentiles, "value": list(total[0])},
+        )
+
+    @staticmethod
+    def _grouped_total(values, grouping):
+        totals = np.add.reduceat(grouping.sort(values), grouping.starts)
+        return totals.tolist(), totals.sum().item()
+
+    @staticmethod
+    def _grouped_mean(values, grouping):
+        totals = np.add.reduceat(grouping.sort(values), grouping.starts)
+        return (totals / grouping.sizes).tolist(), (totals.sum() / grouping.sizes.sum()).item()
+
+    @staticmethod
+    def _grouped_max(values, grouping):
+        maxes = np.maximum.reduceat(grouping.sort(values), grouping.starts)
+        return maxes.tolist(), maxes.max().item()
+
+    @staticmethod
+    def _grouped_min(values, grouping):
+        mins = np.minimum.reduceat(grouping.sort(values), grouping.starts)
+        return mins.tolist(), mins.min().item()
+
+    @staticmethod
+    def _grouped_count(values, grouping):
+        keys, inverse = np.unique(values, return_inverse=True)
+        counts = np.bincount(
+            grouping.codes * len(keys) + inverse, minlength=grouping.n_groups * len(keys)
+        ).reshape(grouping.n_groups, len(keys))
+        keys = [str(k) for k in keys.tolist()]
+
+        def to_dict(row):
+            return {keys[i]: row[i] for i in np.flatnonzero(row).tolist()}
+
+        return [to_dict(row.tolist()) for row in counts], to_dict(counts.sum(axis=0).tolist())
+
+    @staticmethod
+    def _grouped_len(values, grouping):
+        return grouping.sizes.tolist(), len(values)
+
+
+class _Grouping(object):
+    """
+    Row order and segment bounds of a chunk sorted by group code
+    """
+
+    def __init__(self, codes, order, sizes):
+        self.codes = codes
+        self.order = order
+        self.sizes = sizes
+        self.n_groups = len(sizes)
+        self.starts = np.concatenate(([0], np.cumsum(sizes[:-1])))
+        self._cache = {}
+
+    def cached(self, func, values):
+        """
+        func(values, self), computed once for the same values array
+        """
+        cached_values, result = self._cache.get(func, (None, None))
+        if cached_values is not values:
+            result = func(values, self)
+            self._cache[func] = (values, result)
+        return result
+
+    def sort(self, values):
+        return self.cached(_Grouping._sort, values)
+
+    @staticmethod
+    def _sort(values, grouping):
+        return values[grouping.order]
+
+
+def _sorted_percentiles(ordered, starts, sizes, percentiles):
+    """
+    Linear-interpolated percentiles of consecutive sorted segments,
+    bit-for-bit equal to np.percentile of each segment
+
+    :returns: array of shape (len(starts), len(percentiles))
+    """
+    quantiles = np.true_divide(percentiles, 100)
+    sizes = sizes[:, None]
+    virtual = (sizes - 1) * quantiles
+    previous = np.floor(virtual)
+    gamma = virtual - previous
+    previous = previous.astype(np.intp)
+    following = previous + 1
+    above_bounds = virtual >= sizes - 1
+    last = np.broadcast_to(sizes - 1, virtual.shape)
+    previous[above_bounds] = last[above_bounds]
+    following[above_bounds] = last[above_bounds]
+    lower = ordered[starts[:, None] + previous]
+    upper = ordered[starts[:, None] + following]
+    diff = upper - lower
+    result = np.asanyarray(lower + diff * gamma)
+    np.subtract(upper, diff * (1 - gamma), out=result, where=gamma >= 0.5, casting='unsafe')
+    return result
+
 
 class DataPoller:
     def __init__(self, *, poll_period=0.5, max_wait):
@@ -155,19 +375,19 @@ def to_utc(ts):
 
 
 class Aggregator(object):
-    def __init__(self, source, config, verbose_histogram=True):
-        self.worker = Worker(config, verbose_histogram)
+    def __init__(self, source, config, verbose_histogram=True, histogram_digits=None):
+        self.worker = Worker(config, verbose_histogram, histogram_digits)
         self.source = source
         self.groupby = 'tag'
 
     def __iter__(self):
         for ts, chunk, rps in self.source:
-            by_tag = list(chunk.groupby(self.groupby))
             start_time = time.time()
+            tagged, overall = self.worker.aggregate_grouped(chunk, self.groupby)
             result = {
                 "ts": ts,
-                "tagged": {tag: self.worker.aggregate(data) for tag, data in by_tag},
-                "overall": self.worker.aggregate(chunk),
+                "tagged": tagged,
+                "overall": overall,
                 "counted_rps": rps,
             }
             logger.debug("Aggregation time: %.2fms", (time.time() - start_time) * 1000)
@@ -3,6 +3,9 @@ Split incoming DataFrames into chunks, cache them, union chunks with same key
 and pass to the underlying aggregator.
 """
 
+import heapq
+
+import numpy as np
 import pandas as pd
 
 
@@ -48,3 +51,67 @@ class TimeChopper(object):
         result = self.cache.pop(ts, None)
         cardinality = len(result) if result is not None else 0
         return ts, result, cardinality
+
+
+class BufferedTimeChopper(object):
+    """
+    Drop-in replacement for TimeChopper that does not concat DataFrames on every
+    incoming chunk. Each chunk is stably sorted by index once and cut into
+    contiguous per-second slices; slices are kept as lists of column arrays
+    and are combined into a single DataFrame only when the second is emitted.
+    Produces the same (<timestamp>, <dataframe>, <cardinality>) tuples.
+    """
+
+    def __init__(self, sources):
+        self.sources = {i: src for i, src in enumerate(sources)}
+        self.recent_ts = {i: 0 for i in range(len(self.sources))}
+        self.cache = {}
+        self._pending = []
+        self._columns = None
+        self._index_name = None
+
+    def __iter__(self):
+        while self.sources:
+            try:
+                while True:
+                    for n, source in self.sources.items():
+                        chunk = next(source)
+                        if chunk is not None and len(chunk):
+                            self.recent_ts[n] = chunk.index[-1]
+                            self._put(chunk)
+                    last_ready_ts = min(self.recent_ts.values()) - 1
+                    while self._pending and self._pending[0] <= last_ready_ts:
+                        yield self.__get_result()
+            except StopIteration:
+                self.sources.pop(n)
+                self.recent_ts.pop(n)
+        while self._pending:
+            yield self.__get_result()
+
+    def _put(self, chunk):
+        if self._columns is None:
+            self._columns = list(chunk.columns)
+            self._index_name = chunk.index.name
+        keys = chunk.index.to_numpy()
+        columns = [chunk[column].to_numpy() for column in self._columns]
+        if not chunk.index.is_monotonic_increasing:
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+            columns = [values[order] for values in columns]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+        for ts, start, end in zip(keys[starts].tolist(), starts.tolist(), ends.tolist()):
+            pieces = self.cache.get(ts)
+            if pieces is None:
+                pieces = self.cache[ts] = []
+                heapq.heappush(self._pending, ts)
+            pieces.append([values[start:end] for values in columns])
+
+    def __get_result(self):
+        ts = heapq.heappop(self._pending)
+        pieces = self.cache.pop(ts)
+        columns = [np.concatenate(parts) for parts in zip(*pieces)]
+        cardinality = len(columns[0]) if columns else 0
+        index = pd.Index(np.full(cardinality, ts), name=self._index_name)
+        result = pd.DataFrame(dict(zip(self._columns, columns)), index=index, columns=self._columns, copy=False)
+        return ts, result, cardinality
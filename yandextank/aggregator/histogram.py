@@ -0,0 +1,243 @@
+"""
+HdrHistogram-style log-linear histograms for response times.
+
+Values (microseconds) are split into power-of-two buckets, each divided
+linearly into a fixed number of sub-buckets, so the relative error of a bin
+never exceeds the configured number of significant digits. Bin index is a
+couple of integer operations on the value, no bin search is needed, and
+histograms with the same layout are merged by adding their counts.
+"""
+
+import numpy as np
+
+
+class LogLinearBins(object):
+    """
+    Log-linear bin layout, same as HdrHistogram with unit magnitude 0.
+
+    Bin ``i`` holds values in ``[edges[i], edges[i + 1])``, values above
+    ``max_value`` go to the last bin, negative ones to the first.
+    """
+
+    def __init__(self, significant_digits=2, max_value=3600 * 10**6):
+        if not 1 <= significant_digits <= 5:
+            raise ValueError('significant_digits should be between 1 and 5, got {}'.format(significant_digits))
+        self.significant_digits = significant_digits
+        self.max_value = int(max_value)
+        self._sub_bucket_magnitude = int(np.ceil(np.log2(2 * 10**significant_digits)))
+        self._half_magnitude = self._sub_bucket_magnitude - 1
+        self._half_count = 1 << self._half_magnitude
+        self._sub_bucket_mask = (1 << self._sub_bucket_magnitude) - 1
+        self.size = int(self._index(np.array([self.max_value]))[0]) + 1
+        self.edges = self._lowest_value(np.arange(self.size + 1))
+
+    def _index(self, values):
+        # bit length of the value, exact for values below 2**53
+        bit_length = np.frexp((values | self._sub_bucket_mask).astype(np.float64))[1]
+        bucket = bit_length - self._sub_bucket_magnitude
+        sub_bucket = values >> bucket
+        return ((bucket + 1) << self._half_magnitude) + sub_bucket - self._half_count
+
+    def _lowest_value(self, index):
+        bucket = (index >> self._half_magnitude) - 1
+        sub_bucket = (index & (self._half_count - 1)) + self._half_count
+        first = bucket < 0
+        sub_bucket[first] -= self._half_count
+        bucket[first] = 0
+        return sub_bucket << bucket
+
+    def index(self, values):
+        """
+        :param values: array-like of numbers
+        :returns: int64 array of bin indexes
+        """
+        values = np.clip(np.asarray(values, dtype=np.int64), 0, self.max_value)
+        return self._index(values)
+
+    @property
+    def labels(self):
+        """Exclusive upper edges of bins, used as bin labels in aggregates"""
+        return self.edges[1:]
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, LogLinearBins)
+            and self.significant_digits == other.significant_digits
+            and self.max_value == other.max_value
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class Histogram(object):
+    """
+    Dense mergeable histogram over LogLinearBins
+    """
+
+    def __init__(self, bins=None, counts=None):
+        """
+        :type bins: LogLinearBins
+        """
+        self.bins = bins if bins is not None else LogLinearBins()
+        self.counts = np.zeros(self.bins.size, dtype=np.int64) if counts is None else counts
+
+    def record(self, values):
+        self.counts += np.bincount(self.bins.index(values), minlength=self.bins.size)
+
+    def record_aggregate(self, hist):
+        """
+        Add aggregator hist ({"data": [...], "bins": [...]}) to this histogram.
+        Each count is placed into the bin holding the value right below its label,
+        so histograms with other bin layouts are accepted too.
+        """
+        if not hist['data']:
+            return
+        index = self.bins.index(np.asarray(hist['bins']) - 1)
+        np.add.at(self.counts, index, np.asarray(hist['data'], dtype=np.int64))
+
+    def merge(self, other):
+        if self.bins != other.bins:
+            raise ValueError('Cannot merge histograms with different bins')
+        self.counts += other.counts
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    def to_aggregate(self):
+        return counts_to_aggregate(self.counts, self.bins.labels)
+
+    def percentiles(self, percentiles):
+        """
+        :returns: float array of percentile values, NaN for empty histogram
+        """
+        return counts_percentiles(self.counts[None, :], self.bins.labels - 1, percentiles)[0]
+
+
+def counts_to_aggregate(counts, labels):
+    mask = counts > 0
+    return {"data": counts[mask].tolist(), "bins": labels[mask].tolist()}
+
+
+def counts_percentiles(counts, values, percentiles, lowest=None, highest=None):
+    """
+    Percentiles of every row of a 2d array of bin counts.
+
+    Percentile value is the highest value equivalent to the bin where cumulative
+    count reaches the (rounded) percentile rank, as HdrHistogram does. If exact extremes are
+    known they are used to bound the result, so 100th percentile is exact.
+
+    :param values: highest value equivalent to each bin (column)
+    :param lowest: optional array of row minimums
+    :param highest: optional array of row maximums
+    :returns: float array of shape (len(counts), len(percentiles))
+    """
+    n_rows, n_bins = counts.shape
+    cumulative = np.cumsum(counts, axis=1)
+    totals = cumulative[:, -1]
+    ranks = np.floor(np.asarray(percentiles, dtype=np.float64)[None, :] / 100 * totals[:, None] + 0.5)
+    ranks = np.maximum(ranks, 1).astype(np.int64)
+    # search all rows at once: shift rows so that their cumulative counts do not overlap
+    shift = np.arange(n_rows, dtype=np.int64)[:, None] * (totals.max(initial=0) + 1)
+    found = np.searchsorted((cumulative + shift).ravel(), (ranks + shift).ravel()).reshape(ranks.shape)
+    found = np.minimum(found - np.arange(n_rows)[:, None] * n_bins, n_bins - 1)
+    result = np.asarray(values, dtype=np.float64)[found]
+    if lowest is not None:
+        result = np.maximum(result, np.asarray(lowest, dtype=np.float64)[:, None])
+    if highest is not None:
+        result = np.minimum(result, np.asarray(highest, dtype=np.float64)[:, None])
+    result[totals == 0] = np.nan
+    return result
+
+
+class SlidingHistogram(object):
+    """
+    Dense histogram of aggregated seconds (aggregator hists with sparse bin labels)
+    over the whole test, over a sliding window of last seconds and over the last second.
+
+    Counts of the window seconds are kept in a ring of rows, the incoming second is added
+    to the window counts and the expired ones are subtracted, so nothing is re-summed.
+    Bin labels are collected as they come, the label set is bounded by aggregator bins,
+    so columns are added only while the test warms up.
+    """
+
+    def __init__(self, window=60):
+        """
+        :param window: seconds before the last one kept in the window, 0 keeps only the last second
+        """
+        self.window = window
+        self.labels = np.zeros(0, dtype=np.int64)
+        self.overall = np.zeros(0, dtype=np.int64)
+        self.windowed = np.zeros(0, dtype=np.int64)
+        self.ring = np.zeros((window + 1, 0), dtype=np.int64)
+        self.ring_ts = np.full(window + 1, -1, dtype=np.int64)
+        self.last_ts = None
+
+    def __len__(self):
+        return int(self.overall.sum())
+
+    @property
+    def last(self):
+        if self.last_ts is None:
+            return np.zeros(len(self.labels), dtype=np.int64)
+        return self.ring[self.last_ts % len(self.ring)]
+
+    def add(self, ts, hist):
+        """
+        :param ts: second of the aggregate
+        :param hist: aggregator hist, {"data": [...], "bins": [...]}
+        """
+        # new labels widen the arrays, so incoming counts are placed after that
+        index = self._columns(np.asarray(hist['bins'], dtype=np.int64))
+        counts = np.zeros(len(self.labels), dtype=np.int64)
+        np.add.at(counts, index, np.asarray(hist['data'], dtype=np.int64))
+        expired = (self.ring_ts >= 0) & (ts - self.ring_ts > self.window)
+        if expired.any():
+            self.windowed -= self.ring[expired].sum(axis=0)
+            self.ring[expired] = 0
+            self.ring_ts[expired] = -1
+        slot = ts % len(self.ring)
+        self.ring[slot] += counts
+        self.ring_ts[slot] = ts
+        self.windowed += counts
+        self.overall += counts
+        self.last_ts = ts
+
+    def _columns(self, labels):
+        position = np.searchsorted(self.labels, labels)
+        known = position < len(self.labels)
+        known[known] = self.labels[position[known]] == labels[known]
+        if not known.all():
+            self._add_columns(np.union1d(self.labels, labels))
+            position = np.searchsorted(self.labels, labels)
+        return position
+
+    def _add_columns(self, labels):
+        old = np.searchsorted(labels, self.labels)
+
+        def widen(counts):
+            wide = np.zeros(counts.shape[:-1] + (len(labels),), dtype=np.int64)
+            wide[..., old] = counts
+            return wide
+
+        self.overall = widen(self.overall)
+        self.windowed = widen(self.windowed)
+        self.ring = widen(self.ring)
+        self.labels = labels
+
+    def quantiles(self, counts, quantiles):
+        """
+        Quantiles as labels of bins where cumulative count reaches them
+
+        :param counts: one of overall, windowed or last counts
+        :returns: float array of bin labels, NaN if there is no bins yet
+        """
+        if not len(self.labels):
+            return np.full(len(quantiles), np.nan)
+        cumulative = np.cumsum(counts)
+        position = np.searchsorted(cumulative, np.asarray(quantiles, dtype=np.float64) / 100 * cumulative[-1])
+        return self.labels[np.minimum(position, len(self.labels) - 1)].astype(np.float64)
@@ -0,0 +1,66 @@
+"""
+Per-second generator stats derived from result samples, for generators
+that do not report their own stats
+"""
+
+import threading
+
+import numpy as np
+
+from ..common.interfaces import StatsReader
+
+
+class SecondStats(StatsReader):
+    """
+    Accumulates rps and max instances per second while result chunks are parsed.
+    A second is emitted once a chunk ends with a later second, as TimeChopper does,
+    the rest are emitted when the results reader finishes.
+    """
+
+    def __init__(self):
+        self.rps = {}
+        self.instances = {}
+        self.recent_ts = None
+        self.finished = False
+        self.lock = threading.Lock()
+
+    def add(self, seconds, instances=None):
+        """
+        :param seconds: int array of seconds of samples, in order they were read
+        :param instances: optional array of instances (threads) at samples, max per second is taken
+        """
+        if not len(seconds):
+            return
+        unique, inverse = np.unique(seconds, return_inverse=True)
+        counts = np.bincount(inverse)
+        if instances is not None:
+            max_instances = np.full(len(unique), np.iinfo(np.int64).min)
+            np.maximum.at(max_instances, inverse, np.asarray(instances, dtype=np.int64))
+        with self.lock:
+            for num, ts in enumerate(unique.tolist()):
+                self.rps[ts] = self.rps.get(ts, 0) + int(counts[num])
+                if instances is not None:
+                    self.instances[ts] = max(self.instances.get(ts, 0), int(max_instances[num]))
+            self.recent_ts = int(seconds[-1])
+
+    def finish(self):
+        """No more samples, remaining seconds are emitted"""
+        self.finished = True
+
+    def _pop_ready(self, last_ready_ts=None):
+        with self.lock:
+            ready = sorted(ts for ts in self.rps if last_ready_ts is None or ts <= last_ready_ts)
+            return [self.stats_item(ts, self.instances.pop(ts, 0), self.rps.pop(ts)) for ts in ready]
+
+    def __iter__(self):
+        while not self.finished:
+            # None when nothing is ready, so that data poller stops waiting eventually
+            ready = self._pop_ready(self.recent_ts - 1) if self.recent_ts is not None else None
+            yield ready or None
+        ready = self._pop_ready()
+        if ready:
+            yield ready
+
+    def close(self):
+        """Stats are emitted until results reader finishes"""
+        pass
@@ -9,7 +9,7 @@ from pkg_resources import resource_string
 from typing import Collection
 
 from .aggregator import Aggregator, DataPoller
-from .chopper import TimeChopper
+from .chopper import BufferedTimeChopper
 from yandextank.common.interfaces import AggregateResultListener, StatsReader
 
 from yandextank.contrib.netort.netort.data_processing import Drain, Chopper, get_nowait_from_queue
@@ -36,7 +36,9 @@ class TankAggregator(object):
     def get_key():
         return __file__
 
-    def __init__(self, generator, poller: DataPoller, termination_timeout: float = 60):
+    def __init__(
+        self, generator, poller: DataPoller, termination_timeout: float = 60, histogram_digits: int | None = None
+    ):
         # AbstractPlugin.__init__(self, core, cfg)
         """
 
@@ -54,6 +56,7 @@ class TankAggregator(object):
         self.stats_drain = None
         self.termination_timeout = termination_timeout
         self.poller = poller
+        self.histogram_digits = histogram_digits
 
     @staticmethod
     def load_config():
@@ -70,7 +73,9 @@ class TankAggregator(object):
                 readers = [readers]
 
             sources = [self.poller.poll(r) for r in readers]
-            pipeline = Aggregator(TimeChopper(sources), aggregator_config)
+            pipeline = Aggregator(
+                BufferedTimeChopper(sources), aggregator_config, histogram_digits=self.histogram_digits
+            )
             self.drain = Drain(pipeline, self.results)
             self.drain.start()
 
@@ -1,21 +1,61 @@
+import numpy as np
 import pandas as pd
+import pytest
 
 from conftest import MAX_TS, random_split
-from yandextank.aggregator.chopper import TimeChopper
+from yandextank.aggregator.chopper import TimeChopper, BufferedTimeChopper
 
 
+@pytest.mark.parametrize('chopper_cls', [TimeChopper, BufferedTimeChopper])
 class TestChopper(object):
-    def test_one_chunk(self, data):
-        chopper = TimeChopper([iter([data])])
+    def test_one_chunk(self, data, chopper_cls):
+        chopper = chopper_cls([iter([data])])
         result = list(chopper)
         assert len(result) == MAX_TS
         concatinated = pd.concat(r[1] for r in result)
         assert len(data) == len(concatinated), "We did not lose anything"
 
-    def test_multiple_chunks(self, data):
+    def test_multiple_chunks(self, data, chopper_cls):
         chunks = random_split(data)
-        chopper = TimeChopper([iter(chunks)])
+        chopper = chopper_cls([iter(chunks)])
         result = list(chopper)
         assert len(result) == MAX_TS
         concatinated = pd.concat(r[1] for r in result)
         assert len(data) == len(concatinated), "We did not lose anything"
+
+
+def test_buffered_chopper_same_output(data):
+    chunks = list(random_split(data))
+    chunks[2], chunks[3] = chunks[3], chunks[2]
+    chunks[1] = chunks[1].sample(frac=1, random_state=0)
+    expected = list(TimeChopper([iter(chunks)]))
+    result = list(BufferedTimeChopper([iter(chunks), iter([])]))
+    assert len(result) == len(expected)
+    for (exp_ts, exp_df, exp_len), (ts, df, length) in zip(expected, result):
+        assert ts == exp_ts
+        assert length == exp_len
+        pd.testing.assert_frame_equal(df, exp_df)
+
+
+def _chunks(rps, seconds=3, chunks_per_second=10):
+    size = rps * seconds
+    df = pd.DataFrame(
+        {
+            'tag': np.random.choice(['a', 'b', 'c'], size),
+            'interval_real': np.random.randint(0, 100000, size),
+            'net_code': np.zeros(size, dtype=np.int64),
+            'proto_code': np.full(size, 200),
+        },
+        index=pd.Index(np.repeat(np.arange(seconds), rps), name='receive_sec'),
+    )
+    step = rps // chunks_per_second
+    return [df.iloc[i : i + step] for i in range(0, size, step)]
+
+
+@pytest.mark.benchmark(group='chopper', min_rounds=3)
+@pytest.mark.parametrize('rps', [10000, 100000, 500000])
+@pytest.mark.parametrize('chopper_cls', [TimeChopper, BufferedTimeChopper])
+def test_chopper_benchmark(benchmark, chopper_cls, rps):
+    chunks = _chunks(rps)
+    result = benchmark(lambda: list(chopper_cls([iter(chunks)])))
+    assert sum(r[2] for r in result) == rps * 3
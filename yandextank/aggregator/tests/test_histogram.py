@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from yandextank.aggregator.histogram import LogLinearBins, Histogram, SlidingHistogram
+
+
+@pytest.mark.parametrize('digits', [1, 2, 3])
+def test_bins_hold_values(digits):
+    bins = LogLinearBins(digits, max_value=10**7)
+    values = np.arange(0, 10**7, 7)
+    idx = bins.index(values)
+    assert (bins.edges[idx] <= values).all()
+    assert (values < bins.edges[idx + 1]).all()
+    width = np.diff(bins.edges)
+    wide = width > 1
+    assert (width[wide] / bins.edges[:-1][wide] <= 10.0**-digits).all()
+
+
+def test_bins_clip():
+    bins = LogLinearBins(2, max_value=10**6)
+    assert bins.index([-5, 10**9]).tolist() == [0, bins.size - 1]
+
+
+def test_percentiles():
+    values = (np.random.default_rng(0).pareto(1.5, 100000) * 2000).astype(np.int64)
+    hist = Histogram(LogLinearBins(3))
+    hist.record(values)
+    percentiles = [50, 90, 99, 100]
+    assert np.allclose(hist.percentiles(percentiles), np.percentile(values, percentiles), rtol=1e-3)
+    assert np.isnan(Histogram().percentiles(percentiles)).all()
+
+
+def test_merge_equals_record():
+    rng = np.random.default_rng(1)
+    first, second = rng.integers(0, 10**6, 1000), rng.integers(0, 10**7, 1000)
+    merged = Histogram()
+    merged.record(first)
+    other = Histogram()
+    other.record(second)
+    merged += other
+    expected = Histogram()
+    expected.record(np.concatenate([first, second]))
+    assert (merged.counts == expected.counts).all()
+    with pytest.raises(ValueError):
+        merged.merge(Histogram(LogLinearBins(3)))
+
+
+def test_record_aggregate():
+    values = np.random.default_rng(2).integers(0, 10**6, 1000)
+    hist = Histogram()
+    hist.record(values)
+    restored = Histogram()
+    restored.record_aggregate(hist.to_aggregate())
+    restored.record_aggregate(hist.to_aggregate())
+    assert (restored.counts == hist.counts * 2).all()
+
+
+def random_seconds(count, n_bins=4000, seed=3):
+    rng = np.random.default_rng(seed)
+    labels = np.arange(1, n_bins + 1) * 10
+    seconds = []
+    for _ in range(count):
+        mask = rng.random(n_bins) < 0.3
+        seconds.append({'data': rng.integers(1, 100, mask.sum()).tolist(), 'bins': labels[mask].tolist()})
+    return seconds
+
+
+def series_quantiles(series, quantiles):
+    cumulative = series.cumsum()
+    positions = cumulative.searchsorted([float(q) / 100 * cumulative.max() for q in quantiles])
+    return [cumulative.index[i] for i in positions]
+
+
+def test_sliding_histogram():
+    quantiles = [10, 50, 90, 99, 100]
+    seconds = random_seconds(100, n_bins=200)
+    hist = SlidingHistogram(window=60)
+    for ts, second in enumerate(seconds):
+        # seconds with no data in between
+        if ts % 7 == 3:
+            continue
+        hist.add(ts, second)
+        series = [
+            pd.Series(s['data'], index=s['bins']) for t, s in enumerate(seconds[: ts + 1]) if t % 7 != 3
+        ]
+        in_window = [
+            pd.Series(s['data'], index=s['bins'])
+            for t, s in enumerate(seconds[: ts + 1])
+            if t % 7 != 3 and ts - t <= 60
+        ]
+        overall = pd.concat(series).groupby(level=0).sum()
+        windowed = pd.concat(in_window).groupby(level=0).sum()
+        assert hist.quantiles(hist.overall, quantiles).tolist() == series_quantiles(overall, quantiles)
+        assert hist.quantiles(hist.windowed, quantiles).tolist() == series_quantiles(windowed, quantiles)
+        assert hist.quantiles(hist.last, quantiles).tolist() == series_quantiles(series[-1], quantiles)
+    assert len(hist) == sum(sum(s['data']) for t, s in enumerate(seconds) if t % 7 != 3)
+
+
+def test_sliding_histogram_empty():
+    hist = SlidingHistogram(window=0)
+    assert np.isnan(hist.quantiles(hist.overall, [50])).all()
+    hist.add(0, {'data': [], 'bins': []})
+    hist.add(1, {'data': [3], 'bins': [100]})
+    assert hist.quantiles(hist.last, [50, 100]).tolist() == [100, 100]
+    hist.add(2, {'data': [], 'bins': []})
+    assert hist.last.sum() == 0
+    assert len(hist) == 3
+
+
+def add_series(seconds, quantiles, window=60):
+    # pd.Series window summing replaced by SlidingHistogram
+    overall = None
+    last_min = {}
+    for ts, second in enumerate(seconds):
+        dist = pd.Series(second['data'], index=second['bins'])
+        overall = dist if overall is None else overall.add(dist, fill_value=0)
+        for old in tuple(last_min):
+            if ts - old > window:
+                last_min.pop(old)
+        last_min[ts] = dist
+        last_1m = pd.Series(dtype='int64')
+        for data in last_min.values():
+            last_1m = data if last_1m.empty else last_1m.add(data, fill_value=0)
+        series_quantiles(overall, quantiles)
+        series_quantiles(last_1m, quantiles)
+        series_quantiles(dist, quantiles)
+
+
+def add_sliding(seconds, quantiles, window=60):
+    hist = SlidingHistogram(window)
+    for ts, second in enumerate(seconds):
+        hist.add(ts, second)
+        hist.quantiles(hist.overall, quantiles)
+        hist.quantiles(hist.windowed, quantiles)
+        hist.quantiles(hist.last, quantiles)
+
+
+@pytest.mark.benchmark(group='console percentiles', min_rounds=3)
+@pytest.mark.parametrize('method', [add_series, add_sliding])
+def test_sliding_histogram_benchmark(benchmark, method):
+    # verbose histogram, about 4k bins, a render every second
+    seconds = random_seconds(120)
+    benchmark(method, seconds, [10, 20, 30, 40, 50, 60, 70, 75, 80, 85, 90, 95, 99, 99.5, 100])
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from yandextank.aggregator import TimeChopper
+from yandextank.aggregator import aggregator as agg
+from yandextank.aggregator.stats import SecondStats
+
+
+def make_chunks(count, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for num in range(count):
+        # seconds are mostly increasing, with a few late samples from the previous ones
+        seconds = np.sort(1500000000 + num * 2 + rng.integers(0, 3, rows))
+        threads = rng.integers(1, 100, rows)
+        chunks.append(pd.DataFrame({'allThreads': threads}, index=pd.Index(seconds, name='receive_sec')))
+    return chunks
+
+
+def chopped_stats(chunks):
+    # second pipeline over the same rows replaced by SecondStats
+    worker = agg.Worker({"allThreads": ["max"]}, False)
+    result = []
+    for ts, chunk, rps in TimeChopper([iter(chunks)]):
+        stats = worker.aggregate(chunk)
+        result.append({'ts': ts, 'metrics': {'instances': stats['allThreads']['max'], 'reqps': rps}})
+    return result
+
+
+def accumulated_stats(chunks):
+    stats = SecondStats()
+    result = []
+    for chunk in chunks:
+        stats.add(chunk.index.values, chunk['allThreads'].values)
+        result += next(iter(stats)) or []
+    stats.finish()
+    for items in stats:
+        result += items or []
+    return result
+
+
+def test_same_as_chopped():
+    chunks = make_chunks(20, 1000)
+    assert accumulated_stats(chunks) == chopped_stats(chunks)
+
+
+def test_emits_ready_seconds():
+    stats = SecondStats()
+    stats_iter = iter(stats)
+    assert next(stats_iter) is None
+    stats.add(np.array([10, 10, 11]))
+    assert next(stats_iter) == [SecondStats.stats_item(10, 0, 2)]
+    stats.add(np.array([11, 12]), np.array([3, 5]))
+    assert next(stats_iter) == [SecondStats.stats_item(11, 3, 2)]
+    assert next(stats_iter) is None
+    stats.finish()
+    assert list(stats_iter) == [[SecondStats.stats_item(12, 5, 1)]]
+
+
+@pytest.mark.benchmark(group='second stats', min_rounds=3)
+@pytest.mark.parametrize('method', [chopped_stats, accumulated_stats])
+def test_second_stats_benchmark(benchmark, method):
+    chunks = make_chunks(50, 20000)
+    assert len(benchmark(method, chunks)) == 101
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from yandextank.aggregator import TankAggregator
+from yandextank.aggregator.aggregator import Worker
+
+AGGR_CONFIG = TankAggregator.load_config()
+
+
+def make_chunk(size, tags, seed=0):
+    rng = np.random.default_rng(seed)
+    chunk = pd.DataFrame({column: rng.integers(0, 200000, size) for column in AGGR_CONFIG})
+    chunk['interval_real'] = (rng.pareto(1.5, size) * 2000).astype(np.int64)
+    chunk['net_code'] = rng.choice([0, 104, 110], size)
+    chunk['proto_code'] = rng.choice([200, 404, 500], size)
+    chunk['tag'] = np.array(['tag%d' % i for i in range(tags)], dtype=object)[rng.integers(0, tags, size)]
+    return chunk
+
+
+def aggregate_by_groupby(worker, chunk):
+    return {tag: worker.aggregate(data) for tag, data in chunk.groupby('tag')}, worker.aggregate(chunk)
+
+
+@pytest.mark.parametrize('verbose_histogram', [True, False])
+@pytest.mark.parametrize('tags', [1, 7, 300])
+def test_aggregate_grouped(verbose_histogram, tags):
+    worker = Worker(AGGR_CONFIG, verbose_histogram)
+    chunk = make_chunk(20000, tags)
+    chunk.loc[:2, 'interval_real'] = [0, 300000000, 300000001]
+    expected_tagged, expected_overall = aggregate_by_groupby(worker, chunk)
+    tagged, overall = worker.aggregate_grouped(chunk, 'tag')
+    assert list(tagged) == list(expected_tagged)
+    assert tagged == expected_tagged
+    assert overall == expected_overall
+
+
+def test_aggregate_grouped_empty_tag():
+    worker = Worker(AGGR_CONFIG, False)
+    chunk = make_chunk(100, 3)
+    chunk.loc[[3, 10], 'tag'] = np.nan
+    expected_tagged, expected_overall = aggregate_by_groupby(worker, chunk)
+    tagged, overall = worker.aggregate_grouped(chunk, 'tag')
+    assert tagged == expected_tagged
+    assert overall == expected_overall
+    assert overall['interval_real']['len'] == 100
+
+
+@pytest.mark.benchmark(group='worker', min_rounds=3)
+@pytest.mark.parametrize('method', ['groupby', 'grouped'])
+def test_aggregate_benchmark(benchmark, method):
+    worker = Worker(AGGR_CONFIG, True)
+    chunk = make_chunk(50000, 500)
+    if method == 'groupby':
+        benchmark(aggregate_by_groupby, worker, chunk)
+    else:
+        benchmark(worker.aggregate_grouped, chunk, 'tag')
+
+
+@pytest.mark.parametrize('tags', [1, 300])
+def test_aggregate_grouped_log_linear(tags):
+    worker = Worker(AGGR_CONFIG, True, histogram_digits=2)
+    chunk = make_chunk(20000, tags)
+    tagged, overall = worker.aggregate_grouped(chunk, 'tag')
+    assert overall == worker.aggregate(chunk)
+    hist = overall['interval_real']['hist']
+    assert sum(hist['data']) == len(chunk)
+    quantiles = overall['interval_real']['q']['value']
+    exact = np.percentile(chunk['interval_real'], worker.percentiles)
+    assert np.allclose(quantiles, exact, rtol=0.01)
+    assert quantiles[-1] == chunk['interval_real'].max()
+    merged_data = {}
+    for tag_data in tagged.values():
+        tag_hist = tag_data['interval_real']['hist']
+        for label, count in zip(tag_hist['bins'], tag_hist['data']):
+            merged_data[label] = merged_data.get(label, 0) + count
+    assert merged_data == dict(zip(hist['bins'], hist['data']))
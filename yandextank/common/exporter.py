@@ -0,0 +1,208 @@
+"""
+Background batched export of points to time series databases
+"""
+
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = 'drop_oldest'
+BLOCK = 'block'
+SPILL = 'spill'
+OVERFLOW_POLICIES = (DROP_OLDEST, BLOCK, SPILL)
+
+
+def _json_default(value):
+    # numpy scalars
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError('%r is not JSON serializable' % (value,))
+
+
+class BatchExporter(object):
+    """
+    Writes points to a sink from a background thread, so that a slow or unavailable sink
+    does not stall the thread that produces points.
+
+    Points wait in a bounded queue and are written by batches of batch_size points,
+    or earlier, when the oldest queued point has waited for flush_interval seconds.
+    Overflow policy defines what put does when the queue is full:
+        drop_oldest: the oldest queued points are dropped
+        block: put waits until there is space in the queue
+        spill: points are appended to spill_file and written once the queue has space again
+
+    :param write: callable that writes a list of points to the sink, raises on failure
+    """
+
+    def __init__(
+        self,
+        write,
+        name='exporter',
+        queue_size=100000,
+        batch_size=1000,
+        flush_interval=1.0,
+        overflow_policy=DROP_OLDEST,
+        spill_file=None,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError('Unknown overflow policy %s, expected one of %s' % (overflow_policy, OVERFLOW_POLICIES))
+        if overflow_policy == SPILL and not spill_file:
+            raise ValueError('spill_file is required for %s overflow policy' % SPILL)
+        self.write = write
+        self.name = name
+        self.queue_size = max(int(queue_size), 1)
+        self.batch_size = min(max(int(batch_size), 1), self.queue_size)
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.spill_file = spill_file
+        # (enqueue time, point) pairs
+        self.queue = collections.deque()
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.spilled = 0
+        self.spill_offset = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.write_latency = 0.0
+        self.point_latency = 0.0
+        self.thread = threading.Thread(target=self._run, name=name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, points):
+        """Enqueue points for writing"""
+        now = time.time()
+        items = [(now, point) for point in points]
+        if not items:
+            return
+        with self.condition:
+            if self.stopping:
+                logger.debug('%s is stopped, %d points dropped', self.name, len(items))
+                self.dropped += len(items)
+                return
+            if self.overflow_policy == BLOCK:
+                self._put_blocking(items)
+            elif self.overflow_policy == SPILL:
+                self._put_spilling(items)
+            else:
+                self.queue.extend(items)
+                overflow = len(self.queue) - self.queue_size
+                if overflow > 0:
+                    for _ in range(overflow):
+                        self.queue.popleft()
+                    self.dropped += overflow
+                    logger.debug('%s queue is full, %d oldest points dropped', self.name, overflow)
+            self.condition.notify_all()
+
+    def _put_blocking(self, items):
+        while items:
+            free = self.queue_size - len(self.queue)
+            if free <= 0:
+                self.condition.notify_all()
+                self.condition.wait()
+                if self.stopping:
+                    self.dropped += len(items)
+                    return
+                continue
+            self.queue.extend(items[:free])
+            items = items[free:]
+
+    def _put_spilling(self, items):
+        # once anything is spilled new points go after it, to keep their order
+        free = 0 if self.spilled else self.queue_size - len(self.queue)
+        if free > 0:
+            self.queue.extend(items[:free])
+            items = items[free:]
+        if items:
+            with open(self.spill_file, 'a') as spill:
+                spill.writelines(json.dumps(item, default=_json_default) + '\n' for item in items)
+            self.spilled += len(items)
+
+    def _unspill(self):
+        with open(self.spill_file) as spill:
+            spill.seek(self.spill_offset)
+            count = min(self.spilled, self.queue_size)
+            for _ in range(count):
+                enqueued, point = json.loads(spill.readline())
+                self.queue.append((enqueued, point))
+            self.spill_offset = spill.tell()
+        self.spilled -= count
+        if not self.spilled:
+            os.truncate(self.spill_file, 0)
+            self.spill_offset = 0
+
+    def _next_batch(self):
+        """Waits for a full batch, an expired point or stop. None when stopped and everything is written"""
+        with self.condition:
+            while True:
+                if not self.queue and self.spilled:
+                    self._unspill()
+                if not self.queue:
+                    if self.stopping:
+                        return None
+                    self.condition.wait()
+                    continue
+                wait = self.queue[0][0] + self.flush_interval - time.time()
+                if len(self.queue) >= self.batch_size or wait <= 0 or self.stopping:
+                    batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+                    self.condition.notify_all()
+                    return batch
+                self.condition.wait(wait)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.time()
+            try:
+                self.write([point for _, point in batch])
+            except Exception as e:
+                logger.warning('%s failed to write %d points: %s', self.name, len(batch), e)
+                logger.debug('%s write failure', self.name, exc_info=True)
+                failed, sent = len(batch), 0
+            else:
+                failed, sent = 0, len(batch)
+            finished = time.time()
+            with self.condition:
+                self.failed += failed
+                self.sent += sent
+                self.write_latency = finished - started
+                self.point_latency = finished - batch[0][0]
+
+    def metrics(self):
+        """
+        Queue depth and write counters.
+        Latencies are of the last write: time the write took and time the oldest written point waited
+        """
+        with self.condition:
+            return {
+                'queued': len(self.queue),
+                'spilled': self.spilled,
+                'sent': self.sent,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'write_latency': self.write_latency,
+                'point_latency': self.point_latency,
+            }
+
+    def close(self, timeout=None):
+        """Writes queued points and stops, points left after timeout are lost"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            metrics = self.metrics()
+            logger.warning(
+                '%s did not finish in %ss, %d points are not written',
+                self.name,
+                timeout,
+                metrics['queued'] + metrics['spilled'],
+            )
@@ -116,6 +116,9 @@ class MonitoringDataListener(object):
     """Monitoring listener interface
     parent class for Monitoring data listeners"""
 
+    # listeners share one read-only snapshot of data, the ones that modify it get their own copy
+    mutable_monitoring_data = False
+
     def __init__(self):
         pass
 
@@ -38,6 +38,53 @@ def monitoring_data(pname, metrics, comment=''):
         LOGGER.warning("Can't format. Wrong data %s. %s", metrics, ve, exc_info=True)
 
 
+class FrozenDict(dict):
+    """
+    Read-only dict of a monitoring data snapshot, one snapshot is shared by all listeners.
+    copy.copy() and copy.deepcopy() of it are ordinary mutable dicts.
+    """
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Monitoring data is shared by listeners and is read-only, use thaw() to get a mutable copy')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+def freeze(data):
+    """
+    Read-only snapshot of monitoring data: dicts become FrozenDicts, lists become tuples
+    """
+    if isinstance(data, dict):
+        return FrozenDict(
+            {key: freeze(value) if isinstance(value, (dict, list, tuple)) else value for key, value in data.items()}
+        )
+    if isinstance(data, (list, tuple)):
+        return tuple(freeze(item) if isinstance(item, (dict, list, tuple)) else item for item in data)
+    return data
+
+
+def thaw(data):
+    """
+    Mutable deep copy of monitoring data snapshot made of plain dicts and lists
+    """
+    if isinstance(data, dict):
+        return {key: thaw(value) if isinstance(value, (dict, list, tuple)) else value for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [thaw(item) if isinstance(item, (dict, list, tuple)) else item for item in data]
+    return data
+
+
 class MonitoringPanel(object):
     '''
     The class Panel is used for initializing and managing structural levels for collecting monitoring data passed through the configuration file.
@@ -0,0 +1,183 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from influxdb import InfluxDBClient
+
+from yandextank.common.exporter import BatchExporter, BLOCK, DROP_OLDEST, SPILL
+from yandextank.plugins.OpenTSDBUploader.client import OpenTSDBClient
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Records request bodies, answers 204 after delay"""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.requests = []
+        super().__init__(('localhost', 0), StandInHandler)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.server.delay)
+        self.server.requests.append((self.path, body))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(request):
+    server = StandInServer(getattr(request, 'param', 0))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def influx_points(count, start=0):
+    return [
+        {'measurement': 'overall_meta', 'tags': {'tank': 'test'}, 'time': 1500000000 + i, 'fields': {'reqps': i}}
+        for i in range(start, start + count)
+    ]
+
+
+def test_influx_batches(server):
+    client = InfluxDBClient('localhost', server.port, database='mydb')
+    exporter = BatchExporter(lambda points: client.write_points(points, 's'), batch_size=1000, flush_interval=10)
+    exporter.put(influx_points(2500))
+    exporter.close(5)
+    assert [path.split('?')[0] for path, _ in server.requests] == ['/write'] * 3
+    lines = [line for _, body in server.requests for line in body.decode().splitlines()]
+    assert len(lines) == 2500
+    assert lines[0] == 'overall_meta,tank=test reqps=0i 1500000000'
+    assert exporter.metrics()['sent'] == 2500
+
+
+def test_opentsdb_flush_interval(server):
+    client = OpenTSDBClient(host='localhost', port=server.port)
+    exporter = BatchExporter(client.write, batch_size=1000, flush_interval=0.1)
+    points = [{'metric': 'reqps', 'timestamp': 1500000000, 'value': 1, 'tags': {'tank': 'test'}}]
+    exporter.put(points)
+    deadline = time.time() + 5
+    while not server.requests and time.time() < deadline:
+        time.sleep(0.01)
+    assert server.requests == [('/api/put', json.dumps(points).encode())]
+    exporter.close(5)
+
+
+@pytest.mark.parametrize('server', [0.2], indirect=True)
+def test_slow_sink_does_not_block(server):
+    client = InfluxDBClient('localhost', server.port, database='mydb')
+    exporter = BatchExporter(lambda points: client.write_points(points, 's'), batch_size=10, flush_interval=0)
+    started = time.time()
+    for start in range(0, 50, 10):
+        exporter.put(influx_points(10, start))
+    assert time.time() - started < 0.1
+    exporter.close(5)
+    assert exporter.metrics()['sent'] == 50
+    assert len(server.requests) == 5
+    assert exporter.metrics()['write_latency'] >= 0.2
+
+
+class GatedSink(object):
+    """Write blocks until opened"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.written = []
+
+    def write(self, points):
+        self.gate.wait()
+        self.written.extend(points)
+
+
+@pytest.fixture
+def sink():
+    sink = GatedSink()
+    yield sink
+    sink.gate.set()
+
+
+def wait_for_write(exporter):
+    # background thread takes the first batch and waits for the gate
+    deadline = time.time() + 5
+    while exporter.metrics()['queued'] and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_drop_oldest(sink):
+    exporter = BatchExporter(sink.write, queue_size=10, batch_size=5, flush_interval=0, overflow_policy=DROP_OLDEST)
+    exporter.put(range(5))
+    wait_for_write(exporter)
+    exporter.put(range(5, 30))
+    assert exporter.metrics()['queued'] == 10
+    assert exporter.metrics()['dropped'] == 15
+    sink.gate.set()
+    exporter.close(5)
+    assert sink.written == list(range(5)) + list(range(20, 30))
+
+
+def test_block(sink):
+    exporter = BatchExporter(sink.write, queue_size=10, batch_size=5, flush_interval=0, overflow_policy=BLOCK)
+    exporter.put(range(5))
+    wait_for_write(exporter)
+    putter = threading.Thread(target=exporter.put, args=(range(5, 30),))
+    putter.start()
+    putter.join(0.2)
+    assert putter.is_alive()
+    assert exporter.metrics()['queued'] == 10
+    sink.gate.set()
+    putter.join(5)
+    assert not putter.is_alive()
+    exporter.close(5)
+    assert sink.written == list(range(30))
+    assert exporter.metrics()['dropped'] == 0
+
+
+def test_spill(sink, tmp_path):
+    spill_file = tmp_path / 'spill.jsonl'
+    exporter = BatchExporter(
+        sink.write, queue_size=10, batch_size=5, flush_interval=0, overflow_policy=SPILL, spill_file=str(spill_file)
+    )
+    exporter.put(influx_points(5))
+    wait_for_write(exporter)
+    exporter.put(influx_points(30, 5))
+    assert exporter.metrics()['queued'] == 10
+    assert exporter.metrics()['spilled'] == 20
+    # new points go after spilled ones, whether they are read back already or not
+    sink.gate.set()
+    exporter.put(influx_points(5, 35))
+    exporter.close(5)
+    assert sink.written == influx_points(40)
+    assert exporter.metrics()['spilled'] == 0
+    assert spill_file.stat().st_size == 0
+
+
+def test_failed_write():
+    def fail(points):
+        raise IOError('unavailable')
+
+    exporter = BatchExporter(fail, batch_size=5, flush_interval=0)
+    exporter.put(range(12))
+    exporter.close(5)
+    metrics = exporter.metrics()
+    assert (metrics['failed'], metrics['sent'], metrics['queued']) == (12, 0, 0)
+    exporter.put(range(3))
+    assert exporter.metrics()['dropped'] == 3
+
+
+def test_spill_requires_file():
+    with pytest.raises(ValueError):
+        BatchExporter(list.append, overflow_policy=SPILL)
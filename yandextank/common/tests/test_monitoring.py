@@ -1,5 +1,9 @@
+import copy
+import json
+import pickle
+
 import pytest
-from yandextank.common.monitoring import monitoring_data
+from yandextank.common.monitoring import freeze, monitoring_data, thaw
 
 
 @pytest.mark.parametrize(
@@ -13,3 +17,25 @@ from yandextank.common.monitoring import monitoring_data
 )
 def test_monitoring_data(metrics, result):
     assert monitoring_data('test', metrics, '') == result
+
+
+def test_frozen_snapshot():
+    data = [{'timestamp': 1, 'data': {'host': {'comment': '', 'metrics': {'custom:cpu': 1.5, 'custom:mem': 2}}}}]
+    snapshot = freeze(data)
+    assert snapshot == tuple(data)
+    assert json.dumps(snapshot) == json.dumps(data)
+    metrics = snapshot[0]['data']['host']['metrics']
+    with pytest.raises(TypeError):
+        metrics['custom:cpu'] = 0
+    with pytest.raises(TypeError):
+        metrics.pop('custom:cpu')
+    with pytest.raises(TypeError):
+        snapshot[0]['data'].update({})
+    mutable = thaw(snapshot)
+    assert mutable == data
+    mutable[0]['data']['host']['metrics']['custom:cpu'] = 0
+    assert metrics['custom:cpu'] == 1.5
+    copied = copy.deepcopy(snapshot)
+    copied[0]['data']['host']['metrics'].pop('custom:cpu')
+    assert metrics['custom:cpu'] == 1.5
+    assert pickle.loads(pickle.dumps(snapshot)) == snapshot
@@ -3,7 +3,7 @@ from threading import Thread, Event
 
 import pytest
 from queue import Queue
-from yandextank.common.util import FileScanner, FileMultiReader
+from yandextank.common.util import FileScanner, FileMultiReader, MmapFileReader
 from yandextank.common.util import AddressWizard, SecuredShell
 
 from yandextank.contrib.netort.netort.data_processing import Drain, Chopper
@@ -199,6 +199,94 @@ class TestFileMultiReader(object):
         assert len(errors) == 0
 
 
+class TestMmapFileReader(object):
+    filename = 'yandextank/common/tests/ph.out'
+
+    @staticmethod
+    def consume(f, chunks, errors):
+        while True:
+            data = f.read()
+            if data is None:
+                return
+            if len(data) and data[-1] != ord('\n'):
+                errors.append('Chunk does not end with line: {}'.format(data.tobytes()))
+            chunks.append(data.tobytes())
+
+    def test_multi_read(self):
+        with open(self.filename, 'rb') as f:
+            exp = f.read()
+        stop = Event()
+        mr = MmapFileReader(self.filename, stop)
+        results = {}
+        errors = []
+        threads = []
+        for cache_size in [1000, 4000, 8000]:
+            results[cache_size] = []
+            threads.append(Thread(target=self.consume, args=(mr.get_file(cache_size), results[cache_size], errors)))
+        stop.set()
+        [th.start() for th in threads]
+        [th.join() for th in threads]
+        mr.close()
+        assert not errors
+        for cache_size, chunks in results.items():
+            assert b''.join(chunks) == exp
+            assert max(len(chunk) for chunk in chunks) <= cache_size
+
+    def test_growing_file(self, tmp_path):
+        filename = str(tmp_path / 'phout.log')
+        open(filename, 'w').close()
+        stop = Event()
+        mr = MmapFileReader(filename, stop)
+        f = mr.get_file(10)
+        assert f.read() == b''
+        with open(filename, 'ab') as out:
+            out.write(b'aaa\nbb')
+            out.flush()
+            assert f.read() == b'aaa\n'
+            assert f.read() == b''
+            out.write(b'b\n' + b'c' * 20 + b'\nddd')
+            out.flush()
+            assert f.read() == b'bbb\n'
+            assert f.read() == b'c' * 20 + b'\n'
+            assert f.read() == b''
+        stop.set()
+        assert f.read() == b'ddd'
+        assert f.read() is None
+        mr.close()
+
+    def test_remap_keeps_views(self, tmp_path):
+        filename = str(tmp_path / 'phout.log')
+        with open(filename, 'wb') as out:
+            out.write(b'aaa\n')
+        mr = MmapFileReader(filename, Event())
+        first = mr.get_file(100).read()
+        with open(filename, 'ab') as out:
+            out.write(b'bbb\n')
+        second = mr.get_file(100).read()
+        assert first == b'aaa\n'
+        assert second == b'aaa\nbbb\n'
+        mr.close()
+
+    def test_close(self, tmp_path):
+        filename = str(tmp_path / 'phout.log')
+        with open(filename, 'wb') as out:
+            out.write(b'aaa\nbbb\n')
+        mr = MmapFileReader(filename, Event())
+        mapped = mr.mapping(1)
+        mr.close()
+        assert mapped.closed
+        assert mr.get_file(100).read() == b''
+
+    def test_close_with_live_views(self, tmp_path):
+        filename = str(tmp_path / 'phout.log')
+        with open(filename, 'wb') as out:
+            out.write(b'aaa\nbbb\n')
+        mr = MmapFileReader(filename, Event())
+        view = mr.get_file(4).read()
+        mr.close()
+        assert view == b'aaa\n'
+
+
 class TestSecuredShell(object):
 
     def test_ssh_path(self):
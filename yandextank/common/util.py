@@ -1,6 +1,7 @@
 import collections.abc
 import functools
 import inspect
+import mmap
 import os
 import socket
 import shutil
@@ -14,6 +15,7 @@ import http.client
 import logging
 import errno
 import re
+import threading
 
 import psutil
 
@@ -675,13 +677,13 @@ class FileLockedError(RuntimeError):
 
 
 class FileMultiReader(object):
-    def __init__(self, filename, provider_stop_event, cache_size=1024 * 1024 * 50):
+    def __init__(self, filename, provider_stop_event, cache_size=1024 * 1024 * 50, binary=False):
         self.buffer = ""
         self.filename = filename
         self.cache_size = cache_size
         self._cursor_map = {}
         self._is_locked = False
-        self._opened_file = open(self.filename)
+        self._opened_file = open(self.filename, 'rb' if binary else 'r')
         self.stop = provider_stop_event
 
     def close(self, force=False):
@@ -696,7 +698,7 @@ class FileMultiReader(object):
 
     def read_with_lock(self, pos, _len=None):
         """
-        Reads {_len} characters if _len is not None else reads line
+        Reads {_len} characters (bytes in binary mode) if _len is not None else reads line
         :param pos: start reading position
         :param _len: number of characters to read
         :rtype: (string, int)
@@ -749,6 +751,93 @@ class FileLike(object):
         return result
 
 
+class MmapFileReader(object):
+    """
+    Tails a growing file through one read-only memory map shared by all consumers.
+
+    Every consumer from get_file() keeps its own cursor and gets zero-copy
+    memoryview slices of the mapping that end on line boundaries. The file is
+    remapped when a consumer needs more data than is mapped and the file has grown.
+    Previous mappings stay alive until the slices taken from them are released.
+    """
+
+    def __init__(self, filename, provider_stop_event, cache_size=1024 * 1024 * 50):
+        self.filename = filename
+        self.cache_size = cache_size
+        self.stop = provider_stop_event
+        self._opened_file = open(self.filename, 'rb')
+        self._mmap = None
+        self._remap_lock = threading.Lock()
+
+    def close(self, force=False):
+        with self._remap_lock:
+            self._opened_file.close()
+            mapped, self._mmap = self._mmap, None
+            if mapped is not None:
+                try:
+                    mapped.close()
+                except BufferError:
+                    # slices are still held by consumers, mapping is unmapped when they are released
+                    logger.debug('Memory map of %s is still in use, not closed', self.filename)
+
+    def get_file(self, cache_size=None):
+        cache_size = self.cache_size if not cache_size else cache_size
+        return MmapCursor(self, cache_size)
+
+    def mapping(self, size):
+        """
+        Current mapping, remapped if it is shorter than {size} and the file has grown
+        :rtype: mmap.mmap or None
+        """
+        mapped = self._mmap
+        if mapped is not None and len(mapped) >= size:
+            return mapped
+        with self._remap_lock:
+            mapped = self._mmap
+            if self._opened_file.closed or (mapped is not None and len(mapped) >= size):
+                return mapped
+            file_size = os.fstat(self._opened_file.fileno()).st_size
+            if file_size > (len(mapped) if mapped is not None else 0):
+                mapped = self._mmap = mmap.mmap(self._opened_file.fileno(), file_size, access=mmap.ACCESS_READ)
+        return mapped
+
+
+class MmapCursor(object):
+    def __init__(self, reader, cache_size):
+        """
+        :type reader: MmapFileReader
+        """
+        self.reader = reader
+        self.cache_size = cache_size
+        self._cursor = 0
+
+    def read(self, _len=None):
+        """
+        Complete lines starting at cursor, at most {_len} bytes unless a single line is longer.
+        After the provider is stopped, trailing data without line end is returned too.
+
+        :returns: memoryview, empty if no complete line is written yet, None when the file is exhausted
+        """
+        _len = self.cache_size if not _len else _len
+        # check stop before looking at file size, so lines written before stop are not lost
+        stopped = self.reader.stop.is_set()
+        mapped = self.reader.mapping(self._cursor + _len)
+        size = len(mapped) if mapped is not None else 0
+        start = self._cursor
+        if start >= size:
+            return None if stopped else memoryview(b'')
+        end = min(start + _len, size)
+        line_end = mapped.rfind(b'\n', start, end) + 1
+        if not line_end and end < size:
+            line_end = mapped.find(b'\n', end, size) + 1
+        if not line_end:
+            if not stopped:
+                return memoryview(b'')
+            line_end = size
+        self._cursor = line_end
+        return memoryview(mapped)[start:line_end]
+
+
 def get_callstack():
     """
     Get call stack, clean wrapper functions from it and present
@@ -2,10 +2,13 @@
 
 from __future__ import print_function
 
+import errno
+import fcntl
 import logging
 import os
 import requests
 import gzip
+import shutil
 import hashlib
 import serial
 import yaml
@@ -39,6 +42,9 @@ except ImportError:
     pip = True
 
 _TMP_PATH_PREFIX = os.getenv('NETORT_TMP_PATH', '/tmp')
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+PART_SUFFIX = '.part'
+LOCK_SUFFIX = '.lock'
 
 
 class PathProvider(object):
@@ -341,38 +347,68 @@ class HttpOpener(TempDownloaderOpenerProtocol):
     @retry
     def download_file(self, use_cache, try_ungzip=False) -> str:
         tmpfile_path = self.tmpfile_path()
-        if os.path.exists(tmpfile_path) and use_cache:
-            logger.info("Resource %s has already been downloaded to %s . Using it..", self.url, tmpfile_path)
+        try:
+            downloaded = shared_download(tmpfile_path, self._download_part, use_cache)
+        except requests.exceptions.Timeout:
+            logger.info(
+                'Connection timeout reached trying to download resource via HttpOpener: %s', self.url, exc_info=True
+            )
+            raise
+        except requests.exceptions.HTTPError as e:
+            logger.error(
+                'Bad http code during resource downloading. Http code: %s, resource: %s',
+                e.response.status_code,
+                self.url,
+            )
+            raise
+        if downloaded:
+            logger.info("Successfully downloaded resource %s to %s", self.url, tmpfile_path)
         else:
-            logger.info("Downloading resource %s to %s", self.url, tmpfile_path)
-            try:
-                data = requests.get(self.url, verify=False, headers=self._default_headers, timeout=self.timeout)
-                data.raise_for_status()
-            except requests.exceptions.Timeout:
-                logger.info(
-                    'Connection timeout reached trying to download resource via HttpOpener: %s', self.url, exc_info=True
-                )
-                raise
-            except requests.exceptions.HTTPError:
-                logger.error(
-                    'Bad http code during resource downloading. Http code: %s, resource: %s', data.status_code, self.url
-                )
-                raise
-            else:
-                f = open(tmpfile_path, "wb")
-                f.write(data.content)
-                f.close()
-                logger.info(
-                    "Successfully downloaded resource %s to %s, http status code: %s",
-                    self.url,
-                    tmpfile_path,
-                    data.status_code,
-                )
+            logger.info("Resource %s has already been downloaded to %s . Using it..", self.url, tmpfile_path)
         if try_ungzip:
             tmpfile_path = try_ungzip_file(tmpfile_path)
         self._filename = tmpfile_path
         return tmpfile_path
 
+    def _download_part(self, part_path):
+        """
+        Streams resource to part_path.
+        Partially downloaded file left by a failed attempt is continued with a Range request.
+        """
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        # byte ranges are of the resource as is
+        headers = dict(self._default_headers or {})
+        headers['Accept-Encoding'] = 'identity'
+        if offset:
+            headers['Range'] = 'bytes=%d-' % offset
+            last_modified = self.data_info.headers.get('Last-Modified') if self.data_info is not None else None
+            if last_modified:
+                headers['If-Range'] = last_modified
+        logger.info("Downloading resource %s to %s", self.url, part_path)
+        with closing(
+            requests.get(self.url, stream=True, verify=False, headers=headers, timeout=self.timeout)
+        ) as response:
+            if response.status_code == 416:
+                logger.info('Partially downloaded resource %s does not match it anymore, starting over', self.url)
+                os.remove(part_path)
+                return self._download_part(part_path)
+            response.raise_for_status()
+            if response.status_code == 206:
+                logger.info('Resuming download of resource %s from %s bytes', self.url, offset)
+                total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            else:
+                offset = 0
+                total = response.headers.get('Content-Length')
+            if response.headers.get('Content-Encoding', 'identity') != 'identity':
+                # size of decoded content is unknown
+                total = None
+            with open(part_path, 'ab' if offset else 'wb') as part:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    part.write(chunk)
+                size = part.tell()
+        if total and total.isdigit() and size != int(total):
+            raise IOError('Download of resource %s interrupted at %s of %s bytes' % (self.url, size, total))
+
     def tmpfile_path(self):
         return self.path_provider.tmpfile_path(self.hash)
 
@@ -615,40 +651,61 @@ class S3Opener(TempDownloaderOpenerProtocol):
     @retry
     def download_file(self, use_cache, try_ungzip=False):
         tmpfile_path = self.tmpfile_path()
-        if os.path.exists(tmpfile_path) and use_cache:
-            logger.info("Resource %s has already been downloaded to %s . Using it..", self.uri, tmpfile_path)
-        else:
-            if not self.conn:
-                raise Exception('Connection should be initialized first')
-            logger.info("Downloading resource %s to %s", self.uri, tmpfile_path)
-
-            try:
-                self.conn.download_file(self.bucket_key, self.object_key, tmpfile_path)
-            except socket.gaierror:
-                logger.error('Failed to connect to s3 host %s', self.endpoint_url)
-                raise
-            except boto3.exceptions.Boto3Error as e:
-                logger.error(
-                    'S3 error trying to download file from bucket: %s/%s  %s', self.bucket_key, self.object_key, str(e)
-                )
-                logger.debug(
-                    'S3 error trying to download file from bucket: %s/%s',
-                    self.bucket_key,
-                    self.object_key,
-                    exc_info=True,
-                )
-                raise
-            except Exception as e:
-                logger.debug('Failed to get s3 resource: %s', self.uri, exc_info=True)
-                raise RuntimeError('Failed to get s3 resource %s' % self.uri) from e
+        try:
+            downloaded = shared_download(tmpfile_path, self._download_part, use_cache)
+        except socket.gaierror:
+            logger.error('Failed to connect to s3 host %s', self.endpoint_url)
+            raise
+        except boto3.exceptions.Boto3Error as e:
+            logger.error(
+                'S3 error trying to download file from bucket: %s/%s  %s', self.bucket_key, self.object_key, str(e)
+            )
+            logger.debug(
+                'S3 error trying to download file from bucket: %s/%s',
+                self.bucket_key,
+                self.object_key,
+                exc_info=True,
+            )
+            raise
+        except Exception as e:
+            logger.debug('Failed to get s3 resource: %s', self.uri, exc_info=True)
+            raise RuntimeError('Failed to get s3 resource %s' % self.uri) from e
 
+        if downloaded:
             logger.info("Successfully downloaded resource %s to %s", self.uri, tmpfile_path)
-
+        else:
+            logger.info("Resource %s has already been downloaded to %s . Using it..", self.uri, tmpfile_path)
         if try_ungzip:
             tmpfile_path = try_ungzip_file(tmpfile_path)
         self._filename = tmpfile_path
         return tmpfile_path
 
+    def _download_part(self, part_path):
+        """
+        Streams object to part_path.
+        Partially downloaded file left by a failed attempt is continued with a ranged get.
+        """
+        if not self.conn:
+            raise Exception('Connection should be initialized first')
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        total = self.conn.head_object(Bucket=self.bucket_key, Key=self.object_key)['ContentLength']
+        if offset > total:
+            offset = 0
+        if offset:
+            logger.info('Resuming download of resource %s from %s bytes', self.uri, offset)
+        else:
+            logger.info("Downloading resource %s to %s", self.uri, part_path)
+        with open(part_path, 'ab' if offset else 'wb') as part:
+            if offset < total:
+                kwargs = {'Range': 'bytes=%d-' % offset} if offset else {}
+                body = self.conn.get_object(Bucket=self.bucket_key, Key=self.object_key, **kwargs)['Body']
+                with closing(body):
+                    for chunk in body.iter_chunks(DOWNLOAD_CHUNK_SIZE):
+                        part.write(chunk)
+            size = part.tell()
+        if size != total:
+            raise IOError('Download of resource %s interrupted at %s of %s bytes' % (self.uri, size, total))
+
     @thread_safe_property
     def filename(self) -> str:
         if self._filename is None:
@@ -676,19 +733,105 @@ manager = make_resource_manager()
 
 
 def try_ungzip_file(file_path: str) -> str:
+    if file_path.endswith('.gz'):
+        ungzippedfile_path = file_path[:-3]
+    else:
+        ungzippedfile_path = file_path + '_ungzipped'
+
+    def ungzip(part_path):
+        try:
+            with gzip.open(file_path) as gzf, open(part_path, 'wb') as f:
+                shutil.copyfileobj(gzf, f, DOWNLOAD_CHUNK_SIZE)
+        except Exception:
+            _remove(part_path)
+            raise
+
     try:
-        if file_path.endswith('.gz'):
-            ungzippedfile_path = file_path[:-3]
-        else:
-            ungzippedfile_path = file_path + '_ungzipped'
-        with gzip.open(file_path) as gzf, open(ungzippedfile_path, 'wb') as f:
-            f.write(gzf.read())
+        # ungzipped file is up to date unless the archive was downloaded again after it
+        up_to_date = os.path.exists(ungzippedfile_path) and os.path.getmtime(ungzippedfile_path) >= os.path.getmtime(
+            file_path
+        )
+        shared_download(ungzippedfile_path, ungzip, use_cache=up_to_date)
         return ungzippedfile_path
     except IOError as ioe:
         logger.info('Failed trying to ungzip downloaded resource %s' % repr(ioe))
     return file_path
 
 
+def shared_download(path, download, use_cache):
+    """
+    Makes file at path with download(part_path) and renames it to path atomically,
+    so path is never seen incomplete. Threads and processes downloading the same path
+    at once wait for the one that started first and use its file.
+    Partially downloaded file is kept, download may continue it on the next call.
+
+    Args:
+        use_cache: bool, use file existing at path instead of downloading it again
+
+    Returns:
+        bool, True if the file was downloaded by this call
+    """
+    seen = _stat(path)
+    lock_file = _lock(path, blocking=False)
+    if not lock_file:
+        logger.info('Waiting for resource downloaded by another tank: %s', path)
+        lock_file = _lock(path)
+    try:
+        current = _stat(path)
+        if current is not None and (use_cache or seen is None or not os.path.samestat(seen, current)):
+            return False
+        part_path = path + PART_SUFFIX
+        download(part_path)
+        os.replace(part_path, path)
+        return True
+    finally:
+        _unlock(path, lock_file)
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _lock(path, blocking=True):
+    """
+    Lock files are removed on unlock, so the file is reopened if it was removed while waiting
+
+    Returns:
+        locked file or None if it is locked by another process and blocking is False
+    """
+    lock_path = path + LOCK_SUFFIX
+    while True:
+        lock_file = open(lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError) as e:
+            lock_file.close()
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            return None
+        try:
+            if os.path.samestat(os.fstat(lock_file.fileno()), os.stat(lock_path)):
+                return lock_file
+        except OSError:
+            pass
+        lock_file.close()
+
+
+def _unlock(path, lock_file):
+    os.remove(path + LOCK_SUFFIX)
+    lock_file.close()
+
+
 def open_file(opener: OpenerProtocol | TempDownloaderOpenerProtocol, use_cache: bool) -> AbstractContextManager:
     if isinstance(opener, TempDownloaderOpenerProtocol):
         return opener.open(use_cache)
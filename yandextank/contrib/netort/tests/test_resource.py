@@ -0,0 +1,184 @@
+import gzip
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from yandextank.contrib.netort.netort.resource import (
+    DOWNLOAD_CHUNK_SIZE,
+    HttpOpener,
+    PathProvider,
+    shared_download,
+    try_ungzip_file,
+)
+
+CONTENT = b''.join(b'%08d line of ammo\n' % i for i in range(100000))
+
+
+class ResourceServer(ThreadingHTTPServer):
+    """
+    Serves content with Range support.
+    First responses may be cut after break_after bytes, GETs may be slowed down with delay.
+    """
+
+    def __init__(self, content, break_after=None, breaks=0, delay=0):
+        self.content = content
+        self.break_after = break_after
+        self.breaks = breaks
+        self.delay = delay
+        self.gets = []
+        super().__init__(('localhost', 0), ResourceHandler)
+
+    @property
+    def url(self):
+        return 'http://localhost:%d/ammo.txt' % self.server_address[1]
+
+
+class ResourceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.server.content)))
+        self.send_header('Last-Modified', 'Mon, 01 Jan 2024 00:00:00 GMT')
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.gets.append(self.headers.get('Range'))
+        time.sleep(self.server.delay)
+        content = self.server.content
+        start = 0
+        if self.headers.get('Range'):
+            start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, len(content) - 1, len(content)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        if self.server.breaks:
+            self.server.breaks -= 1
+            self.wfile.write(content[start : start + self.server.break_after])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(request):
+    server = ResourceServer(CONTENT, **getattr(request, 'param', {}))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def make_opener(server, tmp_path, **kwargs):
+    return HttpOpener(server.url, path_provider=PathProvider(str(tmp_path / 'http')), **kwargs)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_download(server, tmp_path):
+    opener = make_opener(server, tmp_path)
+    path = opener.download_file(use_cache=True)
+    assert read(path) == CONTENT
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+    assert opener.download_file(use_cache=True) == path
+    assert server.gets == [None]
+
+
+# breaks at a chunk boundary, so that everything received is written
+@pytest.mark.parametrize('server', [{'break_after': 8 * DOWNLOAD_CHUNK_SIZE, 'breaks': 2}], indirect=True)
+def test_download_resumed(server, tmp_path):
+    opener = make_opener(server, tmp_path, attempts=3)
+    path = opener.download_file(use_cache=False)
+    assert read(path) == CONTENT
+    assert server.gets == [None, 'bytes=524288-', 'bytes=1048576-']
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+
+def test_download_restarts_complete_part(server, tmp_path):
+    opener = make_opener(server, tmp_path)
+    with open(opener.tmpfile_path() + '.part', 'wb') as part:
+        part.write(b'x' * (len(CONTENT) + 10))
+    assert read(opener.download_file(use_cache=False)) == CONTENT
+    assert server.gets == ['bytes=%d-' % (len(CONTENT) + 10), None]
+
+
+@pytest.mark.parametrize('server', [{'delay': 0.3}], indirect=True)
+def test_concurrent_downloads_shared(server, tmp_path):
+    openers = [make_opener(server, tmp_path) for _ in range(4)]
+    paths = []
+    threads = [
+        threading.Thread(target=lambda opener: paths.append(opener.download_file(use_cache=False)), args=(opener,))
+        for opener in openers
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(paths)) == 1
+    assert read(paths[0]) == CONTENT
+    assert server.gets == [None]
+    # not an in-flight download anymore
+    openers[0].download_file(use_cache=False)
+    assert server.gets == [None, None]
+
+
+@pytest.mark.parametrize('server', [{'break_after': 1000, 'breaks': 1}], indirect=True)
+def test_download_ungzip(server, tmp_path):
+    server.content = gzip.compress(CONTENT)
+    opener = make_opener(server, tmp_path)
+    path = opener.download_file(use_cache=True, try_ungzip=True)
+    assert path.endswith('_ungzipped')
+    assert read(path) == CONTENT
+    mtime = os.path.getmtime(path)
+    assert opener.download_file(use_cache=True, try_ungzip=True) == path
+    assert os.path.getmtime(path) == mtime
+
+
+def test_ungzip_not_gzipped(tmp_path):
+    path = str(tmp_path / 'ammo.txt')
+    with open(path, 'wb') as f:
+        f.write(CONTENT)
+    assert try_ungzip_file(path) == path
+    assert os.listdir(tmp_path) == ['ammo.txt']
+
+
+def test_shared_download_keeps_part(tmp_path):
+    path = str(tmp_path / 'resource')
+
+    def fail(part_path):
+        with open(part_path, 'wb') as part:
+            part.write(b'partial')
+        raise IOError('connection reset')
+
+    with pytest.raises(IOError):
+        shared_download(path, fail, use_cache=True)
+    assert sorted(os.listdir(tmp_path)) == ['resource.part']
+
+    def resume(part_path):
+        with open(part_path, 'ab') as part:
+            part.write(b' and the rest')
+
+    assert shared_download(path, resume, use_cache=True)
+    assert read(path) == b'partial and the rest'
+    assert not shared_download(path, fail, use_cache=True)
+    assert sorted(os.listdir(tmp_path)) == ['resource']
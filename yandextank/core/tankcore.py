@@ -12,7 +12,6 @@ import shutil
 import socket
 import tempfile
 import time
-import copy
 import sys
 import platform
 
@@ -22,6 +21,7 @@ from builtins import str
 from yandextank.common.const import RetCode
 from yandextank.common.exceptions import GeneratorNotFound, PluginNotPrepared
 from yandextank.common.interfaces import GeneratorPlugin, MonitoringPlugin, MonitoringDataListener
+from yandextank.common.monitoring import freeze, thaw
 from yandextank.plugins.DataUploader.client import LPRequisites
 from yandextank.validator.validator import TankConfig, ValidationError
 from yandextank.aggregator import TankAggregator
@@ -147,6 +147,7 @@ class TankCore(object):
         self.aggregator_max_termination_timeout = self.get_option(
             self.SECTION, 'aggregator_max_termination_timeout', 60
         )
+        self.aggregator_histogram_digits = self.get_option(self.SECTION, 'aggregator_histogram_digits')
         self.skip_generator_check = self.get_option(self.SECTION, 'skip_generator_check', False)
         with open(os.path.join(self.artifacts_dir, CONFIGINITIAL), 'w') as f:
             yaml.dump(self.configinitial, f)
@@ -260,7 +261,10 @@ class TankCore(object):
                 gen = GeneratorPlugin(self, {}, 'generator dummy')
             # aggregator
             aggregator = TankAggregator(
-                gen, self.data_poller, termination_timeout=self.aggregator_max_termination_timeout
+                gen,
+                self.data_poller,
+                termination_timeout=self.aggregator_max_termination_timeout,
+                histogram_digits=self.aggregator_histogram_digits,
             )
             self._job = Job(
                 monitoring_plugins=monitorings, generator_plugin=gen, aggregator=aggregator, tank=socket.getfqdn()
@@ -403,10 +407,11 @@ class TankCore(object):
 
     def publish_monitoring_data(self, data):
         """sends pending data set to listeners"""
+        # listeners share one read-only snapshot instead of a deep copy each
+        snapshot = freeze(data)
         for plugin in self.monitoring_data_listeners:
-            # deep copy to ensure each listener gets it's own copy
             try:
-                plugin.monitoring_data(copy.deepcopy(data))
+                plugin.monitoring_data(thaw(snapshot) if plugin.mutable_monitoring_data else snapshot)
             except Exception:
                 logger.exception("Plugin %s failed to process monitoring data", plugin)
 
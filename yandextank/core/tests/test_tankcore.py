@@ -1,3 +1,4 @@
+import copy
 import glob
 import logging
 import os
@@ -10,6 +11,7 @@ import shutil
 import yaml
 
 from yandextank.common.exceptions import GeneratorNotFound
+from yandextank.common.interfaces import MonitoringDataListener
 from yandextank.core import TankCore
 from yandextank.core.tankworker import parse_options, TankInfo
 from yandextank.stepper.module_exceptions import DiskLimitError
@@ -193,11 +195,13 @@ def test_core_load_plugins_without_gen():
 def test_core_plugins_configure():
     core = TankCore([CFG1], threading.Event(), TankInfo({}))
     core.plugins_configure()
+    core.plugins_cleanup()
 
 
 def test_small_stepper_file():
     core = TankCore([CFG_SMALL_STEPPER], threading.Event(), TankInfo({}))
     core.plugins_configure()
+    core.plugins_cleanup()
 
 
 def test_large_stepper_file():
@@ -279,6 +283,63 @@ def test_parse_options(options, expected):
     assert parse_options(options) == expected
 
 
+class RecordingListener(MonitoringDataListener):
+    def __init__(self, mutable=False):
+        self.mutable_monitoring_data = mutable
+        self.received = []
+
+    def monitoring_data(self, data):
+        self.received.append(data)
+
+
+def make_monitoring_data(hosts, metrics, seconds=1):
+    return [
+        {
+            'timestamp': 1500000000 + second,
+            'data': {
+                'host%d' % host: {
+                    'comment': '',
+                    'metrics': {'custom:metric%d' % metric: float(metric) for metric in range(metrics)},
+                }
+            },
+        }
+        for second in range(seconds)
+        for host in range(hosts)
+    ]
+
+
+def test_publish_monitoring_data():
+    core = TankCore([CFG_WITHOUT_GEN], threading.Event(), TankInfo({}))
+    shared, other, mutable = RecordingListener(), RecordingListener(), RecordingListener(mutable=True)
+    core.monitoring_data_listeners = [shared, other, mutable]
+    data = make_monitoring_data(2, 3)
+    core.publish_monitoring_data(data)
+    assert shared.received[0] is other.received[0]
+    assert shared.received[0] == tuple(data)
+    with pytest.raises(TypeError):
+        shared.received[0][0]['data']['host0']['metrics']['custom:metric0'] = 1
+    mutable.received[0][0]['data']['host0']['metrics']['custom:metric0'] = 1
+    assert mutable.received[0][1] == data[1]
+    assert shared.received[0][0] == data[0]
+
+
+def publish_deepcopy(core, data):
+    # how data was published before snapshots
+    for plugin in core.monitoring_data_listeners:
+        plugin.monitoring_data(copy.deepcopy(data))
+
+
+@pytest.mark.benchmark(group='monitoring publish', min_rounds=3)
+@pytest.mark.parametrize('publish', [publish_deepcopy, TankCore.publish_monitoring_data])
+def test_publish_monitoring_benchmark(benchmark, publish):
+    core = TankCore([CFG_WITHOUT_GEN], threading.Event(), TankInfo({}))
+    # Autostop, DataUploader, JsonReport, InfluxUploader, console widget and monitoring file
+    core.monitoring_data_listeners = [MonitoringDataListener() for _ in range(6)]
+    for listener in core.monitoring_data_listeners:
+        listener.monitoring_data = lambda data: None
+    benchmark(publish, core, make_monitoring_data(50, 300))
+
+
 def teardown_module(module):
     for pattern in ['monitoring_*.xml', 'agent_*', '*.log', '*.stpd_si.json', '*.stpd', '*.conf']:
         for path in glob.glob(pattern):
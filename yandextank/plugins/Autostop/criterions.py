@@ -4,6 +4,7 @@ import logging
 import re
 import time
 
+from yandextank.aggregator.histogram import Histogram
 from yandextank.common.util import expand_to_seconds, expand_to_milliseconds
 from ...common.interfaces import AbstractCriterion
 from ..Phantom import Plugin as PhantomPlugin
@@ -389,15 +390,18 @@ class SteadyCumulativeQuantilesCriterion(AbstractCriterion):
         return 'steady_cumulative'
 
     def __init__(self, autostop, param_str):
-        raise NotImplementedError
         AbstractCriterion.__init__(self)
         self.seconds_count = 0
         self.quantile_hash = ""
         self.seconds_limit = expand_to_seconds(param_str.split(',')[0])
         self.autostop = autostop
+        self.histogram = Histogram()
 
     def notify(self, data, stat):
-        quantiles = dict(zip(data["overall"]["q"]["q"], data["overall"]["q"]["values"]))
+        interval_real = data["overall"]["interval_real"]
+        self.histogram.record_aggregate(interval_real["hist"])
+        percentiles = [int(q) for q in interval_real["q"]["q"]]
+        quantiles = dict(zip(percentiles, self.histogram.percentiles(percentiles).tolist()))
         quantile_hash = json.dumps(quantiles)
         logging.debug("Cumulative quantiles hash: %s", quantile_hash)
         if self.quantile_hash == quantile_hash:
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from yandextank.aggregator import TankAggregator
+from yandextank.aggregator.aggregator import Worker
+from yandextank.plugins.Autostop.criterions import SteadyCumulativeQuantilesCriterion
+
+
+class AutostopMock(object):
+    def __init__(self):
+        self.counting = []
+
+    def add_counting(self, criterion):
+        self.counting.append(criterion)
+
+
+def second(worker, values):
+    data = {column: np.zeros(len(values), dtype=np.int64) for column in TankAggregator.load_config()}
+    data['interval_real'] = values
+    return {'overall': worker.aggregate(data)}
+
+
+@pytest.mark.parametrize('histogram_digits', [None, 2])
+def test_steady_cumulative(histogram_digits):
+    worker = Worker(TankAggregator.load_config(), True, histogram_digits)
+    criterion = SteadyCumulativeQuantilesCriterion(AutostopMock(), '3s')
+    steady = second(worker, np.full(100, 1500))
+    assert [criterion.notify(steady, None) for _ in range(4)] == [False, False, False, True]
+    outlier = second(worker, np.full(100, 300000))
+    assert not criterion.notify(outlier, None)
+    assert criterion.seconds_count == 0
+    assert [criterion.notify(steady, None) for _ in range(3)] == [False, False, False]
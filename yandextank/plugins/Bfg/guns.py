@@ -1,63 +1,54 @@
 import importlib.util
+import inspect
 import logging
 import time
-from contextlib import contextmanager
 from random import randint
 
-import requests
-from queue import Full
+from .http_client import AsyncConnectionPool, ConnectionPool, HttpResponseError, Target
+from .measure import ResultsBuffer
 from ...common.interfaces import AbstractPlugin
 
 logger = logging.getLogger(__name__)
 
-requests_logger = logging.getLogger('requests')
-requests_logger.setLevel(logging.WARNING)
-
-requests.packages.urllib3.disable_warnings()
-
 
 class GunConfigError(Exception):
     pass
 
 
 class AbstractGun(AbstractPlugin):
+    # interval_real of samples includes lateness of their shot, it is set by BFG
+    measure_from_planned_time = False
+
     def __init__(self, core, cfg):
         super(AbstractGun, self).__init__(core, cfg, 'bfg_gun')
         self.results = None
+        self.dropped_samples = None
+        self._results_buffer = None
+
+    @property
+    def results_buffer(self):
+        """
+        Buffer of samples measured in this process, it is created in the worker process
+        """
+        if self._results_buffer is None:
+            self._results_buffer = ResultsBuffer(
+                self.results, self.dropped_samples, from_planned_time=self.measure_from_planned_time
+            )
+        return self._results_buffer
 
-    @contextmanager
     def measure(self, marker):
-        start_time = time.time()
-        data_item = {
-            "send_ts": start_time,
-            "tag": marker,
-            "interval_real": None,
-            "connect_time": 0,
-            "send_time": 0,
-            "latency": 0,
-            "receive_time": 0,
-            "interval_event": 0,
-            "size_out": 0,
-            "size_in": 0,
-            "net_code": 0,
-            "proto_code": 200,
-        }
-        try:
-            yield data_item
-        except Exception as e:
-            logger.warning("%s failed while measuring with %s", marker, e)
-            if data_item["proto_code"] == 200:
-                data_item["proto_code"] = 500
-            if data_item["net_code"] == 0:
-                data_item["net_code"] == 1
-            raise
-        finally:
-            if data_item.get("interval_real") is None:
-                data_item["interval_real"] = int((time.time() - start_time) * 1e6)
-            try:
-                self.results.put(data_item, block=False)
-            except Full:
-                logger.error("Results full. Data corrupted")
+        """
+        Context manager, that gives a dict-like sample to fill and measures interval_real
+        if it is not set.
+        """
+        return self.results_buffer.sample(marker)
+
+    def flush_results(self):
+        """
+        Send measured samples to results queue, called by worker when it is idle and before teardown
+        """
+        if self._results_buffer is not None:
+            self._results_buffer.flush()
 
     def setup(self):
         pass
@@ -65,6 +56,12 @@ class AbstractGun(AbstractPlugin):
     def shoot(self, missile, marker):
         raise NotImplementedError("Gun should implement 'shoot(self, missile, marker)' method")
 
+    async def async_shoot(self, missile, marker):
+        """
+        Shot made by asyncio worker, guns that do not implement it block the event loop while shooting
+        """
+        self.shoot(missile, marker)
+
     def teardown(self):
         pass
 
@@ -94,23 +91,66 @@ class LogGun(AbstractGun):
 
 
 class HttpGun(AbstractGun):
+    """
+    Http gun keeps a pool of keep-alive connections in every worker process.
+    Missile is either an uri to GET from base_address or a whole http request sent as is.
+    """
+
     SECTION = 'http_gun'
+    POOL_CLASS = ConnectionPool
 
     def __init__(self, core, cfg):
         super(HttpGun, self).__init__(core, cfg)
         self.base_address = cfg["base_address"]
+        self.target = Target(self.base_address)
+        self.timeout = float(cfg.get("timeout", 11))
+        self.pool = None
+
+    def setup(self):
+        self.pool = self.POOL_CLASS(self.target, self.timeout)
+
+    def shoot(self, missile, marker):
+        logger.debug("Missile: %s\n%s", marker, missile)
+        with self.measure(marker) as di:
+            try:
+                self.pool.request(missile, di)
+            except (OSError, HttpResponseError) as e:
+                self._request_failed(di, e)
+
+    @staticmethod
+    def _request_failed(di, error):
+        if isinstance(error, HttpResponseError):
+            logger.debug("Bad response: %s", error)
+            di["proto_code"] = 999
+            return
+        logger.debug("Connection error", exc_info=True)
+        # asyncio and socket timeouts are TimeoutError
+        di["net_code"] = 110 if isinstance(error, TimeoutError) else error.errno or 1
+        di["proto_code"] = 0
+
+    def teardown(self):
+        if self.pool:
+            self.pool.close()
+
+
+class AsyncHttpGun(HttpGun):
+    """
+    Http gun for asyncio worker
+    """
+
+    SECTION = 'async_http_gun'
+    POOL_CLASS = AsyncConnectionPool
 
     def shoot(self, missile, marker):
+        raise NotImplementedError("Async http gun should be used with asyncio worker type")
+
+    async def async_shoot(self, missile, marker):
         logger.debug("Missile: %s\n%s", marker, missile)
-        logger.debug("Sending request: %s", self.base_address + missile)
         with self.measure(marker) as di:
             try:
-                r = requests.get(self.base_address + missile, verify=False)
-                di["proto_code"] = r.status_code
-            except requests.ConnectionError:
-                logger.debug("Connection error", exc_info=True)
-                di["net_code"] = 1
-                di["proto_code"] = 500
+                await self.pool.request(missile, di)
+            except (OSError, HttpResponseError) as e:
+                self._request_failed(di, e)
 
 
 class SqlGun(AbstractGun):
@@ -257,15 +297,33 @@ class UltimateGun(AbstractGun):
         if callable(getattr(self.load_test, "teardown", None)):
             self.load_test.teardown()
 
-    def shoot(self, missile, marker):
+    def _scenario(self, marker):
         marker = marker.rsplit("#", 1)[0]  # support enum_ammo
         if not marker:
             marker = "default"
         scenario = getattr(self.load_test, marker, None)
-        if callable(scenario):
+        if not callable(scenario):
+            logger.warning("Scenario not found: %s", marker)
+            return marker, None
+        return marker, scenario
+
+    def shoot(self, missile, marker):
+        marker, scenario = self._scenario(marker)
+        if scenario:
             try:
                 scenario(missile)
             except Exception as e:
                 logger.warning("Scenario %s failed with %s", marker, e, exc_info=True)
-        else:
-            logger.warning("Scenario not found: %s", marker)
+
+    async def async_shoot(self, missile, marker):
+        """
+        Coroutine scenarios are awaited, ordinary ones are called in the event loop
+        """
+        marker, scenario = self._scenario(marker)
+        if scenario:
+            try:
+                result = scenario(missile)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning("Scenario %s failed with %s", marker, e, exc_info=True)
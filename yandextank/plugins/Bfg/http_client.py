@@ -0,0 +1,355 @@
+"""
+HTTP/1.1 client parts for BFG http guns: requests are built from missiles,
+responses are read with keep-alive support and measured by phases
+"""
+
+import asyncio
+import errno
+import re
+import socket
+import ssl
+import time
+from urllib.parse import urlsplit
+
+# missile that is a whole http request, e.g. from phantom ammo
+RAW_REQUEST_RE = re.compile(rb'^([A-Z]+) \S+ HTTP/1\.[01]\r?\n')
+
+NO_BODY_STATUSES = {204, 304}
+
+
+class HttpResponseError(Exception):
+    pass
+
+
+class StaleConnectionError(ConnectionResetError):
+    """
+    Connection was closed before response was started
+    """
+
+
+class Target(object):
+    """
+    Parsed base_address of http guns
+    """
+
+    def __init__(self, base_address):
+        url = urlsplit(base_address if '://' in base_address else 'http://' + base_address)
+        self.ssl = url.scheme == 'https'
+        self.host = url.hostname
+        self.port = url.port or (443 if self.ssl else 80)
+        self.host_header = url.netloc.rsplit('@', 1)[-1].encode('idna')
+        self.path = url.path.rstrip('/').encode('utf8')
+
+
+def make_request(missile, target):
+    """
+    :returns: (method, request bytes), missile is sent as is if it is a whole http request,
+        otherwise it is a uri to GET from target
+    """
+    if isinstance(missile, str):
+        missile = missile.encode('utf8')
+    match = RAW_REQUEST_RE.match(missile)
+    if match:
+        return match.group(1), missile
+    return b'GET', b'GET %s%s HTTP/1.1\r\nHost: %s\r\n\r\n' % (target.path, missile, target.host_header)
+
+
+class ResponseHead(object):
+    def __init__(self, status_line):
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b'HTTP/'):
+            raise HttpResponseError('Bad status line: %r' % status_line[:100])
+        self.version = parts[0]
+        self.status = int(parts[1])
+        self.size = len(status_line)
+        self.headers = {}
+
+    def add_header(self, line):
+        self.size += len(line)
+        name, _, value = line.partition(b':')
+        self.headers[name.strip().lower()] = value.strip().lower()
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get(b'connection')
+        if self.version == b'HTTP/1.0':
+            return connection == b'keep-alive'
+        return connection != b'close'
+
+    def body_length(self, method):
+        """
+        :returns: body length, -1 for chunked body, None if body is read until connection close
+        """
+        if method == b'HEAD' or self.status < 200 or self.status in NO_BODY_STATUSES:
+            return 0
+        if self.headers.get(b'transfer-encoding', b'').endswith(b'chunked'):
+            return -1
+        if b'content-length' in self.headers:
+            return int(self.headers[b'content-length'])
+        return None
+
+
+def _us(start, end):
+    return int((end - start) * 1e6)
+
+
+def _ssl_context(target):
+    if not target.ssl:
+        return None
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class AsyncConnectionPool(object):
+    """
+    Keep-alive connections to a target for asyncio guns
+    """
+
+    def __init__(self, target, timeout):
+        self.target = target
+        self.timeout = timeout
+        self.ssl_context = _ssl_context(target)
+        self.idle = []
+
+    async def request(self, missile, measurement):
+        """
+        Send missile and read the response
+        :param measurement: dict-like sample, phases are filled as they are done, so it is filled
+            up to the failed phase if request fails
+        """
+        method, request = make_request(missile, self.target)
+        measurement['size_out'] = len(request)
+        await asyncio.wait_for(self._request(method, request, measurement), self.timeout)
+
+    async def _request(self, method, request, measurement):
+        reused = bool(self.idle)
+        while True:
+            connection = await self._connect(measurement)
+            try:
+                keep_alive = await self._exchange(connection, method, request, measurement)
+                break
+            except StaleConnectionError:
+                connection[1].close()
+                if not reused:
+                    raise
+                # keep-alive connection was closed by server while idle, retry on a new one
+                reused = False
+            except BaseException:
+                connection[1].close()
+                raise
+        if keep_alive:
+            self.idle.append(connection)
+        else:
+            connection[1].close()
+
+    async def _connect(self, measurement):
+        while self.idle:
+            connection = self.idle.pop()
+            if not connection[0].at_eof():
+                return connection
+            connection[1].close()
+        start = time.time()
+        connection = await asyncio.open_connection(
+            self.target.host, self.target.port, ssl=self.ssl_context, server_hostname=self.target.host if self.ssl_context else None
+        )
+        measurement['connect_time'] = _us(start, time.time())
+        return connection
+
+    async def _exchange(self, connection, method, request, measurement):
+        reader, writer = connection
+        start = time.time()
+        try:
+            writer.write(request)
+            await writer.drain()
+        except ConnectionError as e:
+            raise StaleConnectionError(e.errno, str(e))
+        sent = time.time()
+        measurement['send_time'] = _us(start, sent)
+        try:
+            status_line = await reader.readline()
+        except ConnectionError as e:
+            raise StaleConnectionError(e.errno, str(e))
+        first_byte = time.time()
+        measurement['latency'] = _us(sent, first_byte)
+        if not status_line:
+            raise StaleConnectionError(errno.ECONNRESET, 'Connection closed by server')
+        head = ResponseHead(status_line)
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise HttpResponseError('Connection closed while reading headers')
+            if line in (b'\r\n', b'\n'):
+                head.size += len(line)
+                break
+            head.add_header(line)
+        length = head.body_length(method)
+        if length == -1:
+            body_size = await _read_chunked(reader)
+        elif length is None:
+            body_size = len(await reader.read())
+        else:
+            await reader.readexactly(length)
+            body_size = length
+        measurement['receive_time'] = _us(first_byte, time.time())
+        measurement['size_in'] = head.size + body_size
+        measurement['proto_code'] = head.status
+        return length is not None and head.keep_alive
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+
+async def _read_chunked(reader):
+    size = 0
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise HttpResponseError('Connection closed while reading body')
+        chunk_size = int(line.split(b';', 1)[0], 16)
+        size += len(line)
+        if not chunk_size:
+            break
+        await reader.readexactly(chunk_size + 2)
+        size += chunk_size + 2
+    # trailers
+    while True:
+        line = await reader.readline()
+        size += len(line)
+        if line in (b'\r\n', b'\n', b''):
+            return size
+
+
+class ConnectionPool(object):
+    """
+    Keep-alive connections to a target for blocking guns. A connection is taken
+    from the pool for a request, so green threads of a worker do not share them.
+    """
+
+    def __init__(self, target, timeout):
+        self.target = target
+        self.timeout = timeout
+        self.ssl_context = _ssl_context(target)
+        self.idle = []
+
+    def request(self, missile, measurement):
+        """
+        Send missile and read the response
+        :param measurement: dict-like sample, phases are filled as they are done, so it is filled
+            up to the failed phase if request fails
+        """
+        method, request = make_request(missile, self.target)
+        measurement['size_out'] = len(request)
+        reused = bool(self.idle)
+        while True:
+            connection = self._connect(measurement)
+            try:
+                keep_alive = self._exchange(connection, method, request, measurement)
+                break
+            except StaleConnectionError:
+                _close(connection)
+                if not reused:
+                    raise
+                # keep-alive connection was closed by server while idle, retry on a new one
+                reused = False
+            except BaseException:
+                _close(connection)
+                raise
+        if keep_alive:
+            self.idle.append(connection)
+        else:
+            _close(connection)
+
+    def _connect(self, measurement):
+        try:
+            return self.idle.pop()
+        except IndexError:
+            pass
+        start = time.time()
+        sock = socket.create_connection((self.target.host, self.target.port), self.timeout)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.ssl_context:
+                sock = self.ssl_context.wrap_socket(sock, server_hostname=self.target.host)
+        except BaseException:
+            sock.close()
+            raise
+        measurement['connect_time'] = _us(start, time.time())
+        return sock, sock.makefile('rb')
+
+    def _exchange(self, connection, method, request, measurement):
+        sock, rfile = connection
+        start = time.time()
+        try:
+            sock.sendall(request)
+        except ConnectionError as e:
+            raise StaleConnectionError(e.errno, str(e))
+        sent = time.time()
+        measurement['send_time'] = _us(start, sent)
+        try:
+            status_line = rfile.readline()
+        except ConnectionError as e:
+            raise StaleConnectionError(e.errno, str(e))
+        first_byte = time.time()
+        measurement['latency'] = _us(sent, first_byte)
+        if not status_line:
+            raise StaleConnectionError(errno.ECONNRESET, 'Connection closed by server')
+        head = ResponseHead(status_line)
+        while True:
+            line = rfile.readline()
+            if not line:
+                raise HttpResponseError('Connection closed while reading headers')
+            if line in (b'\r\n', b'\n'):
+                head.size += len(line)
+                break
+            head.add_header(line)
+        length = head.body_length(method)
+        if length == -1:
+            body_size = _read_chunked_sync(rfile)
+        elif length is None:
+            body_size = len(rfile.read())
+        else:
+            _read_exactly(rfile, length)
+            body_size = length
+        measurement['receive_time'] = _us(first_byte, time.time())
+        measurement['size_in'] = head.size + body_size
+        measurement['proto_code'] = head.status
+        return length is not None and head.keep_alive
+
+    def close(self):
+        while self.idle:
+            _close(self.idle.pop())
+
+
+def _close(connection):
+    sock, rfile = connection
+    rfile.close()
+    sock.close()
+
+
+def _read_exactly(rfile, length):
+    if len(rfile.read(length)) < length:
+        raise HttpResponseError('Connection closed while reading body')
+
+
+def _read_chunked_sync(rfile):
+    size = 0
+    while True:
+        line = rfile.readline()
+        if not line:
+            raise HttpResponseError('Connection closed while reading body')
+        chunk_size = int(line.split(b';', 1)[0], 16)
+        size += len(line)
+        if not chunk_size:
+            break
+        _read_exactly(rfile, chunk_size + 2)
+        size += chunk_size + 2
+    # trailers
+    while True:
+        line = rfile.readline()
+        size += len(line)
+        if line in (b'\r\n', b'\n', b''):
+            return size
@@ -0,0 +1,178 @@
+"""
+Per-process buffer of measured samples, filled by AbstractGun.measure
+"""
+
+import contextvars
+import logging
+import time
+from queue import Full
+
+import numpy as np
+
+from .reader import RESULT_DTYPE
+
+logger = logging.getLogger(__name__)
+
+# samples are sent to results queue in batches of this size or at least this often
+RESULTS_BATCH = 1000
+RESULTS_FLUSH_INTERVAL = 0.5
+
+SAMPLE_FIELDS = ('tag',) + RESULT_DTYPE.names
+_SAMPLE_FIELDS_SET = frozenset(SAMPLE_FIELDS)
+
+# lateness of the running shot in microseconds, it is set by worker when the shot is started,
+# so that green threads and coroutines of a worker have their own values
+shot_lateness = contextvars.ContextVar('shot_lateness', default=0)
+
+# fields that scenarios set but are not measured, each one is warned about once per process
+_unknown_fields = set()
+
+
+class Sample(object):
+    """
+    Measured sample, it is filled through dict interface by guns and scenarios.
+    Sample is a context manager itself, it is committed to its buffer on exit.
+    Fields that are not measured are ignored, as they were with a plain dict.
+    """
+
+    __slots__ = SAMPLE_FIELDS + ('buffer',)
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and issubclass(exc_type, Exception):
+            logger.warning("%s failed while measuring with %s", self.tag, exc_value)
+            if self.proto_code == 200:
+                self.proto_code = 500
+            if self.net_code == 0:
+                self.net_code = 1
+        self.buffer.commit(self)
+        return False
+
+    def reset(self, marker, send_ts):
+        self.tag = marker
+        self.send_ts = send_ts
+        self.interval_real = None
+        self.connect_time = 0
+        self.send_time = 0
+        self.latency = 0
+        self.receive_time = 0
+        self.interval_event = 0
+        self.size_out = 0
+        self.size_in = 0
+        self.net_code = 0
+        self.proto_code = 200
+        self.lateness = shot_lateness.get()
+        return self
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in _SAMPLE_FIELDS_SET:
+            if key not in _unknown_fields:
+                _unknown_fields.add(key)
+                logger.warning("Unknown measured field %s is ignored", key)
+            return
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in _SAMPLE_FIELDS_SET
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in _SAMPLE_FIELDS_SET else default
+
+    def keys(self):
+        return SAMPLE_FIELDS
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in SAMPLE_FIELDS]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+
+class ResultsBuffer(object):
+    """
+    Samples are written into preallocated rows of a structured array and are sent
+    to results queue by batches. Batches that do not fit into the queue are dropped
+    and counted in shared dropped samples counter.
+    """
+
+    def __init__(
+        self,
+        results,
+        dropped_samples=None,
+        size=RESULTS_BATCH,
+        flush_interval=RESULTS_FLUSH_INTERVAL,
+        from_planned_time=False,
+    ):
+        """
+        :type results: multiprocessing.Queue
+        :type dropped_samples: multiprocessing.Value
+        :param from_planned_time: measure interval_real from planned time of the shot,
+            i.e. add shot lateness to it
+        """
+        self.results = results
+        self.dropped_samples = dropped_samples
+        self.from_planned_time = from_planned_time
+        self.flush_interval = flush_interval
+        self.data = np.zeros(size, dtype=RESULT_DTYPE)
+        self.tags = [None] * size
+        self.count = 0
+        self.dropped = 0
+        self.last_flush = time.time()
+
+    def sample(self, marker):
+        """
+        Sample to be filled, it should be committed when the shot is measured
+        """
+        return Sample(self).reset(marker, time.time())
+
+    def commit(self, sample):
+        now = time.time()
+        if sample.interval_real is None:
+            sample.interval_real = int((now - sample.send_ts) * 1e6)
+        if self.from_planned_time:
+            sample.interval_real += sample.lateness
+        self.tags[self.count] = sample.tag
+        self.data[self.count] = (
+            sample.send_ts,
+            sample.interval_real,
+            sample.connect_time,
+            sample.send_time,
+            sample.latency,
+            sample.receive_time,
+            sample.interval_event,
+            sample.size_out,
+            sample.size_in,
+            sample.net_code,
+            sample.proto_code,
+            sample.lateness,
+        )
+        self.count += 1
+        if self.count == len(self.data) or now - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.time()
+        if not self.count:
+            return
+        batch = (self.data[: self.count].copy(), self.tags[: self.count])
+        try:
+            self.results.put(batch, block=False)
+        except Full:
+            self.dropped += self.count
+            if self.dropped_samples is not None:
+                with self.dropped_samples.get_lock():
+                    self.dropped_samples.value += self.count
+            logger.warning("Results queue is full, %d samples dropped, %d in total", self.count, self.dropped)
+        self.count = 0
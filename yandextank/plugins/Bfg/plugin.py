@@ -1,15 +1,13 @@
 import logging
 import time
-from threading import Event, Thread
+from threading import Event
 
-from .guns import LogGun, SqlGun, CustomGun, HttpGun, ScenarioGun, UltimateGun
-from .reader import BfgReader, BfgStatsReader
+from .guns import LogGun, SqlGun, CustomGun, HttpGun, AsyncHttpGun, ScenarioGun, UltimateGun
+from .reader import BfgReader, BfgStatsReader, PhoutWriter
 from .widgets import BfgInfoWidget
-from ..Phantom import PhantomReader, string_to_df
-from .worker import BFGMultiprocessing, BFGGreen
+from .worker import BFGMultiprocessing, BFGGreen, BFGAsync
 from ..Console import Plugin as ConsolePlugin
 from ...common.interfaces import GeneratorPlugin
-from ...common.util import FileMultiReader
 from ...stepper import StepperWrapper
 
 
@@ -27,13 +25,13 @@ class Plugin(GeneratorPlugin):
         self.stepper_wrapper = StepperWrapper(core, cfg)
         self.log.info("Initialized BFG")
         self.report_filename = "bfgout.log"
-        self.results_listener = None
 
         self.gun_classes = {
             'log': LogGun,
             'sql': SqlGun,
             'custom': CustomGun,
             'http': HttpGun,
+            'async_http': AsyncHttpGun,
             'scenario': ScenarioGun,
             'ultimate': UltimateGun,
         }
@@ -49,54 +47,49 @@ class Plugin(GeneratorPlugin):
         self.log.info("Configuring BFG...")
         self.stepper_wrapper.read_config()
         self.stepper_wrapper.prepare_stepper()
+        # end_test is not reached when the test fails to start
+        self.add_cleanup(self.stepper_wrapper.release_stpd)
         with open(self.report_filename, 'w'):
             pass
         self.core.add_artifact_file(self.report_filename)
 
-    def _write_results_into_file(self):
-        """listens for messages on the q, writes to file."""
-        reader = BfgReader(self.bfg.results, self.close_event)
-        columns = [
-            'receive_ts',
-            'tag',
-            'interval_real',
-            'connect_time',
-            'send_time',
-            'latency',
-            'receive_time',
-            'interval_event',
-            'size_out',
-            'size_in',
-            'net_code',
-            'proto_code',
-        ]
-        for entry in reader:
-            if entry is not None:
-                entry.receive_ts = entry.receive_ts.round(3)
-                with open(self.report_filename, 'a') as report_file:
-                    report_file.write(entry.to_csv(index=False, header=False, sep='\t', columns=columns))
-            time.sleep(0.1)
-
-    def get_reader(self, parser=string_to_df):
+    def get_reader(self):
         if self.reader is None:
-            self.reader = FileMultiReader(self.report_filename, self.close_event)
-        return PhantomReader(self.reader.get_file(), parser=parser)
+            # results go to aggregator directly, phout artifact is written aside
+            self.reader = BfgReader(
+                self.bfg.results,
+                self.close_event,
+                PhoutWriter(self.report_filename, write_lateness=self.get_option('phout_lateness')),
+            )
+        return self.reader
 
     def get_stats_reader(self):
         if self.stats_reader is None:
-            self.stats_reader = BfgStatsReader(self.bfg.instance_counter, self.stepper_wrapper.steps)
+            self.stats_reader = BfgStatsReader(
+                self.bfg.instance_counter,
+                self.stepper_wrapper.steps,
+                self.bfg.dropped_samples,
+                self.bfg.max_lateness,
+                self.bfg.overdue_tasks,
+                self.bfg.workers,
+            )
         return self.stats_reader
 
     @property
     def bfg(self):
         if self._bfg is None:
-            BFG = BFGGreen if self.get_option("worker_type", "") == "green" else BFGMultiprocessing
+            worker_types = {'green': BFGGreen, 'asyncio': BFGAsync}
+            BFG = worker_types.get(self.get_option("worker_type", ""), BFGMultiprocessing)
             self._bfg = BFG(
                 gun=self.gun,
                 instances=self.stepper_wrapper.instances,
                 stpd_filename=self.stepper_wrapper.stpd,
                 cached_stpd=self.get_option("cached_stpd"),
                 green_threads_per_instance=int(self.get_option('green_threads_per_instance', 1000)),
+                coroutines_per_instance=int(self.get_option('coroutines_per_instance', 1000)),
+                measure_from_planned_time=self.get_option('measure_from_planned_time'),
+                min_instances=self.get_option('min_instances'),
+                feeder=self.get_option('feeder'),
             )
         return self._bfg
 
@@ -120,8 +113,6 @@ class Plugin(GeneratorPlugin):
         else:
             raise NotImplementedError('No such gun type implemented: "%s"' % gun_type)
 
-        self.results_listener = Thread(target=self._write_results_into_file, name="ResultsQueueListener")
-
         try:
             console = self.core.get_plugin_of_type(ConsolePlugin)
         except KeyError as ex:
@@ -138,10 +129,6 @@ class Plugin(GeneratorPlugin):
         self.log.info("Starting BFG")
         self.start_time = time.time()
         self.bfg.start()
-        if self.results_listener is not None:
-            self.results_listener.start()
-        else:
-            self.log.fatal("Result listener is not initialized")
 
     def is_test_finished(self):
         if self.bfg.running():
@@ -156,6 +143,11 @@ class Plugin(GeneratorPlugin):
         if self.bfg.running():
             self.log.info("Terminating BFG")
             self.bfg.stop()
+        if self.bfg.dropped_samples.value:
+            self.log.warning(
+                "%d samples were dropped because results queue was full", self.bfg.dropped_samples.value
+            )
         self.close_event.set()
         self.stats_reader.close()
+        self.stepper_wrapper.release_stpd()
         return retcode
@@ -1,22 +1,50 @@
 import pandas as pd
+import numpy as np
 import time
 import itertools as itt
-from queue import Empty
+from queue import Empty, Queue
 from threading import Lock
 import threading as th
 import logging
 
+from ..Phantom.reader import phout_columns, _strip_tag_suffix
+
 logger = logging.getLogger(__name__)
 
+# measured values except tag, they are sent from workers as typed columns,
+# lateness is how late the shot was started after its planned time, in microseconds
+RESULT_DTYPE = np.dtype(
+    [('send_ts', np.float64)] + [(name, np.int64) for name in phout_columns[2:]] + [('lateness', np.int64)]
+)
+
+# shot lateness is written after phout columns, so that phout columns keep their positions
+PHOUT_LATENESS_COLUMNS = phout_columns + ['lateness']
+
+
+def records_to_batch(records):
+    """
+    Pack measure() dicts into (structured array of numeric columns, list of tags)
+    """
+    names = RESULT_DTYPE.names
+    batch = np.array([tuple(record.get(name, 0) for name in names) for record in records], dtype=RESULT_DTYPE)
+    return batch, [record['tag'] for record in records]
+
 
-def records_to_df(records):
-    records = pd.DataFrame.from_records(records)
-    records['receive_ts'] = records['send_ts'] + records['interval_real'] / 1e6
-    records['receive_sec'] = records.receive_ts.astype(int)
-    # TODO: consider configuration for the following:
-    records['tag'] = records.tag.str.rsplit('#', 1, expand=True)[0]
-    records.set_index(['receive_sec'], inplace=True)
-    return records
+def batches_to_df(batches):
+    """
+    Make a data frame of the same columns and index PhantomReader gives,
+    so it can be aggregated without phout text round trip
+    """
+    data = np.concatenate([batch for batch, _ in batches])
+    tags = pd.Categorical(list(itt.chain.from_iterable(tags for _, tags in batches)))
+    if '' in tags.categories:
+        # empty tags are read from phout as NaN
+        tags = tags.remove_categories([''])
+    chunk = pd.DataFrame({name: data[name] for name in RESULT_DTYPE.names})
+    chunk.insert(1, 'tag', _strip_tag_suffix(tags))
+    chunk['receive_ts'] = chunk.send_ts + chunk.interval_real / 1e6
+    chunk.index = pd.Index(chunk.receive_ts.to_numpy().astype(np.int64), name='receive_sec')
+    return chunk
 
 
 def _expand_steps(steps):
@@ -24,12 +52,16 @@ def _expand_steps(steps):
 
 
 class BfgReader(object):
-    def __init__(self, results, closed):
-        self.buffer = ""
-        self.stat_buffer = ""
+    """
+    Reads result batches of BFG workers and gives them to aggregator as data frames,
+    phout artifact is written from the same data frames by artifact writer
+    """
+
+    def __init__(self, results, closed, artifact_writer=None):
         self.results = results
         self.closed = closed
-        self.records = []
+        self.artifact_writer = artifact_writer
+        self.batches = []
         self.lock = Lock()
         self.thread = th.Thread(target=self._cacher)
         self.thread.start()
@@ -37,34 +69,83 @@ class BfgReader(object):
     def _cacher(self):
         while True:
             try:
-                self.records.append(self.results.get(block=False))
+                batch = self.results.get(block=False)
             except Empty:
                 if not self.closed.is_set():
                     time.sleep(0.1)
-                else:
-                    break
+                    continue
+                break
+            with self.lock:
+                self.batches.append(batch)
 
     def __next__(self):
-        if self.closed.is_set():
-            self.thread.join()
-            raise StopIteration
+        finished = self.closed.is_set() and not self.thread.is_alive()
         with self.lock:
-            records = self.records
-            self.records = []
-        if records:
-            return records_to_df(records)
+            batches = self.batches
+            self.batches = []
+        if batches:
+            chunk = batches_to_df(batches)
+            if self.artifact_writer:
+                self.artifact_writer.write(chunk)
+            return chunk
+        if finished:
+            if self.artifact_writer:
+                self.artifact_writer.close()
+            raise StopIteration
         return None
 
     def __iter__(self):
         return self
 
 
+class PhoutWriter(object):
+    """
+    Writes data frames to phout file in a background thread
+    """
+
+    def __init__(self, filename, write_lateness=False):
+        self.filename = filename
+        self.columns = PHOUT_LATENESS_COLUMNS if write_lateness else phout_columns
+        self.queue = Queue()
+        self.thread = th.Thread(target=self._writer, name="PhoutWriter")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, chunk):
+        self.queue.put(chunk)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def _writer(self):
+        with open(self.filename, 'a') as phout:
+            while True:
+                chunk = self.queue.get()
+                if chunk is None:
+                    break
+                chunk.to_csv(phout, sep='\t', header=False, index=False, columns=self.columns, float_format='%.3f')
+                phout.flush()
+
+
 class BfgStatsReader(object):
-    def __init__(self, instance_counter, steps):
+    def __init__(
+        self, instance_counter, steps, dropped_samples=None, max_lateness=None, overdue_tasks=None, workers=None
+    ):
+        """
+        :param max_lateness: shared max lateness of shots in microseconds, it is reset every second
+        :param overdue_tasks: callable that gives number of tasks due but not started
+        :param workers: callable that gives number of worker processes
+        """
         self.closed = False
         self.last_ts = 0
         self.steps = _expand_steps(steps)
         self.instance_counter = instance_counter
+        self.dropped_samples = dropped_samples
+        self.max_lateness = max_lateness
+        self.overdue_tasks = overdue_tasks
+        self.workers = workers
         self.start_time = int(time.time())
 
     def __iter__(self):
@@ -75,7 +156,17 @@ class BfgStatsReader(object):
                 reqps = 0
                 if offset >= 0 and offset < len(self.steps):
                     reqps = self.steps[offset]
-                yield [{'ts': cur_ts, 'metrics': {'instances': self.instance_counter.value, 'reqps': reqps}}]
+                metrics = {'instances': self.instance_counter.value, 'reqps': reqps}
+                if self.dropped_samples is not None:
+                    metrics['dropped_samples'] = self.dropped_samples.value
+                if self.max_lateness is not None:
+                    metrics['lateness'] = self.max_lateness.value
+                    self.max_lateness.value = 0
+                if self.overdue_tasks is not None:
+                    metrics['overdue_tasks'] = self.overdue_tasks()
+                if self.workers is not None:
+                    metrics['workers'] = self.workers()
+                yield [{'ts': cur_ts, 'metrics': metrics}]
                 self.last_ts = cur_ts
             else:
                 yield []
@@ -0,0 +1,155 @@
+"""
+Shared memory transport of tasks from BFG feeder to worker processes.
+
+Tasks are written by a single feeder into a byte ring in shared memory as
+records of a fixed header followed by marker and missile bytes. Workers claim
+records in batches under a lock and copy them out, so the feeder does not
+pickle tasks and does not write them into a pipe.
+"""
+
+import multiprocessing as mp
+import struct
+import time
+from multiprocessing import shared_memory
+
+# timestamp, marker length, missile length
+RECORD_HEADER = struct.Struct('<qHI')
+
+DEFAULT_SIZE = 16 * 1024 * 1024
+
+# feeder polls for free space with this interval when ring is full
+FULL_POLL_INTERVAL = 0.001
+
+
+class TaskRing(object):
+    """
+    Single producer, multiple consumers ring of (timestamp, missile, marker) tasks.
+
+    Producer and consumers byte positions grow monotonically, record at position
+    p starts at p % size and may wrap around the end of the buffer. Every
+    published record releases a semaphore, closing releases one more, which is
+    passed from one consumer to another to tell them there will be no tasks.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._buf = self._shm.buf
+        self._write_pos = mp.RawValue('Q', 0)
+        self._read_pos = mp.RawValue('Q', 0)
+        self._lock = mp.Lock()
+        self._available = mp.Semaphore(0)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_buf']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._buf = self._shm.buf
+
+    def put(self, tasks, timeout=None):
+        """
+        Publish tasks, waits for free space in the ring
+        :param tasks: list of (timestamp, missile, marker), missile is bytes-like, marker is str
+        :returns: number of published tasks, it is less than len(tasks) on timeout
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        published = 0
+        while published < len(tasks):
+            free = self.size - (self._write_pos.value - self._read_pos.value)
+            records = []
+            batch_size = 0
+            for timestamp, missile, marker in tasks[published:]:
+                marker = marker.encode('utf8')
+                record_size = RECORD_HEADER.size + len(marker) + len(missile)
+                if record_size > self.size:
+                    raise ValueError('Task of %d bytes does not fit into %d bytes task ring' % (record_size, self.size))
+                if batch_size + record_size > free:
+                    break
+                records += (RECORD_HEADER.pack(timestamp, len(marker), len(missile)), marker, missile)
+                batch_size += record_size
+            if records:
+                position = self._write_pos.value
+                self._write(position, b''.join(records))
+                self._write_pos.value = position + batch_size
+                count = len(records) // 3
+                for _ in range(count):
+                    self._available.release()
+                published += count
+            elif deadline is not None and time.time() >= deadline:
+                break
+            else:
+                time.sleep(FULL_POLL_INTERVAL)
+        return published
+
+    def claim(self, max_count=1, timeout=None):
+        """
+        Take up to max_count tasks, waits for at least one of them
+        :returns: list of (timestamp, missile, marker), empty list on timeout,
+            None if ring is closed and there are no more tasks
+        """
+        if not self._available.acquire(timeout != 0, timeout):
+            return []
+        count = 1
+        while count < max_count and self._available.acquire(False):
+            count += 1
+        headers = []
+        with self._lock:
+            start = position = self._read_pos.value
+            end = self._write_pos.value
+            while len(headers) < count and position < end:
+                offset = position % self.size
+                if offset + RECORD_HEADER.size <= self.size:
+                    header = RECORD_HEADER.unpack_from(self._buf, offset)
+                else:
+                    header = RECORD_HEADER.unpack(self._read(position, RECORD_HEADER.size))
+                headers.append(header)
+                position += RECORD_HEADER.size + header[1] + header[2]
+            # records are copied out before their space is given back to the feeder
+            data = self._read(start, position - start)
+            self._read_pos.value = position
+        tasks = []
+        position = 0
+        for timestamp, marker_len, missile_len in headers:
+            position += RECORD_HEADER.size
+            marker = data[position : position + marker_len].decode('utf8')
+            position += marker_len
+            tasks.append((timestamp, data[position : position + missile_len], marker))
+            position += missile_len
+        if len(tasks) < count:
+            # closing signal is claimed, pass it to the next consumer
+            self._available.release()
+            if not tasks:
+                return None
+        return tasks
+
+    def close(self):
+        """
+        No more tasks will be published
+        """
+        self._available.release()
+
+    def unlink(self):
+        """
+        Free shared memory, should be called by the creator when consumers are finished
+        """
+        self._buf = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def _write(self, position, data):
+        offset = position % self.size
+        first = min(len(data), self.size - offset)
+        data = memoryview(data)
+        self._buf[offset : offset + first] = data[:first]
+        if first < len(data):
+            self._buf[: len(data) - first] = data[first:]
+
+    def _read(self, position, length):
+        offset = position % self.size
+        first = min(length, self.size - offset)
+        if first == length:
+            return bytes(self._buf[offset : offset + length])
+        return bytes(self._buf[offset:]) + bytes(self._buf[: length - first])
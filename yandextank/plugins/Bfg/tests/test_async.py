@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import numpy as np
+
+from yandextank.plugins.Bfg.guns import AbstractGun
+from yandextank.plugins.Bfg.worker import BFGAsync
+
+
+class SleepingGun(AbstractGun):
+    """
+    Responds in 200 ms, missile is its planned time in milliseconds
+    """
+
+    def __init__(self):
+        self.results = None
+        self.dropped_samples = None
+        self._results_buffer = None
+
+    async def async_shoot(self, missile, marker):
+        with self.measure(marker) as di:
+            di['size_out'] = int(missile)
+            await asyncio.sleep(0.2)
+
+
+def test_asyncio_worker_timing(tmp_path):
+    stpd = tmp_path / 'test.stpd'
+    with open(stpd, 'w') as f:
+        for timestamp in range(0, 1000, 10):
+            missile = str(timestamp)
+            f.write('%d %d tag\n%s\n' % (len(missile), timestamp, missile))
+    bfg = BFGAsync(SleepingGun(), 1, str(stpd), coroutines_per_instance=100)
+    bfg.start()
+    batches = []
+    deadline = time.time() + 30
+    while bfg.running() and time.time() < deadline:
+        time.sleep(0.1)
+        while not bfg.results.empty():
+            batches.append(bfg.results.get_nowait()[0])
+    time.sleep(0.1)
+    while not bfg.results.empty():
+        batches.append(bfg.results.get_nowait()[0])
+    data = np.concatenate(batches)
+    assert len(data) == 100
+    assert bfg.instance_counter.value == 0
+    # shots are concurrent, 200 ms responses do not delay shots planned every 10 ms
+    lateness = data['send_ts'] - bfg.start_time - data['size_out'] / 1000.0
+    assert lateness.max() < 0.1
+    # lateness is measured by worker the same way
+    assert (np.abs(data['lateness'] / 1e6 - lateness) < 0.01).all()
+    assert bfg.shots_started.value == 100
+    assert bfg.overdue_tasks() == 0
+    assert (data['interval_real'] >= 200000).all()
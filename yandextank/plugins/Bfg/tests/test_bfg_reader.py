@@ -0,0 +1,81 @@
+import threading
+from queue import Queue
+
+import pandas as pd
+import pytest
+
+from yandextank.plugins.Bfg.reader import BfgReader, PhoutWriter, batches_to_df, records_to_batch
+from yandextank.plugins.Phantom.reader import bytes_to_df, phout_columns
+
+
+def make_records(count, start=1500000000.0):
+    return [
+        {
+            'send_ts': start + i * 0.25,
+            'tag': ['case1#0', 'case2', ''][i % 3],
+            'interval_real': 1000 + i,
+            'connect_time': 1,
+            'send_time': 2,
+            'latency': 3,
+            'receive_time': 4,
+            'interval_event': 5,
+            'size_out': 6,
+            'size_in': 7,
+            'net_code': 0,
+            'proto_code': 200,
+        }
+        for i in range(count)
+    ]
+
+
+def test_same_as_phout(tmp_path):
+    phout = str(tmp_path / 'bfgout.log')
+    chunk = batches_to_df([records_to_batch(make_records(10)), records_to_batch(make_records(5, 1500000010.0))])
+    writer = PhoutWriter(phout)
+    writer.write(chunk)
+    writer.close()
+    with open(phout, 'rb') as f:
+        expected = bytes_to_df(f.read())
+    # lateness is an extra column, it is not written to phout by default
+    pd.testing.assert_frame_equal(chunk.drop(columns='lateness'), expected, check_categorical=False)
+
+
+def test_phout_lateness(tmp_path):
+    phout = tmp_path / 'bfgout.log'
+    records = make_records(3)
+    records[1]['lateness'] = 1500
+    writer = PhoutWriter(str(phout), write_lateness=True)
+    writer.write(batches_to_df([records_to_batch(records)]))
+    writer.close()
+    lines = [line.split('\t') for line in phout.read_text().splitlines()]
+    assert [len(line) for line in lines] == [len(phout_columns) + 1] * 3
+    assert [line[-1] for line in lines] == ['0', '1500', '0']
+
+
+def test_reader_drains_results(tmp_path):
+    results = Queue()
+    closed = threading.Event()
+    phout = tmp_path / 'bfgout.log'
+    reader = BfgReader(results, closed, PhoutWriter(str(phout)))
+    results.put(records_to_batch(make_records(3)))
+    results.put(records_to_batch(make_records(4)))
+    closed.set()
+    chunks = [chunk for chunk in reader if chunk is not None]
+    assert sum(len(chunk) for chunk in chunks) == 7
+    assert len(phout.read_text().splitlines()) == 7
+
+
+def direct(records):
+    return batches_to_df([records_to_batch(records)])
+
+
+def csv_round_trip(records):
+    text = pd.DataFrame.from_records(records).to_csv(index=False, header=False, sep='\t', columns=phout_columns)
+    return bytes_to_df(text.encode('utf8'))
+
+
+@pytest.mark.benchmark(group='bfg results')
+@pytest.mark.parametrize('decode', [direct, csv_round_trip])
+def test_results_benchmark(benchmark, decode):
+    records = make_records(10000)
+    assert len(benchmark(decode, records)) == len(records)
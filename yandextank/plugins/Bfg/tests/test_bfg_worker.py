@@ -0,0 +1,139 @@
+import contextvars
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from yandextank.plugins.Bfg import worker
+from yandextank.plugins.Bfg.guns import AbstractGun
+from yandextank.plugins.Bfg.ring import TaskRing
+from yandextank.plugins.Bfg.worker import FEED_BATCH, BFGMultiprocessing
+from yandextank.stepper import stpd_to_binary
+
+
+class Gun(object):
+    results = None
+
+
+@pytest.fixture
+def bfg():
+    bfg = BFGMultiprocessing(Gun(), 1, 'unused.stpd')
+    yield bfg
+    bfg.task_ring.unlink()
+
+
+def test_overdue_tasks(bfg):
+    assert bfg.overdue_tasks() == 0
+    for start in range(0, 4 * FEED_BATCH, FEED_BATCH):
+        assert bfg._publish([(timestamp * 10, b'', '') for timestamp in range(start, start + FEED_BATCH)])
+    bfg.start_time = time.time() - FEED_BATCH * 20 / 1000.0
+    # first two batches are due
+    assert bfg.overdue_tasks() == 2 * FEED_BATCH
+    # shot lateness is set for the shot context, not for the following tests
+    contextvars.copy_context().run(bfg._shot_started, 0.5)
+    bfg._shot_finished()
+    assert bfg.overdue_tasks() == 2 * FEED_BATCH - 1
+    assert bfg.max_lateness.value == 500000
+    assert bfg.instance_counter.value == 0
+
+
+def test_overdue_tasks_by_plan(tmp_path):
+    stpd = str(tmp_path / 'test.stpd')
+    with open(stpd, 'w') as f:
+        for timestamp in range(0, 4 * FEED_BATCH * 100, 100):
+            f.write('1 %d tag\nx\n' % timestamp)
+    stpd_to_binary(stpd, stpd + '.bin')
+    bfg = BFGMultiprocessing(Gun(), 1, stpd + '.bin')
+    # there are no workers, the ring is full with a single batch
+    bfg.task_ring.unlink()
+    bfg.task_ring = TaskRing(2048)
+    feeder = threading.Thread(target=bfg._feed_tasks)
+    feeder.start()
+    try:
+        time.sleep(0.1)
+        bfg.start_time = time.time() - (2 * FEED_BATCH * 100 - 50) / 1000.0
+        assert bfg.overdue_tasks() == 2 * FEED_BATCH
+    finally:
+        bfg.quit.set()
+        feeder.join()
+        bfg.task_ring.unlink()
+
+
+class SleepingGun(AbstractGun):
+    def __init__(self):
+        self.results = None
+        self.dropped_samples = None
+        self._results_buffer = None
+
+    def shoot(self, missile, marker):
+        with self.measure(marker):
+            time.sleep(0.05)
+
+
+def test_autoscaling(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker, 'SCALE_INTERVAL', 0.2)
+    monkeypatch.setattr(worker, 'SCALE_DOWN_AFTER', 2)
+    stpd = tmp_path / 'test.stpd'
+    with open(stpd, 'w') as f:
+        # 200 rps of 50 ms shots need 10 workers for a second, then 10 rps need one worker for 3 seconds
+        for timestamp in list(range(0, 1000, 5)) + list(range(1000, 4000, 100)):
+            f.write('1 %d tag\nx\n' % timestamp)
+    bfg = BFGMultiprocessing(SleepingGun(), 8, str(stpd), min_instances=1)
+    stopped = []
+    stop_worker = bfg._stop_worker
+    monkeypatch.setattr(bfg, '_stop_worker', lambda: stopped.append(stop_worker()))
+    bfg.start()
+    workers = []
+    shots = 0
+    while bfg.running():
+        workers.append(bfg.workers())
+        time.sleep(0.1)
+        while not bfg.results.empty():
+            shots += len(bfg.results.get_nowait()[0])
+    time.sleep(0.1)
+    while not bfg.results.empty():
+        shots += len(bfg.results.get_nowait()[0])
+    assert shots == 230
+    assert bfg.instance_counter.value == 0
+    assert workers[0] == 1
+    assert max(workers) > 2
+    # underloaded workers are stopped while there are tasks
+    assert stopped
+
+
+class RecordingGun(SleepingGun):
+    def shoot(self, missile, marker):
+        with self.measure(marker) as di:
+            di['size_out'] = int(missile)
+            time.sleep(0.05)
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_sharded_feeder(tmp_path, binary):
+    stpd = str(tmp_path / 'test.stpd')
+    with open(stpd, 'w') as f:
+        for timestamp in range(0, 500, 5):
+            f.write('%d %d tag\n%d\n' % (len(str(timestamp)), timestamp, timestamp))
+    if binary:
+        stpd_to_binary(stpd, stpd + '.bin')
+        stpd += '.bin'
+    bfg = BFGMultiprocessing(RecordingGun(), 3, stpd, feeder='shards')
+    # text stpd is fed through the ring
+    assert (bfg.task_ring is None) == binary
+    bfg.start()
+    batches = []
+    overdue = []
+    while bfg.running():
+        time.sleep(0.1)
+        # 3 workers make 60 shots of 50 ms per second, 200 are planned
+        overdue.append(bfg.overdue_tasks())
+        while not bfg.results.empty():
+            batches.append(bfg.results.get_nowait()[0])
+    time.sleep(0.1)
+    while not bfg.results.empty():
+        batches.append(bfg.results.get_nowait()[0])
+    assert sorted(np.concatenate(batches)['size_out']) == list(range(0, 500, 5))
+    assert bfg.workers() == 0
+    assert max(overdue) > 0
+    assert bfg.overdue_tasks() == 0
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Queue
+from unittest import mock
+
+import pytest
+
+from yandextank.plugins.Bfg.guns import AsyncHttpGun, HttpGun
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+
+    def setup(self):
+        super(Handler, self).setup()
+        Handler.connections += 1
+
+    def do_GET(self):
+        if self.path == '/base/chunked':
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.write(b'5\r\nhello\r\n0\r\n\r\n')
+            return
+        if self.path == '/base/truncated':
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            # connection is closed before the last chunk
+            self.wfile.write(b'5\r\nhello\r\n')
+            self.close_connection = True
+            return
+        body = self.path.encode('utf8')
+        self.send_response(404 if self.path == '/base/missing' else 200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(201)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.connections = 0
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def shoot(gun_class, base_address, missiles):
+    gun = gun_class(mock.MagicMock(), {'base_address': base_address, 'timeout': 2})
+    gun.results = Queue()
+    gun.setup()
+    if gun_class is AsyncHttpGun:
+
+        async def run():
+            for missile, marker in missiles:
+                await gun.async_shoot(missile, marker)
+            # connections are closed while their loop is open
+            gun.teardown()
+
+        asyncio.run(run())
+    else:
+        for missile, marker in missiles:
+            gun.shoot(missile, marker)
+        gun.teardown()
+    gun.flush_results()
+    return gun.results.get_nowait()
+
+
+@pytest.mark.parametrize('gun_class', [HttpGun, AsyncHttpGun])
+def test_http_gun(server, gun_class):
+    base_address = 'http://127.0.0.1:%d/base' % server.server_port
+    post = b'POST /echo HTTP/1.1\r\nHost: localhost\r\nContent-Length: 4\r\n\r\nbody'
+    data, tags = shoot(gun_class, base_address, [('/a', 'a'), ('/missing', 'b'), ('/chunked', 'c'), (post, 'post'), ('/d', 'd')])
+    assert tags == ['a', 'b', 'c', 'post', 'd']
+    assert list(data['proto_code']) == [200, 404, 200, 201, 200]
+    assert list(data['net_code']) == [0, 0, 0, 0, 0]
+    assert data['size_out'][3] == len(post)
+    assert (data['size_in'] > 0).all()
+    assert data['size_in'][2] > data['size_in'][0]
+    assert (data['latency'] > 0).all()
+    # keep-alive connection is reused until server closes it after POST
+    assert data['connect_time'][0] > 0
+    assert list(data['connect_time'][1:4]) == [0, 0, 0]
+    assert data['connect_time'][4] > 0
+    assert Handler.connections == 2
+
+
+@pytest.mark.parametrize('gun_class', [HttpGun, AsyncHttpGun])
+def test_http_gun_connection_refused(server, gun_class):
+    port = server.server_port
+    server.shutdown()
+    server.server_close()
+    data, tags = shoot(gun_class, 'http://127.0.0.1:%d' % port, [('/', 'refused')])
+    assert data['net_code'][0] != 0
+    assert data['proto_code'][0] == 0
+
+
+@pytest.mark.parametrize('gun_class', [HttpGun, AsyncHttpGun])
+def test_http_gun_truncated_chunked(server, gun_class):
+    data, tags = shoot(gun_class, 'http://127.0.0.1:%d/base' % server.server_port, [('/truncated', 'truncated')])
+    assert data['proto_code'][0] == 999
+    assert data['net_code'][0] == 0
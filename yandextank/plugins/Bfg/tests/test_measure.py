@@ -0,0 +1,104 @@
+import contextvars
+import multiprocessing as mp
+from queue import Queue
+
+import pytest
+
+from yandextank.plugins.Bfg.guns import AbstractGun
+from yandextank.plugins.Bfg.measure import ResultsBuffer, shot_lateness
+
+
+class Gun(AbstractGun):
+    def __init__(self, results, dropped_samples=None):
+        # plugin options are not needed to measure
+        self.results = results
+        self.dropped_samples = dropped_samples
+        self._results_buffer = None
+
+    def shoot(self, missile, marker):
+        with self.measure(marker) as di:
+            di['proto_code'] = 404
+            di.update(size_in=len(missile))
+
+
+def test_measure_dict_api():
+    results = Queue()
+    gun = Gun(results)
+    gun.shoot('abc', 'case#1')
+    with pytest.raises(RuntimeError):
+        with gun.measure('failed') as di:
+            assert di.get('interval_real') is None
+            raise RuntimeError('connection reset')
+    gun.flush_results()
+    data, tags = results.get_nowait()
+    assert tags == ['case#1', 'failed']
+    assert list(data['proto_code']) == [404, 500]
+    assert list(data['net_code']) == [0, 1]
+    assert data['size_in'][0] == 3
+    assert (data['interval_real'] >= 0).all()
+
+
+def test_measure_unknown_fields_and_references():
+    results = Queue()
+    gun = Gun(results)
+    with gun.measure('first') as first:
+        first['custom'] = 'ignored'
+        first['proto_code'] = 201
+    with gun.measure('second') as second:
+        second['proto_code'] = 202
+    # a sample kept by a scenario is not overwritten by the next shot
+    assert first is not second
+    assert first['proto_code'] == 201
+    assert first.get('custom') is None
+    gun.flush_results()
+    data, tags = results.get_nowait()
+    assert list(data['proto_code']) == [201, 202]
+
+
+def test_flush_by_size():
+    results = Queue()
+    gun = Gun(results)
+    gun._results_buffer = ResultsBuffer(results, size=10, flush_interval=60)
+    for _ in range(25):
+        gun.shoot('', 'tag')
+    assert [len(results.get_nowait()[0]) for _ in range(results.qsize())] == [10, 10]
+    gun.flush_results()
+    assert len(results.get_nowait()[1]) == 5
+
+
+def test_dropped_samples():
+    dropped = mp.Value('i')
+    results = Queue(1)
+    gun = Gun(results, dropped)
+    gun._results_buffer = ResultsBuffer(results, dropped, size=10, flush_interval=60)
+    for _ in range(35):
+        gun.shoot('', 'tag')
+    gun.flush_results()
+    assert results.qsize() == 1
+    assert dropped.value == 25
+
+
+def test_measure_benchmark(benchmark):
+    gun = Gun(Queue())
+
+    def shoot():
+        for _ in range(10000):
+            gun.shoot('', 'tag')
+
+    benchmark(shoot)
+
+
+@pytest.mark.parametrize('from_planned_time, interval_real', [(False, 1000), (True, 3500)])
+def test_shot_lateness(from_planned_time, interval_real):
+    results = Queue()
+    gun = Gun(results)
+    gun._results_buffer = ResultsBuffer(results, from_planned_time=from_planned_time)
+    context = contextvars.copy_context()
+    context.run(shot_lateness.set, 2500)
+    with context.run(gun.measure, 'late') as di:
+        di['interval_real'] = 1000
+    gun.shoot('', 'in time')
+    gun.flush_results()
+    data, tags = results.get_nowait()
+    assert list(data['lateness']) == [2500, 0]
+    assert data['interval_real'][0] == interval_real
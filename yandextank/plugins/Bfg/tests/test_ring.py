@@ -0,0 +1,111 @@
+import multiprocessing as mp
+
+import pytest
+
+from yandextank.plugins.Bfg.ring import RECORD_HEADER, TaskRing
+
+TASKS_COUNT = 20000
+CONSUMERS = 2
+MISSILE = b'GET /api/v1/resource?id=%d HTTP/1.1\r\nHost: example.com\r\n\r\n'
+
+
+def make_tasks(count):
+    return [(i, MISSILE % i, 'tag%d' % (i % 10)) for i in range(count)]
+
+
+def test_put_claim_wraps():
+    tasks = make_tasks(100)
+    record_size = RECORD_HEADER.size + len(tasks[0][1]) + len(tasks[0][2])
+    # odd size, so records wrap in the middle
+    ring = TaskRing(size=record_size * 3 + 7)
+    try:
+        claimed = []
+        for i in range(0, len(tasks), 2):
+            assert ring.put(tasks[i : i + 2]) == 2
+            claimed += ring.claim(5)
+        assert claimed == tasks
+        assert ring.claim(timeout=0) == []
+    finally:
+        ring.unlink()
+
+
+def test_full_ring_timeout():
+    tasks = make_tasks(10)
+    ring = TaskRing(size=RECORD_HEADER.size * 10 + 200)
+    try:
+        published = ring.put(tasks, timeout=0.01)
+        assert 0 < published < len(tasks)
+        with pytest.raises(ValueError):
+            ring.put([(0, b'x' * ring.size, '')])
+    finally:
+        ring.unlink()
+
+
+def test_close():
+    ring = TaskRing(size=1024)
+    try:
+        ring.put(make_tasks(3))
+        ring.close()
+        assert len(ring.claim(2)) == 2
+        assert len(ring.claim(2)) == 1
+        # every consumer gets closing signal
+        assert ring.claim() is None
+        assert ring.claim() is None
+    finally:
+        ring.unlink()
+
+
+def _consume_ring(ring, counter):
+    count = 0
+    while True:
+        tasks = ring.claim(16)
+        if tasks is None:
+            break
+        count += len(tasks)
+    with counter.get_lock():
+        counter.value += count
+
+
+def _consume_queue(queue, counter):
+    count = 0
+    while queue.get() is not None:
+        count += 1
+    with counter.get_lock():
+        counter.value += count
+
+
+def feed_ring(tasks):
+    ring = TaskRing()
+    counter = mp.Value('i', 0)
+    consumers = [mp.Process(target=_consume_ring, args=(ring, counter)) for _ in range(CONSUMERS)]
+    for consumer in consumers:
+        consumer.start()
+    for i in range(0, len(tasks), 64):
+        ring.put(tasks[i : i + 64])
+    ring.close()
+    for consumer in consumers:
+        consumer.join()
+    ring.unlink()
+    return counter.value
+
+
+def feed_queue(tasks):
+    queue = mp.Queue(1024)
+    counter = mp.Value('i', 0)
+    consumers = [mp.Process(target=_consume_queue, args=(queue, counter)) for _ in range(CONSUMERS)]
+    for consumer in consumers:
+        consumer.start()
+    for task in tasks:
+        queue.put(task)
+    for _ in consumers:
+        queue.put(None)
+    for consumer in consumers:
+        consumer.join()
+    return counter.value
+
+
+@pytest.mark.benchmark(group='bfg task transport')
+@pytest.mark.parametrize('feed', [feed_ring, feed_queue])
+def test_transport_benchmark(benchmark, feed):
+    tasks = make_tasks(TASKS_COUNT)
+    assert benchmark.pedantic(feed, args=(tasks,), rounds=3) == TASKS_COUNT
@@ -15,22 +15,31 @@ class BfgInfoWidget(AbstractInfoWidget):
         self.selfload = 0
         self.time_lag = 0
         self.planned_rps_duration = 0
+        self.dropped_samples = 0
+        self.overdue_tasks = 0
+        self.workers = None
 
     def get_index(self):
         return 0
 
     def on_aggregated_data(self, data, stat):
         self.instances = stat["metrics"]["instances"]
+        self.dropped_samples = stat["metrics"].get("dropped_samples", 0)
 
         self.RPS = data["overall"]["interval_real"]["len"]
         self.selfload = 0  # TODO
-        self.time_lag = 0  # TODO
+        # max lateness of shots in the last second
+        self.time_lag = stat["metrics"].get("lateness", 0) / 1e6
+        self.overdue_tasks = stat["metrics"].get("overdue_tasks", 0)
+        self.workers = stat["metrics"].get("workers")
 
     def render(self, screen):
         res = ''
 
         res += "Active instances: "
         res += str(self.instances)
+        if self.workers is not None:
+            res += " in %s processes" % self.workers
 
         res += "\nPlanned requests: %s for %s\nActual responses: " % (
             self.planned,
@@ -52,4 +61,10 @@ class BfgInfoWidget(AbstractInfoWidget):
         res += "%\n        Time lag: "
         res += str(datetime.timedelta(seconds=self.time_lag))
 
+        if self.overdue_tasks:
+            res += "\n   Overdue tasks: " + screen.markup.YELLOW + str(self.overdue_tasks) + screen.markup.RESET
+
+        if self.dropped_samples:
+            res += "\n Dropped samples: " + screen.markup.RED + str(self.dropped_samples) + screen.markup.RESET
+
         return res
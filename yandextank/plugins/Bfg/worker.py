@@ -1,13 +1,47 @@
+import asyncio
+import itertools as itt
 import logging
 import time
 import threading as th
 import multiprocessing as mp
+from collections import deque
 from queue import Empty, Full
 
-from ...stepper import StpdReader
+import numpy as np
+
+from .measure import RESULTS_FLUSH_INTERVAL, shot_lateness
+from .ring import TaskRing
+from ...stepper import BinaryStpdReader, is_binary_stpd, stpd_reader
 
 logger = logging.getLogger(__name__)
 
+# tasks are published to workers in batches of this size
+FEED_BATCH = 64
+
+# autoscaling checks workers with this interval
+SCALE_INTERVAL = 1.0
+# workers are added when tasks are overdue and shots are late by this number of microseconds
+SCALE_UP_LATENESS = 10000
+# a worker is stopped when the rest of them would be loaded by half for this number of intervals
+SCALE_DOWN_AFTER = 5
+
+
+class StpdShard(object):
+    """
+    Tasks of a worker that reads every shards-th task of binary stpd itself,
+    they are claimed the same way tasks of the ring are
+    """
+
+    def __init__(self, stpd_filename, shard, shards):
+        self.plan = BinaryStpdReader(stpd_filename).shard(shard, shards)
+
+    def claim(self, max_count=1, timeout=None):
+        """
+        :returns: list of (timestamp, missile, marker), None if there are no more tasks
+        """
+        tasks = [(timestamp, bytes(missile), marker) for timestamp, missile, marker in itt.islice(self.plan, max_count)]
+        return tasks or None
+
 
 class BFGBase(object):
     """
@@ -15,7 +49,18 @@ class BFGBase(object):
     threads in each of them and feeds them with tasks
     """
 
-    def __init__(self, gun, instances, stpd_filename, cached_stpd=False, green_threads_per_instance=None):
+    def __init__(
+        self,
+        gun,
+        instances,
+        stpd_filename,
+        cached_stpd=False,
+        green_threads_per_instance=None,
+        coroutines_per_instance=None,
+        measure_from_planned_time=False,
+        min_instances=None,
+        feeder='ring',
+    ):
         logger.info(
             """
 BFG using stpd from {stpd_filename}
@@ -28,28 +73,71 @@ Gun: {gun.__class__.__name__}
             )
         )
         self.instances = int(instances)
+        # every worker reads its own shard of stpd, there is no feeder
+        self.sharded = feeder == 'shards'
+        if self.sharded and not is_binary_stpd(stpd_filename):
+            # text stpd has no index, every worker would parse headers of all missiles
+            logger.warning("Sharded feeder reads binary stpd only, ring is used for %s", stpd_filename)
+            self.sharded = False
+        # workers are autoscaled from min_instances to instances
+        self.min_instances = self.instances
+        if min_instances and int(min_instances) < self.instances:
+            if self.sharded:
+                logger.warning("Workers are not autoscaled, they read stpd shards by their number")
+            else:
+                self.min_instances = max(1, int(min_instances))
         self.instance_counter = mp.Value('i')
         self.results = mp.Queue(16384)
         self.gun = gun
         self.gun.results = self.results
+        self.dropped_samples = mp.Value('i')
+        self.gun.dropped_samples = self.dropped_samples
+        self.gun.measure_from_planned_time = measure_from_planned_time
+        # max lateness of started shots in microseconds, stats reader resets it
+        self.max_lateness = mp.RawValue('q', 0)
+        # updated under instance counter lock
+        self.shots_started = mp.RawValue('q', 0)
+        # planned timestamps of all tasks when the whole plan is known
+        self._plan_timestamps = None
+        # (last timestamp, published tasks count) of every published batch, when plan timestamps are not known
+        self._published_batches = deque()
+        self._published = 0
+        self._due = 0
         self.quit = mp.Event()
-        self.task_queue = mp.Queue(1024)
+        self.task_ring = None if self.sharded else TaskRing()
+        # tasks of the worker in a worker process
+        self.tasks = self.task_ring
         self.cached_stpd = cached_stpd
         self.stpd_filename = stpd_filename
-        self.pool = [mp.Process(target=self._worker) for _ in range(self.instances)]
+        self.pool = []
+        self._pool_lock = th.Lock()
+        # stop events of worker processes, they are set to stop a worker when scaling down
+        self._worker_stops = {}
+        # stop event of the worker in a worker process
+        self.worker_stop = None
         self.feeder = th.Thread(target=self._feed, name="Feeder")
         self.feeder.daemon = True
+        self.scaler = th.Thread(target=self._scale, name="Scaler")
+        self.scaler.daemon = True
+        # no workers are started after that
+        self.workers_stopped = False
         self.workers_finished = False
         self.start_time = None
         self.plan = None
         self.green_threads_per_instance = green_threads_per_instance
+        self.coroutines_per_instance = coroutines_per_instance
 
     def start(self):
+        if self.sharded:
+            # there is no feeder, due tasks are counted by the index of stpd
+            self._plan_timestamps = BinaryStpdReader(self.stpd_filename).index['timestamp']
         self.start_time = time.time()
-        for process in self.pool:
-            process.daemon = True
-            process.start()
+        for shard in range(self.min_instances):
+            self._start_worker(shard if self.sharded else None)
         self.feeder.start()
+        if self.min_instances < self.instances:
+            logger.info("Autoscaling workers from %d to %d", self.min_instances, self.instances)
+            self.scaler.start()
 
     def running(self):
         """
@@ -63,66 +151,207 @@ Gun: {gun.__class__.__name__}
         Say the workers to finish their jobs and quit.
         """
         self.quit.set()
-        # yapf:disable
-        while sorted([self.pool[i].is_alive() for i in range(len(self.pool))])[-1]:
+        while self.workers():
             time.sleep(1)
-        # yapf:enable
         try:
-            while not self.task_queue.empty():
-                self.task_queue.get(timeout=0.1)
-            self.task_queue.close()
             self.feeder.join()
         except Exception as ex:
             logger.info(ex)
 
+    def workers(self):
+        """
+        Number of alive worker processes
+        """
+        with self._pool_lock:
+            return sum(process.is_alive() for process in self.pool)
+
+    def overdue_tasks(self):
+        """
+        Number of tasks that are due but are not started by workers. Due tasks are
+        counted by planned timestamps of binary or cached stpd. Text stpd is read
+        as it is published, its due tasks are counted by published batches to
+        FEED_BATCH tasks, and when workers fall behind and the ring is full it is
+        a lower bound.
+        """
+        if self.start_time is None:
+            return 0
+        now = (time.time() - self.start_time) * 1000
+        timestamps = self._plan_timestamps
+        if timestamps is not None:
+            return max(0, int(np.searchsorted(timestamps, now, 'right')) - self.shots_started.value)
+        # it is called by stats reader and scaler
+        with self._pool_lock:
+            while self._published_batches and self._published_batches[0][0] <= now:
+                self._due = self._published_batches.popleft()[1]
+            return max(0, self._due - self.shots_started.value)
+
+    def _concurrency(self):
+        """
+        Number of shots a worker process makes simultaneously
+        """
+        return 1
+
+    def _start_worker(self, shard=None):
+        stop = mp.Event()
+        process = mp.Process(target=self._run_worker, args=(stop, shard))
+        process.daemon = True
+        with self._pool_lock:
+            if self.workers_stopped or self.quit.is_set():
+                return False
+            process.start()
+            self.pool.append(process)
+            self._worker_stops[process] = stop
+        return True
+
+    def _stop_worker(self):
+        with self._pool_lock:
+            for process in reversed(self.pool):
+                stop = self._worker_stops[process]
+                if process.is_alive() and not stop.is_set():
+                    stop.set()
+                    return
+
+    def _run_worker(self, stop, shard):
+        self.worker_stop = stop
+        if shard is not None:
+            self.tasks = StpdShard(self.stpd_filename, shard, self.instances)
+        self._worker()
+
+    def _stopping(self):
+        """
+        Worker should not take new tasks
+        """
+        return self.quit.is_set() or self.worker_stop.is_set()
+
+    def _scale(self):
+        """
+        Adds workers when tasks are overdue and shots are late or all workers are busy,
+        stops workers when the rest of them would be loaded by half
+        """
+        underloaded = 0
+        while not self.quit.wait(SCALE_INTERVAL) and not self.workers_stopped:
+            with self._pool_lock:
+                for process in [process for process in self.pool if not process.is_alive()]:
+                    # stopped workers are joined and forgotten
+                    process.join()
+                    self.pool.remove(process)
+                    del self._worker_stops[process]
+                running = sum(not self._worker_stops[process].is_set() for process in self.pool)
+            overdue = self.overdue_tasks()
+            busy = self.instance_counter.value
+            concurrency = self._concurrency()
+            if overdue and (self.max_lateness.value > SCALE_UP_LATENESS or busy >= running * concurrency):
+                underloaded = 0
+                count = min(self.instances - running, max(1, running // 2))
+                if count > 0:
+                    logger.info("%d tasks are overdue, adding %d workers to %d", overdue, count, running)
+                    for _ in range(count):
+                        self._start_worker()
+            elif not overdue and running > self.min_instances and busy * 2 <= (running - 1) * concurrency:
+                underloaded += 1
+                if underloaded >= SCALE_DOWN_AFTER:
+                    logger.info("Workers are underloaded, stopping one of %d", running)
+                    self._stop_worker()
+            else:
+                underloaded = 0
+
+    def _shot_started(self, lateness):
+        """
+        Account a shot started lateness seconds after its planned time
+        """
+        lateness = max(0, int(lateness * 1e6))
+        shot_lateness.set(lateness)
+        # racy maximum is good enough for monitoring
+        if lateness > self.max_lateness.value:
+            self.max_lateness.value = lateness
+        with self.instance_counter.get_lock():
+            self.instance_counter.value += 1
+            self.shots_started.value += 1
+
+    def _shot_finished(self):
+        with self.instance_counter.get_lock():
+            self.instance_counter.value -= 1
+
     def _feed(self):
         """
         A feeder that runs in distinct thread in main process.
         """
-        self.plan = StpdReader(self.stpd_filename)
+        try:
+            if not self.sharded and not self._feed_tasks():
+                return
+            try:
+                logger.info("Waiting for workers")
+                self._join_workers()
+                logger.info("All workers exited.")
+                self.workers_finished = True
+            except (KeyboardInterrupt, SystemExit):
+                self.results.close()
+                self.quit.set()
+                logger.info("Going to quit. Waiting for workers")
+                self._join_workers()
+                self.workers_finished = True
+        finally:
+            with self._pool_lock:
+                self.workers_stopped = True
+            if self.task_ring:
+                # workers keep their own mappings of the ring
+                self.task_ring.unlink()
+
+    def _join_workers(self):
+        """
+        Wait for workers, including the ones started by scaler meanwhile
+        """
+        while True:
+            with self._pool_lock:
+                alive = [process for process in self.pool if process.is_alive()]
+                if not alive:
+                    # ring is unlinked after that, new workers could not map it
+                    self.workers_stopped = True
+                    return
+            alive[0].join(SCALE_INTERVAL)
+
+    def _feed_tasks(self):
+        """
+        Returns False if feeding was stopped before all tasks were fed.
+        """
+        self.plan = stpd_reader(self.stpd_filename)
+        if isinstance(self.plan, BinaryStpdReader):
+            self._plan_timestamps = self.plan.index['timestamp']
         if self.cached_stpd:
             self.plan = list(self.plan)
+            if self._plan_timestamps is None:
+                self._plan_timestamps = np.array([task[0] for task in self.plan], dtype=np.int64)
+        batch = []
         for task in self.plan:
+            # binary stpd yields memoryview missiles, they are copied straight into the ring
+            batch.append(task)
+            if len(batch) >= FEED_BATCH:
+                if not self._publish(batch):
+                    return False
+                batch = []
+        if batch and not self._publish(batch):
+            return False
+        logger.info("Feded all data. Closing task ring")
+        self.task_ring.close()
+        return True
+
+    def _publish(self, batch):
+        """
+        Put tasks to the ring unless there is a quit flag or all workers have exited.
+        Returns False if feeding should be stopped.
+        """
+        last_timestamp, count = batch[-1][0], len(batch)
+        while batch:
             if self.quit.is_set():
                 logger.info("Stop feeding: gonna quit")
-                return
-            # try putting a task to a queue unless there is a quit flag
-            # or all workers have exited
-            while True:
-                try:
-                    self.task_queue.put(task, timeout=1)
-                    break
-                except Full:
-                    if self.quit.is_set() or self.workers_finished:
-                        return
-                    else:
-                        continue
-        workers_count = self.instances
-        logger.info("Feded all data. Publishing %d killer tasks" % workers_count)
-        retry_delay = 1
-        for _ in range(5):
-            try:
-                [self.task_queue.put(None, timeout=1) for _ in range(0, workers_count)]
-                break
-            except Full:
-                logger.debug("Couldn't post killer tasks" " because queue is full. Retrying in %ss", retry_delay)
-                time.sleep(retry_delay)
-                retry_delay *= 2
-
-        try:
-            logger.info("Waiting for workers")
-            for x in self.pool:
-                x.join()
-            logger.info("All workers exited.")
-            self.workers_finished = True
-        except (KeyboardInterrupt, SystemExit):
-            self.task_queue.close()
-            self.results.close()
-            self.quit.set()
-            logger.info("Going to quit. Waiting for workers")
-            for x in self.pool:
-                x.join()
-            self.workers_finished = True
+                return False
+            if self.workers_finished:
+                return False
+            batch = batch[self.task_ring.put(batch, timeout=1) :]
+        if self._plan_timestamps is None:
+            self._published += count
+            self._published_batches.append((last_timestamp, self._published))
+        return True
 
 
 class BFGMultiprocessing(BFGBase):
@@ -141,37 +370,37 @@ class BFGMultiprocessing(BFGBase):
         except Exception:
             logger.exception("Couldn't initialize gun. Exit shooter process")
             return
-        while not self.quit.is_set():
+        tasks = []
+        while not self._stopping():
             try:
-                task = self.task_queue.get(timeout=1)
-                if not task:
-                    logger.debug("Got killer task.")
-                    break
-                timestamp, missile, marker = task
+                if not tasks:
+                    tasks = self.tasks.claim(timeout=1)
+                    if tasks is None:
+                        logger.debug("No more tasks.")
+                        break
+                    if not tasks:
+                        self.gun.flush_results()
+                        continue
+                timestamp, missile, marker = tasks.pop(0)
                 planned_time = self.start_time + (timestamp / 1000.0)
                 delay = planned_time - time.time()
                 if delay > 0:
                     time.sleep(delay)
 
                 try:
-                    with self.instance_counter.get_lock():
-                        self.instance_counter.value += 1
+                    self._shot_started(time.time() - planned_time)
                     self.gun.shoot(missile.decode('utf8'), marker)
                 finally:
-                    with self.instance_counter.get_lock():
-                        self.instance_counter.value -= 1
+                    self._shot_finished()
 
             except (KeyboardInterrupt, SystemExit):
                 break
-            except Empty:
-                if self.quit.is_set():
-                    logger.debug("Empty queue. Exiting process")
-                    return
             except Full:
                 logger.warning("Couldn't put to result queue because it's full")
             except Exception:
                 logger.exception("Bfg shoot exception")
 
+        self.gun.flush_results()
         try:
             self.gun.teardown()
         except Exception:
@@ -207,27 +436,25 @@ class BFGGreen(BFGBase):
         # don't pull more tasks from the main queue, let other workers do that.
         self._free_threads_count = self.green_threads_per_instance
 
-        while not self.quit.is_set():
-            while not self.task_queue.empty() and self._free_threads_count:
-                try:
-                    task = self.task_queue.get_nowait()
-                except Empty:
-                    continue
-
-                self._free_threads_count -= 1
-
-                if not task:
-                    logger.debug("Got killer task.")
-                    self.quit.set()
+        while not self._stopping():
+            if self._free_threads_count:
+                tasks = self.tasks.claim(self._free_threads_count, timeout=0)
+                if tasks is None:
+                    logger.debug("No more tasks.")
+                    # green threads finish queued tasks and exit, other workers may still have tasks
+                    self.worker_stop.set()
                     break
-
-                self.green_queue.put(task)
+                self._free_threads_count -= len(tasks)
+                for task in tasks:
+                    self.green_queue.put(task)
 
             time.sleep(0.1)
+            self.gun.flush_results()
 
         for g in self.green_pool:
             g.join()
 
+        self.gun.flush_results()
         try:
             self.gun.teardown()
         except Exception:
@@ -251,21 +478,134 @@ class BFGGreen(BFGBase):
                     time.sleep(delay)
 
                 try:
-                    with self.instance_counter.get_lock():
-                        self.instance_counter.value += 1
-
+                    self._shot_started(time.time() - planned_time)
                     self.gun.shoot(missile.decode('utf8'), marker)
                 finally:
-                    with self.instance_counter.get_lock():
-                        self.instance_counter.value -= 1
-
+                    self._shot_finished()
                     self._free_threads_count += 1
 
             except (KeyboardInterrupt, SystemExit):
                 break
             except Empty:
+                if self.worker_stop.is_set():
+                    # claimed tasks are done
+                    break
                 continue
             except Full:
                 logger.warning("Couldn't put to result queue because it's full")
             except Exception:
                 logger.exception("Bfg shoot exception")
+
+    def _concurrency(self):
+        return self.green_threads_per_instance
+
+
+class BFGAsync(BFGBase):
+    """
+    Asyncio version of the worker. Starts `self.instances` processes, each of them
+    runs an event loop with up to `self.coroutines_per_instance` shots scheduled or
+    in flight. Shots are started by the loop timer at their planned time and gun's
+    `async_shoot` coroutine is awaited, so a slow response does not delay other shots.
+    """
+
+    def _worker(self):
+        logger.debug("Init shooter process")
+        try:
+            self.gun.setup()
+        except Exception:
+            logger.exception("Couldn't initialize gun. Exit shooter process")
+            return
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._async_worker(loop))
+        except (KeyboardInterrupt, SystemExit):
+            pass
+
+        self.gun.flush_results()
+        try:
+            # loop is still open, so that gun could close its connections
+            self.gun.teardown()
+        except Exception:
+            logger.exception("Couldn't finalize gun. Exit shooter process")
+            return
+        finally:
+            loop.close()
+        logger.debug("Exit shooter process")
+
+    async def _async_worker(self, loop):
+        # tasks are claimed by a thread, so that waiting for them does not block the loop
+        free_slots = th.Semaphore(self.coroutines_per_instance)
+        claimed = asyncio.Queue()
+        claimer = th.Thread(target=self._claimer, args=(loop, claimed, free_slots), name="Claimer")
+        claimer.daemon = True
+        claimer.start()
+        # loop timer is monotonic, planned times are converted to it once
+        loop_start_time = self.start_time + loop.time() - time.time()
+        shots = set()
+        finished = False
+        while not finished and not self.quit.is_set():
+            try:
+                tasks = await asyncio.wait_for(claimed.get(), RESULTS_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                self.gun.flush_results()
+                continue
+            if tasks is None:
+                logger.debug("No more tasks to claim.")
+                finished = True
+                tasks = []
+            for timestamp, missile, marker in tasks:
+                shot = loop.create_task(
+                    self._shoot(loop, loop_start_time + timestamp / 1000.0, missile, marker, free_slots)
+                )
+                shots.add(shot)
+                shot.add_done_callback(shots.discard)
+        if not finished:
+            for shot in shots:
+                shot.cancel()
+        while shots:
+            await asyncio.wait(set(shots), timeout=RESULTS_FLUSH_INTERVAL)
+            self.gun.flush_results()
+        claimer.join()
+
+    def _claimer(self, loop, claimed, free_slots):
+        """
+        Claims as many tasks as there are free slots for shots and passes them to the loop,
+        None is passed when there are no more tasks or worker is stopped
+        """
+        while not self._stopping():
+            if not free_slots.acquire(timeout=1):
+                continue
+            count = 1
+            while count < FEED_BATCH and free_slots.acquire(blocking=False):
+                count += 1
+            tasks = self.tasks.claim(count, timeout=1)
+            for _ in range(count - len(tasks or ())):
+                free_slots.release()
+            if tasks is None:
+                break
+            if tasks:
+                loop.call_soon_threadsafe(claimed.put_nowait, tasks)
+        loop.call_soon_threadsafe(claimed.put_nowait, None)
+
+    async def _shoot(self, loop, planned_time, missile, marker, free_slots):
+        try:
+            if planned_time > loop.time():
+                timer = loop.create_future()
+                handle = loop.call_at(planned_time, timer.set_result, None)
+                try:
+                    await timer
+                finally:
+                    handle.cancel()
+            self._shot_started(loop.time() - planned_time)
+            try:
+                await self.gun.async_shoot(missile.decode('utf8'), marker)
+            finally:
+                self._shot_finished()
+        except Exception:
+            logger.exception("Bfg shoot exception")
+        finally:
+            free_slots.release()
+
+    def _concurrency(self):
+        return self.coroutines_per_instance
@@ -3,9 +3,10 @@
 import logging
 import sys
 import threading
+import time
 import traceback
 
-from .screen import Screen
+from .screen import Screen, frame_update
 from ...common.interfaces import AbstractPlugin, AggregateResultListener
 
 
@@ -26,6 +27,10 @@ class Plugin(AbstractPlugin, AggregateResultListener):
         self.__console_view = None
         self.__writer_thread = None
         self.__writer_event = None
+        self.__written_lines = None
+        self.__written_size = None
+        self.__next_render = 0
+        self.cpu_budget = self.get_option("cpu_budget")
         self.cases_sort_by = self.get_option("cases_sort_by")
         self.cases_max_spark = self.get_option("cases_max_spark")
         self.max_case_len = self.get_option("max_case_len")
@@ -71,9 +76,14 @@ class Plugin(AbstractPlugin, AggregateResultListener):
             if self.__console_view:
                 if not self.short_only:
                     self.log.debug("Writing console view to STDOUT")
-                    sys.stdout.write(self.console_markup.clear)
-                    sys.stdout.write(self.__console_view.decode('utf8'))
-                    sys.stdout.write(self.console_markup.TOTAL_RESET)
+                    sys.stdout.write(self.__frame_update(self.__console_view))
+
+    def __frame_update(self, lines):
+        '''Whole screen is redrawn at start and on resize, otherwise only changed lines'''
+        size = (self.screen.term_width, len(lines))
+        previous = self.__written_lines if size == self.__written_size else None
+        self.__written_lines, self.__written_size = lines, size
+        return frame_update(previous, lines, self.console_markup)
 
     def is_test_finished(self):
         if not self.__writer_thread:
@@ -82,12 +92,20 @@ class Plugin(AbstractPlugin, AggregateResultListener):
             self.__writer_thread.daemon = True
             self.__writer_thread.start()
 
+        now = time.time()
+        if now < self.__next_render:
+            self.log.debug("Console frame skipped to keep rendering within CPU budget")
+            return -1
+        started = time.thread_time()
         try:
-            self.__console_view = self.screen.render_screen().encode('utf-8')
+            self.__console_view = self.screen.render_lines()
         except Exception as ex:
             self.log.warning("Exception inside render: %s", traceback.format_exc())
             self.render_exception = ex
-            self.__console_view = ""
+            self.__console_view = None
+        if self.cpu_budget > 0:
+            # render no more often than it takes to spend cpu_budget of a CPU core on it
+            self.__next_render = now + (time.thread_time() - started) / self.cpu_budget
 
         self.__writer_event.set()
         return -1
@@ -129,6 +147,8 @@ class RealConsoleMarkup(object):
     WHITE_ON_BLACK = '\033[37;40m'
     TOTAL_RESET = '\033[0m'
     clear = "\x1b[2J\x1b[H"
+    move_to = "\x1b[{row};1H"
+    clear_line = "\x1b[K"
     new_line = "\n"
 
     YELLOW = '\033[1;33m'
@@ -177,6 +197,8 @@ class NoConsoleMarkup(RealConsoleMarkup):
     WHITE_ON_BLACK = ''
     TOTAL_RESET = ''
     clear = ""
+    move_to = ""
+    clear_line = ""
     new_line = "\n"
 
     YELLOW = ''
@@ -8,8 +8,8 @@ import termios
 import time
 import bisect
 from collections import defaultdict
-import pandas as pd
 
+from ...aggregator.histogram import SlidingHistogram
 from ...common import util
 
 
@@ -120,6 +120,22 @@ def combine_codes(tag_data, markup):
     return (net_err, http_err, color)
 
 
+def frame_update(previous, lines, markup):
+    '''
+    Terminal output to turn previously written screen lines into new ones.
+    Lines that did not change are not written, whole screen is written
+    if there is no previous frame or markup has no cursor moves.
+    '''
+    if previous is None or not markup.move_to:
+        return markup.clear + markup.new_line.join(lines) + markup.new_line + markup.TOTAL_RESET
+    update = []
+    for num, (old, line) in enumerate(zip(previous, lines)):
+        if line != old:
+            update.append(markup.move_to.format(row=num + 1) + markup.RESET + line + markup.clear_line)
+    update.append(markup.move_to.format(row=len(lines) + 1) + markup.TOTAL_RESET)
+    return ''.join(update)
+
+
 class TableFormatter(object):
     def __init__(self, template, delimiters, reshape_delay=5):
         self.log = logging.getLogger(__name__)
@@ -308,6 +324,9 @@ class Screen(object):
         final_block = VerticalBlock(overall_block, CasesBlock(self, **cases_args), self)
 
         self.left_panel = final_block
+        self.left_lines = None
+        self.truncated_lines = {}
+        self.truncated_width = None
 
     def __get_right_line(self, widget_output):
         '''Gets next line for right panel'''
@@ -362,7 +381,8 @@ class Screen(object):
         '''Render left blocks'''
         self.log.debug("Rendering left blocks")
         left_block = self.left_panel
-        left_block.render()
+        if not left_block.update() and self.left_lines is not None:
+            return list(self.left_lines)
         blank_space = self.left_panel_width - left_block.width
 
         lines = []
@@ -370,16 +390,29 @@ class Screen(object):
         if not left_block.lines:
             lines = [(''), (self.markup.RED + 'BROKEN LEFT PANEL' + self.markup.RESET)]
         else:
-            while self.left_panel.lines:
-                src_line = self.left_panel.lines.pop(0)
-                line = pre_space + self.__truncate(src_line, self.left_panel_width)
-                post_space = ' ' * (self.left_panel_width - len(self.markup.clean_markup(line)))
-                line += post_space + self.markup.RESET
+            # lines that did not change since the previous frame are not truncated again
+            cached = self.truncated_lines if self.truncated_width == self.left_panel_width else {}
+            truncated = {}
+            for src_line in left_block.lines:
+                key = (pre_space, src_line)
+                line = cached.get(key)
+                if line is None:
+                    line = pre_space + self.__truncate(src_line, self.left_panel_width)
+                    post_space = ' ' * (self.left_panel_width - len(self.markup.clean_markup(line)))
+                    line += post_space + self.markup.RESET
+                truncated[key] = line
                 lines.append(line)
-        return lines
+            self.truncated_lines = truncated
+            self.truncated_width = self.left_panel_width
+        self.left_lines = lines
+        return list(lines)
 
     def render_screen(self):
         '''Main method to render screen view'''
+        return self.markup.new_line.join(self.render_lines()) + self.markup.new_line
+
+    def render_lines(self):
+        '''Render screen view as a list of terminal lines'''
         self.term_width, self.term_height = get_terminal_size()
         self.log.debug("Terminal size: %sx%s", self.term_width, self.term_height)
         self.right_panel_width = (
@@ -427,7 +460,7 @@ class Screen(object):
                 line += right_line
 
             output.append(line)
-        return self.markup.new_line.join(output) + self.markup.new_line
+        return output
 
     def add_info_widget(self, widget):
         '''
@@ -450,11 +483,17 @@ class AbstractBlock:
     Parent class for all left panel blocks
     '''
 
+    # block is rendered on every frame, e.g. it shows current time
+    volatile = False
+
     def __init__(self, screen):
         self.log = logging.getLogger(__name__)
         self.lines = []
         self.width = 0
         self.screen = screen
+        # set when block gets new data, rendered lines are reused until then
+        self.changed = True
+        self.rendered_width = None
 
     def add_second(self, data):
         '''
@@ -462,6 +501,18 @@ class AbstractBlock:
         '''
         pass
 
+    def update(self, expected_width=None):
+        '''
+        Render block if its data or available width changed since the last render
+        :returns: True if lines were rendered again
+        '''
+        if not (self.changed or self.volatile or expected_width != self.rendered_width):
+            return False
+        self.render(expected_width=expected_width)
+        self.changed = False
+        self.rendered_width = expected_width
+        return True
+
     def fill_rectangle(self, prepared):
         '''Right-pad lines of block to equal width'''
         result = []
@@ -504,7 +555,24 @@ class HorizontalBlock(AbstractBlock):
     def render(self, expected_width=None):
         if not expected_width:
             expected_width = self.screen.left_panel_width
+        self.left.render(expected_width=expected_width)
+        right_width_limit = expected_width - self.left.width - len(self.separator)
+        self.right.render(expected_width=right_width_limit)
+        self.__compose()
 
+    def update(self, expected_width=None):
+        if not expected_width:
+            expected_width = self.screen.left_panel_width
+        left_changed = self.left.update(expected_width=expected_width)
+        right_width_limit = expected_width - self.left.width - len(self.separator)
+        right_changed = self.right.update(expected_width=right_width_limit)
+        if not (left_changed or right_changed or expected_width != self.rendered_width):
+            return False
+        self.__compose()
+        self.rendered_width = expected_width
+        return True
+
+    def __compose(self):
         def get_line(source, num):
             if num >= len(source.lines):
                 return (' ' * source.width,)
@@ -513,9 +581,6 @@ class HorizontalBlock(AbstractBlock):
                 spacer = ' ' * (source.width - self.clean_len(source_line))
                 return source_line + (spacer,)
 
-        self.left.render(expected_width=expected_width)
-        right_width_limit = expected_width - self.left.width - len(self.separator)
-        self.right.render(expected_width=right_width_limit)
         self.height = max(len(self.left.lines), len(self.right.lines))
         self.width = self.left.width + self.right.width + len(self.separator)
 
@@ -528,6 +593,7 @@ class HorizontalBlock(AbstractBlock):
     def add_second(self, data):
         self.left.add_second(data)
         self.right.add_second(data)
+        self.left.changed = self.right.changed = True
 
 
 class VerticalBlock(AbstractBlock):
@@ -543,9 +609,22 @@ class VerticalBlock(AbstractBlock):
     def render(self, expected_width=None):
         if not expected_width:
             expected_width = self.screen.left_panel_width
-
         self.top.render(expected_width=expected_width)
         self.bottom.render(expected_width=expected_width)
+        self.__compose()
+
+    def update(self, expected_width=None):
+        if not expected_width:
+            expected_width = self.screen.left_panel_width
+        top_changed = self.top.update(expected_width=expected_width)
+        bottom_changed = self.bottom.update(expected_width=expected_width)
+        if not (top_changed or bottom_changed or expected_width != self.rendered_width):
+            return False
+        self.__compose()
+        self.rendered_width = expected_width
+        return True
+
+    def __compose(self):
         self.width = max(self.top.width, self.bottom.width)
 
         self.lines = []
@@ -564,11 +643,15 @@ class VerticalBlock(AbstractBlock):
     def add_second(self, data):
         self.top.add_second(data)
         self.bottom.add_second(data)
+        self.top.changed = self.bottom.changed = True
 
 
 class RPSBlock(AbstractBlock):
     '''Actual RPS sparkline'''
 
+    # data delay is updated every frame
+    volatile = True
+
     def __init__(self, screen):
         AbstractBlock.__init__(self, screen)
         self.begin_tpl = 'Data delay: {delay}s, RPS: {rps:>3,} '
@@ -602,10 +685,9 @@ class PercentilesBlock(AbstractBlock):
     def __init__(self, screen):
         AbstractBlock.__init__(self, screen)
         self.title = 'Percentiles (all/last 1m/last), ms:'
-        self.overall = None
+        self.histogram = SlidingHistogram(window=60)
         self.width = 10
-        self.last_ts = None
-        self.last_min = {}
+        self.precise_quantiles = {}
         self.quantiles = [10, 20, 30, 40, 50, 60, 70, 75, 80, 85, 90, 95, 99, 99.5, 100]
         template = {
             'quantile': {'tpl': '{:>.1f}%'},
@@ -617,33 +699,17 @@ class PercentilesBlock(AbstractBlock):
         self.formatter = TableFormatter(template, delimiters)
 
     def add_second(self, data):
-        incoming_hist = data['overall']['interval_real']['hist']
-        ts = data['ts']
         self.precise_quantiles = {
             q: float(v) / 1000
             for q, v in zip(data["overall"]["interval_real"]["q"]["q"], data["overall"]["interval_real"]["q"]["value"])
         }
-        dist = pd.Series(incoming_hist['data'], index=incoming_hist['bins'])
-        if self.overall is None:
-            self.overall = dist
-        else:
-            self.overall = self.overall.add(dist, fill_value=0)
-        for second in tuple(self.last_min.keys()):
-            if ts - second > 60:
-                self.last_min.pop(second)
-        self.last_min[ts] = dist
+        self.histogram.add(data['ts'], data['overall']['interval_real']['hist'])
 
     def __calc_percentiles(self):
-        def hist_to_quant(histogram, quant):
-            cumulative = histogram.cumsum()
-            total = cumulative.max()
-            positions = cumulative.searchsorted([float(i) / 100 * total for i in quant])
-            quant_times = [cumulative.index[i] / 1000.0 for i in positions]
-            return quant_times
-
-        all_times = hist_to_quant(self.overall, self.quantiles)
-        last_data = self.last_min[max(self.last_min.keys())]
-        last_times = hist_to_quant(last_data, self.quantiles)
+        histogram = self.histogram
+        all_times = histogram.quantiles(histogram.overall, self.quantiles) / 1000
+        last_1m_times = histogram.quantiles(histogram.windowed, self.quantiles) / 1000
+        last_times = histogram.quantiles(histogram.last, self.quantiles) / 1000
         # Check if we have precise data for last second quantiles instead of binned histogram
         for position, q in enumerate(self.quantiles):
             if q in self.precise_quantiles:
@@ -653,13 +719,6 @@ class PercentilesBlock(AbstractBlock):
         for position in reversed(range(1, len(last_times))):
             if last_times[position - 1] > last_times[position]:
                 last_times[position - 1] = last_times[position]
-        last_1m = pd.Series(dtype='int64')
-        for ts, data in self.last_min.items():
-            if last_1m.empty:
-                last_1m = data
-            else:
-                last_1m = last_1m.add(data, fill_value=0)
-        last_1m_times = hist_to_quant(last_1m, self.quantiles)
         quant_times = reversed(list(zip(self.quantiles, all_times, last_1m_times, last_times)))
         data = []
         for q, all_time, last_1m, last_time in quant_times:
@@ -668,7 +727,7 @@ class PercentilesBlock(AbstractBlock):
 
     def render(self, expected_width=None):
         prepared = [(self.screen.markup.WHITE, self.title)]
-        if self.overall is None:
+        if self.histogram.last_ts is None:
             prepared.append(('',))
         else:
             data = self.__calc_percentiles()
@@ -1019,7 +1078,8 @@ class CasesBlock(AbstractBlock):
 
             self.__reorder_cases()
             data = []
-            for name in self.cases_order:
+            # cases below the bottom of the screen are not visible anyway
+            for name in self.cases_order[: self.screen.term_height]:
                 case_data = self.cumulative_cases[name]
                 if name in self.last_cases:
                     last = self.last_cases[name]
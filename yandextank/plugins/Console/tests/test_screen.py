@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+
+import pytest
+
+from yandextank.plugins.Console import screen as screen_module
+from yandextank.plugins.Console.plugin import NoConsoleMarkup, RealConsoleMarkup
+from yandextank.plugins.Console.screen import CasesBlock, Screen, frame_update
+
+NOW = 1500000000
+
+
+def make_aggregate(count):
+    return {
+        'interval_real': {
+            'len': count,
+            'total': count * 1500,
+            'min': 1000,
+            'max': 2000,
+            'q': {'q': [50, 95, 100], 'value': [1500, 1900, 2000]},
+            'hist': {'data': [count // 2, count - count // 2], 'bins': [1000, 2000]},
+        },
+        'connect_time': {'total': count * 10},
+        'send_time': {'total': count * 10},
+        'latency': {'total': count * 1000},
+        'receive_time': {'total': count * 10},
+        'size_in': {'total': count * 100},
+        'size_out': {'total': count * 50},
+        'proto_code': {'count': {'200': count - 1, '404': 1}},
+        'net_code': {'count': {'0': count}},
+    }
+
+
+def make_second(ts, tags):
+    return {
+        'ts': ts,
+        'overall': make_aggregate(10 * tags),
+        'tagged': {'tag%d' % i: make_aggregate(10 + ts % 7 + i % 5) for i in range(tags)},
+    }
+
+
+def make_screen():
+    return Screen(
+        33,
+        RealConsoleMarkup(),
+        cases_sort_by='count',
+        cases_max_spark=120,
+        max_case_len=32,
+        times_max_spark=120,
+        sizes_max_spark=120,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fixed_time(monkeypatch):
+    monkeypatch.setattr(screen_module, 'get_terminal_size', lambda: (200, 60))
+    monkeypatch.setattr(screen_module, 'time', SimpleNamespace(time=lambda: NOW + 100.0))
+
+
+def test_unchanged_blocks_are_not_rendered(monkeypatch):
+    screen = make_screen()
+    for ts in range(NOW, NOW + 5):
+        screen.add_second_data(make_second(ts, 20))
+    renders = []
+    original = CasesBlock.render
+
+    def counting_render(block, expected_width=None):
+        renders.append(expected_width)
+        original(block, expected_width)
+
+    monkeypatch.setattr(CasesBlock, 'render', counting_render)
+    first = screen.render_lines()
+    assert screen.render_lines() == first
+    assert len(renders) == 1
+    screen.add_second_data(make_second(NOW + 5, 20))
+    screen.render_lines()
+    assert len(renders) == 2
+
+
+def test_cached_render_same_as_full():
+    cached = make_screen()
+    for ts in range(NOW, NOW + 10):
+        cached.add_second_data(make_second(ts, 20))
+        cached.render_lines()
+        cached.render_lines()
+    full = make_screen()
+    for ts in range(NOW, NOW + 10):
+        full.add_second_data(make_second(ts, 20))
+    assert cached.render_lines() == full.render_lines()
+    assert len(cached.render_lines()) == 59
+
+
+def test_frame_update():
+    markup = RealConsoleMarkup()
+    lines = ['first', 'second', 'third']
+    assert frame_update(None, lines, markup) == markup.clear + 'first\nsecond\nthird\n' + markup.TOTAL_RESET
+    update = frame_update(lines, ['first', 'changed', 'third'], markup)
+    assert update == '\x1b[2;1H' + markup.RESET + 'changed\x1b[K' + '\x1b[4;1H' + markup.TOTAL_RESET
+    # no cursor moves without markup
+    assert frame_update(lines, ['first', 'changed', 'third'], NoConsoleMarkup()) == 'first\nchanged\nthird\n'
+
+
+def render_new_second(screen, ts):
+    screen.add_second_data(make_second(ts, 500))
+    return screen.render_lines()
+
+
+@pytest.mark.benchmark(group='console render', min_rounds=5)
+@pytest.mark.parametrize('new_data', [True, False], ids=['new_second', 'same_second'])
+def test_render_benchmark(benchmark, new_data):
+    screen = make_screen()
+    for ts in range(NOW, NOW + 60):
+        screen.add_second_data(make_second(ts, 500))
+    screen.render_lines()
+    if new_data:
+        seconds = iter(range(NOW + 60, NOW + 10000))
+        lines = benchmark(lambda: render_new_second(screen, next(seconds)))
+    else:
+        lines = benchmark(screen.render_lines)
+    assert len(lines) == 59
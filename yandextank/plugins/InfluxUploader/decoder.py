@@ -5,10 +5,39 @@ def uts(dt):
     return int(time.mktime(dt.timetuple()))
 
 
+def escape_key(key):
+    """Escape measurement, tag or field key for line protocol, the way influxdb client does"""
+    if key is None:
+        return ''
+    return str(key).replace("\\", "\\\\").replace(" ", "\\ ").replace(",", "\\,").replace("=", "\\=").replace("\n", "\\n")
+
+
+def field_value(value):
+    """Field value in line protocol, the way influxdb client writes it"""
+    value_type = type(value)
+    if value_type is float:
+        return repr(value)
+    if value_type is int:
+        return '%di' % value
+    if value_type is str:
+        return '"%s"' % value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    if value_type is bool:
+        return str(value)
+    if value is None:
+        return ''
+    try:
+        return repr(float(value))
+    except (TypeError, ValueError):
+        return str(value)
+
+
 class Decoder(object):
     """
     Decode metrics incoming from tank into points for InfluxDB client
 
+    Tags and line protocol prefix of a point are built once for every measurement and label,
+    points for the following seconds only get new field values.
+
     Parameters
     ----------
     parent_tags : dict
@@ -29,121 +58,149 @@ class Decoder(object):
         initial_tags.update(parent_tags)
         self.tags = initial_tags
         self.histograms = histograms
+        # (measurement, additional tags) -> (tags, line prefix)
+        self.__templates = {}
+        self.__keys = {}
+        self.__quantile_keys = {}
 
     def set_uuid(self, id_):
         self.tags['uuid'] = id_
+        self.__templates.clear()
 
     def decode_monitoring(self, data):
         """
         The reason why we have two separate methods for monitoring
         and aggregates is a strong difference in incoming data.
         """
-        points = list()
+        return [
+            self.__make_point(measurement, additional_tags, ts, fields)
+            for measurement, additional_tags, ts, fields in self.__monitoring_fields(data)
+        ]
+
+    def encode_monitoring(self, data):
+        """Same points as decode_monitoring, in line protocol"""
+        return [
+            self.__make_line(measurement, additional_tags, ts, fields)
+            for measurement, additional_tags, ts, fields in self.__monitoring_fields(data)
+        ]
+
+    def decode_aggregates(self, aggregated_data, gun_stats, prefix):
+        return [
+            self.__make_point(measurement, additional_tags, ts, fields)
+            for measurement, additional_tags, ts, fields in self.__aggregates_fields(aggregated_data, gun_stats, prefix)
+        ]
+
+    def encode_aggregates(self, aggregated_data, gun_stats, prefix):
+        """Same points as decode_aggregates, in line protocol"""
+        return [
+            self.__make_line(measurement, additional_tags, ts, fields)
+            for measurement, additional_tags, ts, fields in self.__aggregates_fields(aggregated_data, gun_stats, prefix)
+        ]
+
+    @staticmethod
+    def __monitoring_fields(data):
         for second_data in data:
+            ts = int(second_data["timestamp"])
             for host, host_data in second_data["data"].items():
-                points.append(
-                    self.__make_points(
-                        "monitoring",
-                        {"host": host, "comment": host_data.get("comment")},
-                        second_data["timestamp"],
-                        {
-                            # cast int to float. avoid https://github.com/yandex/yandex-tank/issues/776
-                            metric: float(value) if isinstance(value, int) else value
-                            for metric, value in host_data["metrics"].items()
-                        },
-                    )
+                yield "monitoring", (("host", host), ("comment", host_data.get("comment"))), ts, sorted(
+                    # cast int to float. avoid https://github.com/yandex/yandex-tank/issues/776
+                    (metric, float(value) if isinstance(value, int) else value)
+                    for metric, value in host_data["metrics"].items()
                 )
-        return points
 
-    def decode_aggregates(self, aggregated_data, gun_stats, prefix):
-        ts = aggregated_data["ts"]
-        points = list()
+    def __aggregates_fields(self, aggregated_data, gun_stats, prefix):
+        ts = int(aggregated_data["ts"])
         # stats overall w/ __OVERALL__ label
-        points += self.__make_points_for_label(ts, aggregated_data["overall"], "__OVERALL__", prefix, gun_stats)
+        labels = [("__OVERALL__", aggregated_data["overall"])]
         # detailed stats per tag
         if self.labeled:
-            for label, aggregated_data_by_tag in aggregated_data["tagged"].items():
-                points += self.__make_points_for_label(ts, aggregated_data_by_tag, label, prefix, gun_stats)
-        return points
+            labels.extend(aggregated_data["tagged"].items())
+        for label, data in labels:
+            for measurement, fields in self.__label_fields(data, gun_stats):
+                yield prefix + measurement, (("label", label),), ts, fields
 
-    def __make_points_for_label(self, ts, data, label, prefix, gun_stats):
-        """x
-        Make a set of points for `this` label
+    def __label_fields(self, data, gun_stats):
+        """
+        Fields of `this` label in line protocol order, for each measurement
 
         overall_quantiles, overall_meta, net_codes, proto_codes, histograms
         """
-        label_points = list()
-
-        label_points.extend(
-            (
-                # overall quantiles for label
-                self.__make_points(
-                    prefix + "overall_quantiles", {"label": label}, ts, self.__make_quantile_fields(data)
-                ),
-                # overall meta (gun status) for label
-                self.__make_points(
-                    prefix + "overall_meta", {"label": label}, ts, self.__make_overall_meta_fields(data, gun_stats)
-                ),
-                # net codes for label
-                self.__make_points(prefix + "net_codes", {"label": label}, ts, self.__make_netcodes_fields(data)),
-                # proto codes for label
-                self.__make_points(prefix + "proto_codes", {"label": label}, ts, self.__make_protocodes_fields(data)),
-            )
-        )
+        interval_real = data["interval_real"]
+        quantiles = interval_real["q"]
+        yield "overall_quantiles", [
+            (key, quantiles["value"][i] / 1000.0) for i, key in self.__ordered_quantile_keys(quantiles["q"])
+        ]
+        # overall meta (gun status)
+        yield "overall_meta", [
+            ("RPS", interval_real["len"]),
+            ("active_threads", gun_stats["metrics"]["instances"]),
+            ("planned_requests", float(gun_stats["metrics"]["reqps"])),
+        ]
+        yield "net_codes", sorted((str(code), int(cnt)) for code, cnt in data["net_code"]["count"].items())
+        yield "proto_codes", sorted((str(code), int(cnt)) for code, cnt in data["proto_code"]["count"].items())
         # histograms, one row for each bin
         if self.histograms:
-            for bin_, count in zip(data["interval_real"]["hist"]["bins"], data["interval_real"]["hist"]["data"]):
-                label_points.append(
-                    self.__make_points(prefix + "histograms", {"label": label}, ts, {"bin": bin_, "count": count})
-                )
-        return label_points
-
-    @staticmethod
-    def __make_quantile_fields(data):
-        return {
-            'q' + str(q): value / 1000.0
-            for q, value in zip(data["interval_real"]["q"]["q"], data["interval_real"]["q"]["value"])
-        }
-
-    @staticmethod
-    def __make_overall_meta_fields(data, stats):
-        return {
-            "active_threads": stats["metrics"]["instances"],
-            "RPS": data["interval_real"]["len"],
-            "planned_requests": float(stats["metrics"]["reqps"]),
-        }
-
-    @staticmethod
-    def __make_netcodes_fields(data):
-        return {str(code): int(cnt) for code, cnt in data["net_code"]["count"].items()}
-
-    @staticmethod
-    def __make_protocodes_fields(data):
-        return {str(code): int(cnt) for code, cnt in data["proto_code"]["count"].items()}
-
-    def __make_points(self, measurement, additional_tags, ts, fields):
+            for bin_, count in zip(interval_real["hist"]["bins"], interval_real["hist"]["data"]):
+                yield "histograms", [("bin", bin_), ("count", count)]
+
+    def __ordered_quantile_keys(self, quantiles):
+        quantiles = tuple(quantiles)
+        keys = self.__quantile_keys.get(quantiles)
+        if keys is None:
+            keys = self.__quantile_keys[quantiles] = sorted(
+                enumerate('q' + str(q) for q in quantiles), key=lambda item: item[1]
+            )
+        return keys
+
+    def __template(self, measurement, additional_tags):
+        template = self.__templates.get((measurement, additional_tags))
+        if template is None:
+            tags = self.tags.copy()
+            tags.update(additional_tags)
+            line = [escape_key(measurement)]
+            for key, value in sorted(tags.items()):
+                key, value = escape_key(key), escape_key(value)
+                if key and value:
+                    line.append(key + '=' + value)
+            template = self.__templates[(measurement, additional_tags)] = (tags, ','.join(line))
+        return template
+
+    def __make_point(self, measurement, additional_tags, ts, fields):
         """
         Parameters
         ----------
         measurement : string
             measurement type (e.g. monitoring, overall_meta, net_codes, proto_codes, overall_quantiles)
-        additional_tags : dict
-            custom additional tags for this points
+        additional_tags : tuple
+            custom additional tags for this points, as (key, value) pairs
         ts : integer
             timestamp
-        fields : dict
-            influxdb columns
+        fields : list
+            influxdb columns, as (key, value) pairs
 
         Returns
         -------
         dict
             points for InfluxDB client
         """
-        tags = self.tags.copy()
-        tags.update(additional_tags)
         return {
             "measurement": measurement,
-            "tags": tags,
-            "time": int(ts),
-            "fields": fields,
+            "tags": self.__template(measurement, additional_tags)[0],
+            "time": ts,
+            "fields": dict(fields),
         }
+
+    def __make_line(self, measurement, additional_tags, ts, fields):
+        """Same as __make_point, in line protocol"""
+        keys = self.__keys
+        values = []
+        for key, value in fields:
+            value = field_value(value)
+            if value:
+                escaped = keys.get(key)
+                if escaped is None:
+                    escaped = keys[key] = escape_key(key) + '='
+                values.append(escaped + value)
+        if values:
+            return '%s %s %d' % (self.__template(measurement, additional_tags)[1], ','.join(values), ts)
+        return '%s %d' % (self.__template(measurement, additional_tags)[1], ts)
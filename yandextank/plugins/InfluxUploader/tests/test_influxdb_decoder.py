@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 from uuid import uuid4
+
+import pytest
+from influxdb.line_protocol import make_lines
+
 from yandextank.plugins.InfluxUploader.decoder import Decoder
 
 
@@ -53,3 +57,109 @@ class TestDecoder(object):
                 assert False
             if not value == expected_metrics[metric]:
                 assert False
+
+
+def make_aggregate(count):
+    return {
+        'interval_real': {
+            'len': count,
+            'total': count * 1500,
+            'min': 1000,
+            'max': 2000,
+            'q': {'q': [50, 75, 90, 95, 98, 99, 100], 'value': [1500, 1600, 1700, 1800, 1900, 1950, 2000]},
+            'hist': {'data': [count // 2, count - count // 2], 'bins': [1000, 2000]},
+        },
+        'net_code': {'count': {'0': count - 1, '110': 1}},
+        'proto_code': {'count': {'200': count - 2, '404': 1, '502': 1}},
+    }
+
+
+def make_second(ts, labels):
+    return {
+        'ts': ts,
+        'overall': make_aggregate(10 * labels),
+        'tagged': {'label %d' % i: make_aggregate(10 + i % 7) for i in range(labels)},
+    }
+
+
+STATS = {'ts': 1500000000, 'metrics': {'instances': 10, 'reqps': 100}}
+
+
+def reference_points(tags, aggregated_data, gun_stats, prefix, histograms):
+    """Points of decode_aggregates with per point tags and fields, as they were built before templates"""
+    points = []
+    labels = [('__OVERALL__', aggregated_data['overall'])] + list(aggregated_data['tagged'].items())
+    for label, data in labels:
+        interval_real = data['interval_real']
+        quantiles = {'q' + str(q): value / 1000.0 for q, value in zip(interval_real['q']['q'], interval_real['q']['value'])}
+        meta = {
+            'active_threads': gun_stats['metrics']['instances'],
+            'RPS': interval_real['len'],
+            'planned_requests': float(gun_stats['metrics']['reqps']),
+        }
+        measurements = [
+            ('overall_quantiles', quantiles),
+            ('overall_meta', meta),
+            ('net_codes', {str(code): int(cnt) for code, cnt in data['net_code']['count'].items()}),
+            ('proto_codes', {str(code): int(cnt) for code, cnt in data['proto_code']['count'].items()}),
+        ]
+        if histograms:
+            for bin_, count in zip(interval_real['hist']['bins'], interval_real['hist']['data']):
+                measurements.append(('histograms', {'bin': bin_, 'count': count}))
+        for measurement, fields in measurements:
+            point_tags = tags.copy()
+            point_tags.update({'label': label})
+            points.append(
+                {
+                    'measurement': prefix + measurement,
+                    'tags': point_tags,
+                    'time': int(aggregated_data['ts']),
+                    'fields': fields,
+                }
+            )
+    return points
+
+
+def test_encode_aggregates():
+    decoder = Decoder('tank', 'uuid', {'custom': 'with space', 'empty': ''}, True, True)
+    data = make_second(1500000000, 5)
+    expected = reference_points(decoder.tags, data, STATS, 'prefix_', True)
+    for _ in range(2):
+        assert decoder.decode_aggregates(data, STATS, 'prefix_') == expected
+        lines = decoder.encode_aggregates(data, STATS, 'prefix_')
+        assert '\n'.join(lines) + '\n' == make_lines({'points': expected}, 's')
+    assert lines[6] == 'prefix_overall_quantiles,custom=with\\ space,label=label\\ 0,tank=tank,uuid=uuid q100=2.0,q50=1.5,q75=1.6,q90=1.7,q95=1.8,q98=1.9,q99=1.95 1500000000'
+    decoder.set_uuid('new')
+    assert decoder.decode_aggregates(data, STATS, 'prefix_')[0]['tags']['uuid'] == 'new'
+    assert 'uuid=new' in decoder.encode_aggregates(data, STATS, 'prefix_')[0]
+
+
+def test_encode_monitoring():
+    decoder = Decoder('tank', 'uuid', {}, True, True)
+    data = [
+        {'data': {'host 1': {'comment': None, 'metrics': {'cpu': 1, 'state': 'down "now"', 'mem': 0.5}}}, 'timestamp': 1},
+        {'data': {'host 1': {'comment': 'c', 'metrics': {}}}, 'timestamp': 2},
+    ]
+    lines = decoder.encode_monitoring(data)
+    assert '\n'.join(lines) + '\n' == make_lines({'points': decoder.decode_monitoring(data)}, 's')
+    assert lines == [
+        'monitoring,host=host\\ 1,tank=tank,uuid=uuid cpu=1.0,mem=0.5,state="down \\"now\\"" 1',
+        'monitoring,comment=c,host=host\\ 1,tank=tank,uuid=uuid 2',
+    ]
+
+
+def encode_with_client(decoder, data):
+    return make_lines({'points': reference_points(decoder.tags, data, STATS, '', False)}, 's')
+
+
+def encode_with_templates(decoder, data):
+    return '\n'.join(decoder.encode_aggregates(data, STATS, '')) + '\n'
+
+
+@pytest.mark.benchmark(group='influx encode')
+@pytest.mark.parametrize('encode', [encode_with_client, encode_with_templates], ids=['client', 'templates'])
+def test_encode_benchmark(benchmark, encode):
+    decoder = Decoder('tank', 'uuid', {'custom': 'tag'}, True, False)
+    data = make_second(1500000000, 1000)
+    lines = benchmark(encode, decoder, data)
+    assert len(lines.splitlines()) == 4 * 1001
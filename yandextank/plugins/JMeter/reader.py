@@ -4,11 +4,8 @@ from io import StringIO
 
 import numpy as np
 import pandas as pd
-import queue as q
 
-from yandextank.aggregator import TimeChopper
-from yandextank.aggregator import aggregator as agg
-from yandextank.aggregator.aggregator import DataPoller
+from yandextank.aggregator.stats import SecondStats
 
 logger = logging.getLogger(__name__)
 
@@ -33,45 +30,47 @@ KNOWN_EXC = {
 }
 
 
-def _exc_to_net(param1, success):
-    """translate http code to net code. if accertion failed, set net code to 314"""
-    if len(param1) <= 3:
+# codes of every retcode seen, so that each unknown exception is logged once
+_RETCODES = {}
+
+
+def _retcode_codes(retcode):
+    """
+    translate retcode to (net code if sample succeeded, net code if it failed, http code).
+    if accertion failed, net code is 314
+    """
+    if len(retcode) <= 3:
         # FIXME: we're unable to use better logic here, because we should support non-http codes
         # but, we should look for core.util.HTTP or some other common logic
         # here
-        if success:
-            return 0
-        else:
-            return 314
-
-    exc = param1.split(' ')[-1]
-    if exc in KNOWN_EXC:
-        return KNOWN_EXC[exc]
-    else:
-        logger.warning("Unknown Java exception, consider adding it to dictionary: %s", param1)
-        return 41
-
-
-def _exc_to_http(param1):
-    """translate exception str to http code"""
-    if len(param1) <= 3:
         try:
-            int(param1)
-        except BaseException:
-            logger.error("JMeter wrote some strange data into codes column: %s", param1)
-        else:
-            return int(param1)
+            return 0, 314, int(retcode)
+        except ValueError:
+            logger.error("JMeter wrote some strange data into codes column: %s", retcode)
+            return 0, 314, 0
 
-    exc = param1.split(' ')[-1]
+    exc = retcode.split(' ')[-1]
     if exc in KNOWN_EXC:
-        return 0
+        return KNOWN_EXC[exc], KNOWN_EXC[exc], 0
     else:
-        logger.warning("Unknown Java exception. %s", param1)
-        return 0
+        logger.warning("Unknown Java exception, consider adding it to dictionary: %s", retcode)
+        return 41, 41, 0
+
 
+def retcodes_to_codes(retcodes, success):
+    """
+    translate retcodes column to net and http codes arrays, every distinct retcode is translated once
+    """
+    categories = pd.Categorical(retcodes)
+    table = np.zeros((len(categories.categories), 3), dtype=np.int64)
+    for num, retcode in enumerate(categories.categories):
+        if retcode not in _RETCODES:
+            _RETCODES[retcode] = _retcode_codes(retcode)
+        table[num] = _RETCODES[retcode]
+    codes = table[categories.codes]
+    net_codes = np.where(success, codes[:, 0], codes[:, 1])
+    return net_codes, codes[:, 2]
 
-exc_to_net = np.vectorize(_exc_to_net)
-exc_to_http = np.vectorize(_exc_to_http)
 
 # phout_columns = [
 #     'send_ts', 'tag', 'interval_real', 'connect_time', 'send_time', 'latency',
@@ -105,15 +104,13 @@ jtl_types = {
 }
 
 
-def fix_latency(row):
-    if row['latency'] < row['connect_time']:
-        if row['interval_real'] < row['connect_time']:
-            latency = 0
-        else:
-            latency = row['interval_real'] - row['connect_time']
-    else:
-        latency = row['latency'] - row['connect_time']
-    return latency
+def fix_latency(latency, connect_time, interval_real):
+    """latency without connect time, JMeter latency includes it"""
+    return np.where(
+        latency < connect_time,
+        np.where(interval_real < connect_time, 0, interval_real - connect_time),
+        latency - connect_time,
+    )
 
 
 # timeStamp,elapsed,label,responseCode,success,bytes,grpThreads,allThreads,Latency
@@ -127,56 +124,25 @@ def string_to_df(data):
     chunk.set_index(['receive_sec'], inplace=True)
     chunk_length = len(chunk)
     chunk['connect_time'] = (chunk['connect_time'].fillna(0) * 1000).astype(np.int64)
-    chunk['latency'] = chunk['latency'] * 1000
-    chunk['latency'] = chunk.apply(fix_latency, axis=1)
+    chunk['latency'] = fix_latency(chunk['latency'].values * 1000, chunk['connect_time'].values, chunk['interval_real'].values)
     chunk['send_time'] = np.zeros(chunk_length)
     chunk['receive_time'] = chunk['interval_real'] - chunk['latency'] - chunk['connect_time']
     chunk['interval_event'] = np.zeros(chunk_length)
     chunk['size_out'] = np.zeros(chunk_length).astype(int)
-    chunk['net_code'] = exc_to_net(chunk['retcode'], chunk['success'])
-    chunk['proto_code'] = exc_to_http(chunk['retcode'])
+    chunk['net_code'], chunk['proto_code'] = retcodes_to_codes(chunk['retcode'], chunk['success'].values)
     return chunk
 
 
-class JMeterStatAggregator(object):
-    def __init__(self, source):
-        self.worker = agg.Worker({"allThreads": ["max"]}, False)
-        self.source = source
-
-    def __iter__(self):
-        for ts, chunk, rps in self.source:
-            stats = self.worker.aggregate(chunk)
-            yield [{'ts': ts, 'metrics': {'instances': stats['allThreads']['max'], 'reqps': rps}}]
-
-    def close(self):
-        pass
-
-
 class JMeterReader(object):
-    def __init__(self, filename, poller: DataPoller):
+    def __init__(self, filename):
         self.buffer = ""
         self.stat_buffer = ""
         self.jtl_file = filename
         self.jmeter_finished = False
         self.agg_finished = False
         self.closed = False
-        self.stat_queue = q.Queue()
-        self.stats_reader = JMeterStatAggregator(
-            TimeChopper([self._notify_poller_finished(poller.poll(self._read_stat_queue()))])
-        )
-
-    def _notify_poller_finished(self, poller):
-        for item in poller:
-            yield item
-        self.agg_finished = True
-
-    def _read_stat_queue(self):
-        while not self.closed:
-            # for _ in range(self.stat_queue.qsize()):
-            try:
-                yield self.stat_queue.get_nowait()
-            except q.Empty:
-                yield None
+        # max allThreads and rps of receive seconds are counted while chunks are parsed
+        self.stats_reader = SecondStats()
 
     def _read_jtl_chunk(self, jtl):
         data = jtl.read(1024 * 1024 * 10)
@@ -186,7 +152,7 @@ class JMeterReader(object):
                 ready_chunk = self.buffer + parts[0] + '\n'
                 self.buffer = parts[1]
                 df = string_to_df(ready_chunk)
-                self.stat_queue.put(df)
+                self.stats_reader.add(df.index.values, df['allThreads'].values)
                 return df
             else:
                 self.buffer += parts[0]
@@ -201,6 +167,7 @@ class JMeterReader(object):
             while not self.closed:
                 yield self._read_jtl_chunk(jtl)
             yield self._read_jtl_chunk(jtl)
+        self.stats_reader.finish()
 
     def close(self):
         self.closed = True
@@ -0,0 +1,140 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from yandextank.plugins.JMeter import reader
+from yandextank.plugins.JMeter.reader import KNOWN_EXC, string_to_df
+
+RETCODES = [
+    '200',
+    '200',
+    '404',
+    '503',
+    'Non HTTP response code: java.net.SocketTimeoutException',
+    'Non HTTP response code: org.apache.http.NoHttpResponseException',
+    'Non HTTP response code: java.lang.IllegalStateException',
+    'abc',
+]
+
+
+def make_jtl(count, seed=0):
+    rng = np.random.default_rng(seed)
+    elapsed = rng.integers(1, 2000, count)
+    connect = rng.integers(0, 100, count)
+    # some latencies are lower than connect time, as JMeter sometimes writes them
+    latency = np.maximum(elapsed - rng.integers(0, 200, count), 0)
+    retcodes = rng.integers(0, len(RETCODES), count)
+    success = rng.random(count) < 0.9
+    return ''.join(
+        '%d\t%d\ttag%d\t%s\t%s\t%d\t%d\t%d\t%d\t%d\n'
+        % (
+            1500000000000 + i * 10,
+            elapsed[i],
+            i % 5,
+            RETCODES[retcodes[i]],
+            'true' if success[i] else 'false',
+            1000 + i % 100,
+            10,
+            20,
+            latency[i],
+            connect[i],
+        )
+        for i in range(count)
+    )
+
+
+def rowwise_fix_latency(row):
+    if row['latency'] < row['connect_time']:
+        if row['interval_real'] < row['connect_time']:
+            return 0
+        return row['interval_real'] - row['connect_time']
+    return row['latency'] - row['connect_time']
+
+
+def rowwise_net_code(retcode, success):
+    if len(retcode) <= 3:
+        return 0 if success else 314
+    return KNOWN_EXC.get(retcode.split(' ')[-1], 41)
+
+
+def rowwise_http_code(retcode):
+    if len(retcode) <= 3 and retcode.isdigit():
+        return int(retcode)
+    return 0
+
+
+def string_to_df_rowwise(data):
+    # row by row decoding replaced by vectorized string_to_df
+    chunk = pd.read_csv(
+        reader.StringIO(data),
+        sep='\t',
+        names=reader.jtl_columns,
+        dtype=reader.jtl_types,
+        keep_default_na=False,
+        on_bad_lines='warn',
+    )
+    chunk["receive_ts"] = (chunk["send_ts"] + chunk['interval_real']) / 1000.0
+    chunk['receive_sec'] = chunk["receive_ts"].astype(np.int64)
+    chunk['interval_real'] = chunk["interval_real"] * 1000
+    chunk.set_index(['receive_sec'], inplace=True)
+    chunk_length = len(chunk)
+    chunk['connect_time'] = (chunk['connect_time'].fillna(0) * 1000).astype(np.int64)
+    chunk['latency'] = chunk['latency'] * 1000
+    chunk['latency'] = chunk.apply(rowwise_fix_latency, axis=1)
+    chunk['send_time'] = np.zeros(chunk_length)
+    chunk['receive_time'] = chunk['interval_real'] - chunk['latency'] - chunk['connect_time']
+    chunk['interval_event'] = np.zeros(chunk_length)
+    chunk['size_out'] = np.zeros(chunk_length).astype(int)
+    chunk['net_code'] = np.vectorize(rowwise_net_code)(chunk['retcode'], chunk['success'])
+    chunk['proto_code'] = np.vectorize(rowwise_http_code)(chunk['retcode'])
+    return chunk
+
+
+def test_same_as_rowwise():
+    data = make_jtl(2000)
+    pd.testing.assert_frame_equal(string_to_df(data), string_to_df_rowwise(data))
+
+
+def test_unknown_exception_logged_once(caplog, monkeypatch):
+    monkeypatch.setattr(reader, '_RETCODES', {})
+    data = make_jtl(100)
+    with caplog.at_level(logging.WARNING, logger=reader.__name__):
+        string_to_df(data)
+        string_to_df(data)
+    unknown = [record for record in caplog.records if 'IllegalStateException' in record.getMessage()]
+    assert len(unknown) == 1
+
+
+def test_empty_chunk():
+    chunk = string_to_df('')
+    assert len(chunk) == 0
+    assert 'net_code' in chunk and 'proto_code' in chunk
+
+
+@pytest.mark.benchmark(group='jtl decode', min_rounds=1)
+@pytest.mark.parametrize('decode', [string_to_df, string_to_df_rowwise])
+def test_decode_benchmark(benchmark, decode):
+    # about 5 MB of JTL
+    data = make_jtl(100000)
+    assert len(benchmark(decode, data)) == 100000
+
+
+def test_reader_stats(tmp_path):
+    jtl = tmp_path / 'test.jtl'
+    data = make_jtl(3000)
+    jtl.write_text(data)
+    jmeter_reader = reader.JMeterReader(str(jtl))
+    jmeter_reader.jmeter_finished = True
+    chunks = []
+    results = iter(jmeter_reader)
+    while not jmeter_reader.agg_finished:
+        chunks.append(next(results))
+    jmeter_reader.close()
+    chunks += list(results)
+    df = pd.concat([chunk for chunk in chunks if chunk is not None])
+    stats = [item for items in jmeter_reader.stats_reader if items for item in items]
+    assert [item['ts'] for item in stats] == sorted(df.index.unique())
+    assert [item['metrics']['reqps'] for item in stats] == df.groupby(level=0).size().tolist()
+    assert [item['metrics']['instances'] for item in stats] == [20] * len(stats)
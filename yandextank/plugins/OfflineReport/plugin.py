@@ -5,23 +5,23 @@ import json
 import logging
 import os
 import sys
-import pandas as pd
 from datetime import timedelta, datetime
 
 import io
 
 from collections import defaultdict
+from ...aggregator.histogram import SlidingHistogram
 from ...common.interfaces import AbstractPlugin, AggregateResultListener
 
 logger = logging.getLogger(__name__)  # pylint: disable=C0103
 
 
-def calc_overall_times(overall, quantiles):
-    cumulative = overall.cumsum()
-    total = cumulative.max()
-    positions = cumulative.searchsorted([float(i) / 100 * total for i in quantiles])
-    all_times = [cumulative.index[i] / 1000.0 for i in positions]
-    overall_times = zip(quantiles, all_times)
+def calc_overall_times(histogram, quantiles):
+    """
+    :type histogram: SlidingHistogram
+    """
+    all_times = histogram.quantiles(histogram.overall, quantiles) / 1000.0
+    overall_times = zip(quantiles, all_times.tolist())
     return overall_times
 
 
@@ -102,7 +102,7 @@ class Plugin(AbstractPlugin, AggregateResultListener):
             logging.exception('Failed to open file')
             raise OSError('Error opening OfflineReport log file')
 
-        self.overall = None
+        self.overall = SlidingHistogram(window=0)
         self.overall_proto_code = defaultdict(int)
         self.overall_net_code = defaultdict(int)
         self.quantiles = [10, 20, 30, 40, 50, 60, 70, 75, 80, 85, 90, 95, 99, 99.5, 100]
@@ -158,12 +158,7 @@ class Plugin(AbstractPlugin, AggregateResultListener):
             )
         )
 
-        incoming_hist = data['overall']['interval_real']['hist']
-        dist = pd.Series(incoming_hist['data'], index=incoming_hist['bins'])
-        if self.overall is None:
-            self.overall = dist
-        else:
-            self.overall = self.overall.add(dist, fill_value=0)
+        self.overall.add(stats['ts'], data['overall']['interval_real']['hist'])
 
         if self.first_ts is None:
             self.first_ts = stats['ts']
@@ -1,4 +1,5 @@
-import itertools
+import json
+import math
 import time
 from ...common import util
 
@@ -7,10 +8,23 @@ def uts(dt):
     return int(time.mktime(dt.timetuple()))
 
 
+def json_value(value):
+    """Point value as json.dumps writes it"""
+    value_type = type(value)
+    if value_type is int:
+        return str(value)
+    if value_type is float and math.isfinite(value):
+        return repr(value)
+    return json.dumps(value)
+
+
 class Decoder(object):
     """
     Decode metrics incoming from tank into points for OpenTSDB
 
+    Tags and json prefix of a point are built once for every metric, label and field,
+    points for the following seconds only get new timestamp and value.
+
     Parameters
     ----------
     parent_tags : dict
@@ -31,147 +45,146 @@ class Decoder(object):
         initial_tags.update(parent_tags)
         self.tags = initial_tags
         self.histograms = histograms
+        # (metric, additional tags, field) -> (tags, json prefix)
+        self.__templates = {}
 
     def set_uuid(self, id_):
         self.tags['uuid'] = id_
+        self.__templates.clear()
 
     def decode_monitoring(self, data):
         """
         The reason why we have two separate methods for monitoring
         and aggregates is a strong difference in incoming data.
         """
-        points = list()
-        for second_data in data:
-            for host, host_data in second_data["data"].items():
-                points.append(
-                    self.__make_points(
-                        "monitoring",
-                        {"host": host, "comment": host_data.get("comment")},
-                        second_data["timestamp"],
-                        {
-                            # cast int to float. avoid
-                            # https://github.com/yandex/yandex-tank/issues/776
-                            metric: float(value) if isinstance(value, int) else value
-                            for metric, value in host_data["metrics"].items()
-                        },
-                    )
-                )
-        return list(itertools.chain(*points))
+        return [
+            self.__make_point(metric, additional_tags, ts, key, value, lookup)
+            for metric, additional_tags, ts, fields, lookup in self.__monitoring_fields(data)
+            for key, value in fields
+        ]
+
+    def encode_monitoring(self, data):
+        """Same points as decode_monitoring, each one serialized to json"""
+        return [
+            self.__make_json(metric, additional_tags, ts, key, value, lookup)
+            for metric, additional_tags, ts, fields, lookup in self.__monitoring_fields(data)
+            for key, value in fields
+        ]
 
     def decode_aggregates(self, aggregated_data, gun_stats, prefix):
-        ts = aggregated_data["ts"]
-        points = list()
+        return [
+            self.__make_point(metric, additional_tags, ts, key, value, lookup)
+            for metric, additional_tags, ts, fields, lookup in self.__aggregates_fields(
+                aggregated_data, gun_stats, prefix
+            )
+            for key, value in fields
+        ]
+
+    def encode_aggregates(self, aggregated_data, gun_stats, prefix):
+        """Same points as decode_aggregates, each one serialized to json"""
+        return [
+            self.__make_json(metric, additional_tags, ts, key, value, lookup)
+            for metric, additional_tags, ts, fields, lookup in self.__aggregates_fields(
+                aggregated_data, gun_stats, prefix
+            )
+            for key, value in fields
+        ]
+
+    @staticmethod
+    def __monitoring_fields(data):
+        for second_data in data:
+            ts = int(second_data["timestamp"])
+            for host, host_data in second_data["data"].items():
+                yield "monitoring", (("host", host), ("comment", host_data.get("comment"))), ts, (
+                    # cast int to float. avoid
+                    # https://github.com/yandex/yandex-tank/issues/776
+                    (metric, float(value) if isinstance(value, int) else value)
+                    for metric, value in host_data["metrics"].items()
+                ), {}
+
+    def __aggregates_fields(self, aggregated_data, gun_stats, prefix):
+        ts = int(aggregated_data["ts"])
         # stats overall w/ __OVERALL__ label
-        points += self.__make_points_for_label(ts, aggregated_data["overall"], "__OVERALL__", prefix, gun_stats)
+        labels = [("__OVERALL__", aggregated_data["overall"])]
         # detailed stats per tag
         if self.labeled:
-            for label, aggregated_data_by_tag in aggregated_data["tagged"].items():
-                points += self.__make_points_for_label(ts, aggregated_data_by_tag, label, prefix, gun_stats)
-        return points
+            labels.extend(aggregated_data["tagged"].items())
+        for label, data in labels:
+            for metric, fields, lookup in self.__label_fields(data, gun_stats):
+                yield prefix + metric, (("label", label),), ts, fields, lookup
 
-    def __make_points_for_label(self, ts, data, label, prefix, gun_stats):
-        """x
-        Make a set of points for `this` label
+    def __label_fields(self, data, gun_stats):
+        """
+        Fields of `this` label for each metric, with field labels lookup table
 
         overall_quantiles, overall_meta, net_codes, proto_codes, histograms
         """
-        label_points = list()
-
-        label_points.extend(
-            (
-                # overall quantiles for label
-                self.__make_points(
-                    prefix + "overall_quantiles", {"label": label}, ts, self.__make_quantile_fields(data)
-                ),
-                # overall meta (gun status) for label
-                self.__make_points(
-                    prefix + "overall_meta", {"label": label}, ts, self.__make_overall_meta_fields(data, gun_stats)
-                ),
-                # net codes for label
-                self.__make_points(
-                    prefix + "net_codes",
-                    {"label": label},
-                    ts,
-                    self.__make_netcodes_fields(data),
-                    field_lookup_table=util.NET,
-                ),
-                # proto codes for label
-                self.__make_points(
-                    prefix + "proto_codes",
-                    {"label": label},
-                    ts,
-                    self.__make_protocodes_fields(data),
-                    field_lookup_table=util.HTTP,
-                ),
-            )
-        )
+        interval_real = data["interval_real"]
+        yield "overall_quantiles", [
+            ('q' + str(q), value / 1000.0) for q, value in zip(interval_real["q"]["q"], interval_real["q"]["value"])
+        ], {}
+        # overall meta (gun status)
+        yield "overall_meta", [
+            ("active_threads", gun_stats["metrics"]["instances"]),
+            ("RPS", interval_real["len"]),
+            ("planned_requests", float(gun_stats["metrics"]["reqps"])),
+            ("avg_rt", float(interval_real['total']) / interval_real['len'] / 1000.0),
+            ("min", interval_real['min'] / 1000.0),
+            ("max", interval_real['max'] / 1000.0),
+        ], {}
+        yield "net_codes", [(int(code), int(cnt)) for code, cnt in data["net_code"]["count"].items()], util.NET
+        yield "proto_codes", [(int(code), int(cnt)) for code, cnt in data["proto_code"]["count"].items()], util.HTTP
         # histograms, one row for each bin
         if self.histograms:
-            for bin_, count in zip(data["interval_real"]["hist"]["bins"], data["interval_real"]["hist"]["data"]):
-                label_points.append(
-                    self.__make_points(prefix + "histograms", {"label": label}, ts, {"bin": bin_, "count": count})
-                )
-        return list(itertools.chain(*label_points))
-
-    @staticmethod
-    def __make_quantile_fields(data):
-        return {
-            'q' + str(q): value / 1000.0
-            for q, value in zip(data["interval_real"]["q"]["q"], data["interval_real"]["q"]["value"])
-        }
+            for bin_, count in zip(interval_real["hist"]["bins"], interval_real["hist"]["data"]):
+                yield "histograms", [("bin", bin_), ("count", count)], {}
 
-    @staticmethod
-    def __make_overall_meta_fields(data, stats):
-        return {
-            "active_threads": stats["metrics"]["instances"],
-            "RPS": data["interval_real"]["len"],
-            "planned_requests": float(stats["metrics"]["reqps"]),
-            "avg_rt": float(data['interval_real']['total']) / data['interval_real']['len'] / 1000.0,
-            "min": data['interval_real']['min'] / 1000.0,
-            "max": data['interval_real']['max'] / 1000.0,
-        }
-
-    @staticmethod
-    def __make_netcodes_fields(data):
-        return {int(code): int(cnt) for code, cnt in data["net_code"]["count"].items()}
-
-    @staticmethod
-    def __make_protocodes_fields(data):
-        return {int(code): int(cnt) for code, cnt in data["proto_code"]["count"].items()}
-
-    def __make_points(self, metric, additional_tags, ts, fields, field_lookup_table={}):
+    def __template(self, metric, additional_tags, field, field_lookup_table):
+        key = (metric, additional_tags, field)
+        template = self.__templates.get(key)
+        if template is None:
+            tags = self.tags.copy()
+            tags.update(additional_tags)
+            tags["field"] = str(field)
+            if field_lookup_table.get(field):
+                tags["field_label"] = field_lookup_table.get(field).replace(" ", "_")
+            prefix = '{"metric": %s, "tags": %s, "timestamp": ' % (json.dumps(metric), json.dumps(tags))
+            template = self.__templates[key] = (tags, prefix)
+        return template
+
+    def __make_point(self, metric, additional_tags, ts, field, value, field_lookup_table):
         """
         Parameters
         ----------
         metric : string
             metric type (e.g. monitoring, overall_meta, net_codes, proto_codes, overall_quantiles)
-        additional_tags : dict
-            custom additional tags for this points
+        additional_tags : tuple
+            custom additional tags for this points, as (key, value) pairs
         ts : integer
             timestamp
-        fields : dict
-            opentsdb fields tag
+        field : string
+            opentsdb field tag
+        value :
+            point value
+        field_lookup_table : dict
+            field labels
 
         Returns
         -------
         dict
-            points for OpenTSDB client
+            point for OpenTSDB client
         """
-        result = []
-
-        for key, value in fields.items():
-            tags = self.tags.copy()
-            tags.update(additional_tags)
-            tags["field"] = str(key)
-            if field_lookup_table.get(key):
-                tags["field_label"] = field_lookup_table.get(key).replace(" ", "_")
-            result.append(
-                {
-                    "metric": metric,
-                    "tags": tags,
-                    "timestamp": int(ts),
-                    "value": value,
-                }
-            )
+        return {
+            "metric": metric,
+            "tags": self.__template(metric, additional_tags, field, field_lookup_table)[0],
+            "timestamp": ts,
+            "value": value,
+        }
 
-        return result
+    def __make_json(self, metric, additional_tags, ts, field, value, field_lookup_table):
+        """Same as __make_point, serialized to json"""
+        return '%s%d, "value": %s}' % (
+            self.__template(metric, additional_tags, field, field_lookup_table)[1],
+            ts,
+            json_value(value),
+        )
@@ -4,28 +4,17 @@
 # pylint: disable=missing-docstring
 import datetime
 import logging
-import sys
 from builtins import str
 from uuid import uuid4
 
 from .client import OpenTSDBClient
 from .decoder import Decoder
+from ...common.exporter import BatchExporter, SPILL
 from ...common.interfaces import AbstractPlugin, MonitoringDataListener, AggregateResultListener
 
 logger = logging.getLogger(__name__)  # pylint: disable=C0103
 
 
-def chop(data_list, chunk_size):
-    if sys.getsizeof(str(data_list)) <= chunk_size:
-        return [data_list]
-    elif len(data_list) == 1:
-        logger.warning("Too large piece of Telegraf data. Might experience upload problems.")
-        return [data_list]
-    else:
-        mid = len(data_list) / 2
-        return chop(data_list[:mid], chunk_size) + chop(data_list[mid:], chunk_size)
-
-
 class Plugin(AbstractPlugin, AggregateResultListener, MonitoringDataListener):
     SECTION = 'opentsdb'
 
@@ -34,6 +23,7 @@ class Plugin(AbstractPlugin, AggregateResultListener, MonitoringDataListener):
         self.tank_tag = self.get_option("tank_tag")
         self.prefix_metric = self.get_option("prefix_metric")
         self._client = None
+        self.exporter = None
         self.start_time = None
         self.end_time = None
 
@@ -59,6 +49,16 @@ class Plugin(AbstractPlugin, AggregateResultListener, MonitoringDataListener):
         return self._client
 
     def prepare_test(self):
+        overflow_policy = self.get_option("overflow_policy")
+        self.exporter = BatchExporter(
+            self._write,
+            name='opentsdb exporter',
+            queue_size=self.get_option("queue_size"),
+            batch_size=self.get_option("batch_size"),
+            flush_interval=self.get_option("flush_interval"),
+            overflow_policy=overflow_policy,
+            spill_file=self.core.mkstemp(".jsonl", "opentsdb_spill_") if overflow_policy == SPILL else None,
+        )
         self.core.job.subscribe_plugin(self)
 
     def start_test(self):
@@ -68,15 +68,24 @@ class Plugin(AbstractPlugin, AggregateResultListener, MonitoringDataListener):
         self.end_time = datetime.datetime.now() + datetime.timedelta(minutes=1)
         return retcode
 
+    def post_process(self, retcode):
+        if self.exporter:
+            # monitoring data may come until all plugins end test
+            self.exporter.close(self.get_option("close_timeout"))
+            self.publish('exporter', self.exporter.metrics())
+        return retcode
+
+    def _write(self, points):
+        # points are serialized by decoder already
+        self.client.write('[%s]' % ', '.join(points))
+
     def on_aggregated_data(self, data, stats):
-        self.client.write(self.decoder.decode_aggregates(data, stats, self.prefix_metric))
+        self.exporter.put(self.decoder.encode_aggregates(data, stats, self.prefix_metric))
+        self.publish('exporter', self.exporter.metrics())
 
     def monitoring_data(self, data_list):
         if len(data_list) > 0:
-            [self._send_monitoring(chunk) for chunk in chop(data_list, self.get_option("chunk_size"))]
-
-    def _send_monitoring(self, data):
-        self.client.write(self.decoder.decode_monitoring(data))
+            self.exporter.put(self.decoder.encode_monitoring(data_list))
 
     def set_uuid(self, id_):
-        self.decoder.tags['uuid'] = id_
+        self.decoder.set_uuid(id_)
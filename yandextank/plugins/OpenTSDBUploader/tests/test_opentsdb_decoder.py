@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
+import json
 from uuid import uuid4
 
+import pytest
+
+from yandextank.common import util
 from yandextank.plugins.OpenTSDBUploader.decoder import Decoder
 
 
@@ -51,3 +55,106 @@ class TestDecoder(object):
                 assert False
             if not r_point['value'] == expected_metrics[r_point['tags']['field']]:
                 assert False
+
+
+def make_aggregate(count):
+    return {
+        'interval_real': {
+            'len': count,
+            'total': count * 1500,
+            'min': 1000,
+            'max': 2000,
+            'q': {'q': [50, 75, 90, 95, 98, 99, 100], 'value': [1500, 1600, 1700, 1800, 1900, 1950, 2000]},
+            'hist': {'data': [count // 2, count - count // 2], 'bins': [1000, 2000]},
+        },
+        'net_code': {'count': {'0': count - 1, '110': 1}},
+        'proto_code': {'count': {'200': count - 2, '404': 1, '502': 1}},
+    }
+
+
+def make_second(ts, labels):
+    return {
+        'ts': ts,
+        'overall': make_aggregate(10 * labels),
+        'tagged': {'label %d' % i: make_aggregate(10 + i % 7) for i in range(labels)},
+    }
+
+
+STATS = {'ts': 1500000000, 'metrics': {'instances': 10, 'reqps': 100}}
+
+
+def reference_points(tags, aggregated_data, gun_stats, prefix, histograms):
+    """Points of decode_aggregates with per point tags, as they were built before templates"""
+    points = []
+    labels = [('__OVERALL__', aggregated_data['overall'])] + list(aggregated_data['tagged'].items())
+    for label, data in labels:
+        interval_real = data['interval_real']
+        quantiles = {'q' + str(q): value / 1000.0 for q, value in zip(interval_real['q']['q'], interval_real['q']['value'])}
+        meta = {
+            'active_threads': gun_stats['metrics']['instances'],
+            'RPS': interval_real['len'],
+            'planned_requests': float(gun_stats['metrics']['reqps']),
+            'avg_rt': float(interval_real['total']) / interval_real['len'] / 1000.0,
+            'min': interval_real['min'] / 1000.0,
+            'max': interval_real['max'] / 1000.0,
+        }
+        metrics = [
+            ('overall_quantiles', quantiles, {}),
+            ('overall_meta', meta, {}),
+            ('net_codes', {int(code): int(cnt) for code, cnt in data['net_code']['count'].items()}, util.NET),
+            ('proto_codes', {int(code): int(cnt) for code, cnt in data['proto_code']['count'].items()}, util.HTTP),
+        ]
+        if histograms:
+            for bin_, count in zip(interval_real['hist']['bins'], interval_real['hist']['data']):
+                metrics.append(('histograms', {'bin': bin_, 'count': count}, {}))
+        for metric, fields, lookup in metrics:
+            for key, value in fields.items():
+                point_tags = tags.copy()
+                point_tags.update({'label': label})
+                point_tags['field'] = str(key)
+                if lookup.get(key):
+                    point_tags['field_label'] = lookup.get(key).replace(' ', '_')
+                points.append(
+                    {
+                        'metric': prefix + metric,
+                        'tags': point_tags,
+                        'timestamp': int(aggregated_data['ts']),
+                        'value': value,
+                    }
+                )
+    return points
+
+
+def test_encode_aggregates():
+    decoder = Decoder('tank', 'uuid', {'custom': 'tag'}, True, True)
+    data = make_second(1500000000, 5)
+    expected = reference_points(decoder.tags, data, STATS, 'prefix_', True)
+    for _ in range(2):
+        assert decoder.decode_aggregates(data, STATS, 'prefix_') == expected
+        assert '[%s]' % ', '.join(decoder.encode_aggregates(data, STATS, 'prefix_')) == json.dumps(expected)
+    decoder.set_uuid('new')
+    assert json.loads(decoder.encode_aggregates(data, STATS, 'prefix_')[0])['tags']['uuid'] == 'new'
+
+
+def test_encode_monitoring():
+    decoder = Decoder('tank', 'uuid', {}, True, True)
+    data = [{'data': {'host': {'comment': None, 'metrics': {'cpu': 1, 'state': 'down', 'nan': float('nan')}}}, 'timestamp': 1}]
+    encoded = '[%s]' % ', '.join(decoder.encode_monitoring(data))
+    assert encoded == json.dumps(decoder.decode_monitoring(data))
+
+
+def encode_with_client(decoder, data):
+    return json.dumps(reference_points(decoder.tags, data, STATS, '', False))
+
+
+def encode_with_templates(decoder, data):
+    return '[%s]' % ', '.join(decoder.encode_aggregates(data, STATS, ''))
+
+
+@pytest.mark.benchmark(group='opentsdb encode')
+@pytest.mark.parametrize('encode', [encode_with_client, encode_with_templates], ids=['client', 'templates'])
+def test_encode_benchmark(benchmark, encode):
+    decoder = Decoder('tank', 'uuid', {'custom': 'tag'}, True, False)
+    data = make_second(1500000000, 1000)
+    points = benchmark(encode, decoder, data)
+    assert len(json.loads(points)) == 18 * 1001
@@ -14,9 +14,9 @@ from yandextank.contrib.netort.netort.resource import TempDownloaderOpenerProtoc
 from .reader import PandoraStatsReader
 from ..Console import Plugin as ConsolePlugin
 from ..Console import screen as ConsoleScreen
-from ..Phantom import PhantomReader, string_to_df
+from ..Phantom import PhantomReader, bytes_to_df
 from ...common.interfaces import AbstractInfoWidget, GeneratorPlugin
-from ...common.util import tail_lines, FileMultiReader
+from ...common.util import tail_lines, MmapFileReader
 
 logger = logging.getLogger(__name__)
 
@@ -192,9 +192,9 @@ class Plugin(GeneratorPlugin):
             rps_schedule=self.schedule,
         )
 
-    def get_reader(self, parser=string_to_df):
+    def get_reader(self, parser=bytes_to_df):
         if self.reader is None:
-            self.reader = [FileMultiReader(f, self.output_finished) for f in self.report_files]
+            self.reader = [MmapFileReader(f, self.output_finished) for f in self.report_files]
         return [PhantomReader(reader.get_file(), parser=parser) for reader in self.reader]
 
     def get_stats_reader(self):
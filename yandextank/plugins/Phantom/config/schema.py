@@ -61,6 +61,12 @@ OPTIONS = {
     },
     "buffered_seconds": {"type": "integer", "default": 2, 'description': 'Aggregator latency'},
     'cache_dir': {'type': 'string', 'nullable': True, 'default': None, 'description': 'stpd-file cache directory'},
+    'cache_size_limit': {
+        'type': 'integer',
+        'default': 0,
+        'min': 0,
+        'description': 'stpd-file cache size limit in megabytes, least recently used files are removed when it is exceeded. 0 means no limit',
+    },
     'chosen_cases': {'type': 'string', 'default': '', 'description': 'Use only selected cases.'},
     'client_certificate': {'type': 'string', 'default': '', 'description': 'Path to client SSL certificate'},
     'client_cipher_suites': {
@@ -165,6 +171,12 @@ OPTIONS = {
         'default': '',
     },
     'ssl': {'description': 'Enable ssl', 'type': 'boolean', 'default': False},
+    'stepping_workers': {
+        'type': 'integer',
+        'default': 1,
+        'min': 1,
+        'description': 'Number of processes to generate stpd file with. Rps schedule only',
+    },
     "threads": {
         'description': 'Phantom thread count. When not specified, defaults to <processor cores count> / 2 + 1',
         "type": "integer",
@@ -7,12 +7,12 @@ import subprocess
 import time
 from threading import Event
 
-from .reader import PhantomReader, PhantomStatsReader, string_to_df
+from .reader import PhantomReader, PhantomStatsReader, bytes_to_df
 from .utils import PhantomConfig
 from .widget import PhantomInfoWidget, PhantomProgressBarWidget
 from ..Console import Plugin as ConsolePlugin
 from ...common.interfaces import GeneratorPlugin
-from ...common.util import FileMultiReader
+from ...common.util import MmapFileReader
 from .log_analyzer import LogAnalyzer
 
 from yandextank.contrib.netort.netort.process import execute
@@ -72,6 +72,8 @@ class Plugin(GeneratorPlugin):
         if not self._phantom:
             self._phantom = PhantomConfig(self.core, self.cfg, self.stat_log)
             self._phantom.read_config()
+            # end_test is not reached when the test fails to start
+            self.add_cleanup(self._phantom.release_stpd)
         return self._phantom
 
     @property
@@ -80,9 +82,9 @@ class Plugin(GeneratorPlugin):
             self._stat_log = self.core.mkstemp(".log", "phantom_stat_")
         return self._stat_log
 
-    def get_reader(self, parser=string_to_df):
+    def get_reader(self, parser=bytes_to_df):
         if self.reader is None:
-            self.reader = FileMultiReader(self.phantom.phout_file, self.phout_finished)
+            self.reader = MmapFileReader(self.phantom.phout_file, self.phout_finished)
         return PhantomReader(self.reader.get_file(), parser=parser)
 
     def get_stats_reader(self):
@@ -177,6 +179,8 @@ class Plugin(GeneratorPlugin):
         self.phout_finished.set()
         if self.process_stderr:
             self.process_stderr.close()
+        if self._phantom:
+            self._phantom.release_stpd()
         return retcode
 
     def post_process(self, retcode):
@@ -12,11 +12,11 @@ import time
 import datetime
 import itertools as itt
 
-from pandas.errors import ParserError
+from pandas.errors import EmptyDataError, ParserError
 
 from yandextank.common.interfaces import StatsReader
 
-from io import StringIO
+from io import RawIOBase, StringIO
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +50,8 @@ dtypes = {
     'proto_code': np.int64,
 }
 
+binary_dtypes = dict(dtypes, tag='category')
+
 
 def string_to_df(data):
     try:
@@ -90,12 +92,104 @@ def string_to_df_microsec(data):
     return df
 
 
+def bytes_to_df(data):
+    """
+    Decode phout bytes without decoding them to str first.
+
+    Tags are read as pandas Categorical: every distinct tag is stored once and
+    rows keep integer codes, so stripping the '#' suffix is done per distinct
+    tag, not per row. Fields are not matched against NA strings while parsing,
+    an empty tag is NA and an empty send_ts is NaN, as they are in string_to_df.
+    Result has the same columns and index as string_to_df.
+
+    :param data: bytes-like object or binary file-like object with complete lines
+    """
+    source = data if hasattr(data, 'read') else _BufferChain([data])
+    try:
+        chunk = pd.read_csv(
+            source, sep='\t', names=phout_columns, dtype=binary_dtypes, quoting=QUOTE_NONE, na_filter=False
+        )
+    except ParserError as e:
+        logger.error(str(e))
+        logger.error('Incorrect phout data')
+        return
+    except EmptyDataError:
+        return
+
+    if chunk.send_ts.dtype != np.float64:
+        # column with empty values is left as strings without NA filter
+        chunk['send_ts'] = pd.to_numeric(chunk.send_ts, errors='coerce')
+    chunk['receive_ts'] = chunk.send_ts + chunk.interval_real / 1e6
+    chunk['tag'] = _strip_tag_suffix(chunk.tag.array)
+    chunk.index = pd.Index(chunk.receive_ts.to_numpy().astype(np.int64), name='receive_sec')
+    return chunk
+
+
+# PhantomReader passes binary file-like chunks to parsers marked as binary, str to the others
+bytes_to_df.binary = True
+
+
+def _strip_tag_suffix(tags):
+    """
+    :type tags: pd.Categorical
+    """
+    if not len(tags.categories):
+        return tags
+    stripped = tags.categories.str.rsplit('#', n=1).str[0]
+    # empty tag is NA, factorize gives it -1 code
+    codes, categories = pd.factorize(stripped.where(tags.categories != ''))
+    return pd.Categorical.from_codes(np.where(tags.codes >= 0, codes[tags.codes], -1), categories)
+
+
+class _BufferChain(RawIOBase):
+    """
+    Read-only binary stream over a sequence of buffers, so they can be parsed
+    as one file without being concatenated
+    """
+
+    def __init__(self, buffers):
+        self._buffers = [memoryview(buf).cast('B') for buf in buffers]
+        self._current = 0
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._current < len(self._buffers):
+            buf = self._buffers[self._current]
+            size = min(len(b), len(buf) - self._pos)
+            if size > 0:
+                b[:size] = buf[self._pos : self._pos + size]
+                self._pos += size
+                return size
+            self._current += 1
+            self._pos = 0
+        return 0
+
+
+def _line_end(data, block_size=64 * 1024):
+    """
+    Position right after the last newline in bytes-like data, 0 if there is none
+    """
+    view = memoryview(data).cast('B')
+    end = len(view)
+    while end > 0:
+        start = max(0, end - block_size)
+        pos = view[start:end].tobytes().rfind(b'\n')
+        if pos >= 0:
+            return start + pos + 1
+        end = start
+    return 0
+
+
 class PhantomReader(object):
     def __init__(self, fileobj, cache_size=1024 * 1024 * 50, parser=string_to_df):
         self.buffer = ""
         self.phout = fileobj
         self.cache_size = cache_size
         self.parser = parser
+        self._tail = []
 
     def __iter__(self):
         return self
@@ -104,6 +198,8 @@ class PhantomReader(object):
         data = self.phout.read(self.cache_size)
         if data is None:
             raise StopIteration
+        elif not isinstance(data, str):
+            return self._next_binary(data)
         else:
             parts = data.rsplit('\n', 1)
             if len(parts) > 1:
@@ -114,6 +210,24 @@ class PhantomReader(object):
                 self.buffer += parts[0]
                 return None
 
+    def _next_binary(self, data):
+        """
+        Complete lines are passed to a binary parser, e.g. bytes_to_df, as a stream
+        over the previous partial line and a slice of data, so data itself is never
+        copied. Other parsers, e.g. string_to_df, get the lines decoded to str.
+        """
+        end = _line_end(data)
+        view = memoryview(data).cast('B')
+        if not end:
+            if len(view):
+                self._tail.append(view.tobytes())
+            return None
+        buffers = self._tail + [view[:end]]
+        self._tail = [view[end:].tobytes()] if end < len(view) else []
+        if not getattr(self.parser, 'binary', False):
+            return self.parser(b''.join(buffers).decode('utf8'))
+        return self.parser(_BufferChain(buffers))
+
 
 class PhantomStatsReader(StatsReader):
     def __init__(self, filename, phantom_info, get_start_time=lambda: 0, cache_size=1024 * 1024 * 50):
@@ -1,12 +1,28 @@
 from threading import Event
 import os
+import tracemalloc
 
 import pandas as pd
+import pytest
 from yandextank.common.util import get_test_path
-from yandextank.common.util import FileMultiReader
-from yandextank.plugins.Phantom.reader import PhantomReader, PhantomStatsReader, string_to_df_microsec
+from yandextank.common.util import FileMultiReader, MmapFileReader
+from yandextank.plugins.Phantom.reader import (
+    PhantomReader,
+    PhantomStatsReader,
+    bytes_to_df,
+    string_to_df,
+    string_to_df_microsec,
+)
 from functools import reduce
 
+PHOUT = os.path.join(get_test_path(), 'yandextank/plugins/Phantom/tests/phout.dat')
+
+
+@pytest.fixture(scope='module')
+def phout_bytes():
+    with open(PHOUT, 'rb') as f:
+        return f.read()
+
 
 class TestPhantomReader(object):
     def setup_class(self):
@@ -43,6 +59,63 @@ class TestPhantomReader(object):
         assert result.equals(expected)
 
 
+class TestBytesToDf(object):
+    def test_same_as_string_to_df(self, phout_bytes):
+        expected = string_to_df(phout_bytes.decode('utf8'))
+        result = bytes_to_df(phout_bytes)
+        assert result.tag.dtype == 'category'
+        result['tag'] = result.tag.astype(object)
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_tags(self):
+        result = bytes_to_df(b'1.0\ta#1\t1\t0\t0\t0\t0\t0\t0\t0\t0\t200\n'
+                             b'1.1\ta#b#2\t1\t0\t0\t0\t0\t0\t0\t0\t0\t200\n'
+                             b'1.2\ta\t1\t0\t0\t0\t0\t0\t0\t0\t0\t200\n'
+                             b'1.3\t\t1\t0\t0\t0\t0\t0\t0\t0\t0\t200\n')
+        assert result.tag.tolist()[:3] == ['a', 'a#b', 'a']
+        assert pd.isna(result.tag.iloc[3])
+
+    def test_reader(self):
+        stop = Event()
+        multireader = FileMultiReader(PHOUT, stop, binary=True)
+        stop.set()
+        reader = PhantomReader(multireader.get_file(), cache_size=100, parser=bytes_to_df)
+        result = pd.concat([chunk for chunk in reader if chunk is not None])
+        multireader.close()
+        assert len(result) == 200
+        assert result['interval_real'].mean() == 11000714.0
+
+    @pytest.mark.parametrize('parser', [bytes_to_df, string_to_df])
+    def test_mmap_reader(self, parser):
+        stop = Event()
+        multireader = MmapFileReader(PHOUT, stop)
+        stop.set()
+        reader = PhantomReader(multireader.get_file(), cache_size=1000, parser=parser)
+        result = pd.concat([chunk for chunk in reader if chunk is not None])
+        multireader.close()
+        assert len(result) == 200
+        assert result['interval_real'].mean() == 11000714.0
+
+    def test_peak_memory(self, phout_bytes):
+        data = phout_bytes * 1000
+        peaks = []
+        for parse, chunk in [(string_to_df, data.decode('utf8')), (bytes_to_df, data)]:
+            tracemalloc.start()
+            parse(chunk)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        assert peaks[1] < peaks[0]
+
+    @pytest.mark.benchmark(group='phout parser')
+    @pytest.mark.parametrize('parser', ['string_to_df', 'bytes_to_df'])
+    def test_parse_benchmark(self, benchmark, phout_bytes, parser):
+        data = phout_bytes * 10000
+        if parser == 'string_to_df':
+            data = data.decode('utf8')
+        result = benchmark.pedantic(globals()[parser], args=(data,), rounds=3)
+        assert len(result) == 2000000
+
+
 class MockInfo(object):
     def __init__(self, steps):
         self.steps = steps
@@ -151,6 +151,11 @@ class PhantomConfig:
         for stream in self.streams:
             stream.timeout = timeout
 
+    def release_stpd(self):
+        """let other tanks evict or regenerate cached stpd-files of all streams"""
+        for stream in self.streams:
+            stream.stepper_wrapper.release_stpd()
+
     def get_info(self):
         """get merged info about phantom conf"""
         result = copy.copy(self.streams[0])
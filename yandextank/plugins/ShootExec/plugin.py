@@ -1,13 +1,11 @@
 import errno
 import collections
 import logging
-import queue
 import subprocess
 import time
 import re
-import pandas as pd
+import numpy as np
 from threading import Event
-from typing import Optional
 
 from ...common.interfaces import (
     AbstractPlugin,
@@ -16,11 +14,10 @@ from ...common.interfaces import (
     AbstractInfoWidget,
     StatsReader,
 )
-from ...common.util import FileMultiReader, FileScanner, tail_lines
+from ...common.util import MmapFileReader, FileScanner, tail_lines
 from ..Console import Plugin as ConsolePlugin
-from ..Phantom import PhantomReader
-from yandextank.aggregator import TimeChopper
-from yandextank.aggregator.aggregator import DataPoller
+from ..Phantom import PhantomReader, bytes_to_df
+from yandextank.aggregator.stats import SecondStats
 
 
 _INFO = collections.namedtuple(
@@ -69,11 +66,11 @@ class Plugin(GeneratorPlugin):
         if self.reader is None:
             # Touch output_path to clear it
             open(self.__output_path, "w").close()
-            self.file_reader = FileMultiReader(self.__output_path, self.output_finished)
+            self.file_reader = MmapFileReader(self.__output_path, self.output_finished)
             self.add_cleanup(lambda: self.file_reader.close)
-            self.reader = PhantomReader(self.file_reader.get_file())
+            self.reader = PhantomReader(self.file_reader.get_file(), parser=bytes_to_df)
             if not self.__stats_path:
-                self.reader = _ShootExecReader(self.reader, self.core.data_poller)
+                self.reader = _ShootExecReader(self.reader)
         return self.reader
 
     def get_stats_reader(self):
@@ -244,11 +241,11 @@ class _FileStatsReader(FileScanner, StatsReader):
 
 
 class _ShootExecReader(object):
-    def __init__(self, phout_reader: PhantomReader, poller: DataPoller):
+    def __init__(self, phout_reader: PhantomReader):
         self._inner_reader = phout_reader
         self.closed = False
-        self.stat_queue = queue.Queue()
-        self.stats_reader = _ShootExecStatAggregator(TimeChopper([poller.poll(self._read_stat_queue())]))
+        # rps of send seconds is counted while chunks are parsed
+        self.stats_reader = SecondStats()
 
     @property
     def buffer(self):
@@ -261,41 +258,13 @@ class _ShootExecReader(object):
         try:
             res = self._inner_reader.__next__()
             if res is not None:
-                self.stat_queue.put(res)
+                self.stats_reader.add(res['send_ts'].values.astype(np.int64))
             return res
         except StopIteration:
             self.closed = True
+            self.stats_reader.finish()
             raise
 
-    def _read_stat_queue(self):
-        while True:
-            try:
-                yield self._prepare_stat_item(self.stat_queue.get_nowait())
-            except queue.Empty:
-                if self.closed:
-                    return None
-                yield None
-
-    def _prepare_stat_item(self, item: Optional[pd.DataFrame]):
-        if item is None:
-            return None
-        item = item.copy(deep=True)
-        item['send_ts'] = item['send_ts'].astype(int)
-        item.set_index(['send_ts'], inplace=True)
-        return item
-
-
-class _ShootExecStatAggregator(object):
-    def __init__(self, source):
-        self.source = source
-
-    def __iter__(self):
-        for ts, _, rps in self.source:
-            yield [{'ts': ts, 'metrics': {'instances': 0, 'reqps': rps}}]
-
-    def close(self):
-        pass
-
 
 class _DummyStatsReader(StatsReader):
     """
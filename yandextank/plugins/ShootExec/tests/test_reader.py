@@ -4,7 +4,7 @@ import os
 import pandas as pd
 from yandextank.common.util import get_test_path
 from yandextank.common.util import FileMultiReader
-from yandextank.plugins.ShootExec.plugin import _ShootExecReader, PhantomReader, DataPoller
+from yandextank.plugins.ShootExec.plugin import _ShootExecReader, PhantomReader
 
 
 class TestPhantomReader(object):
@@ -20,7 +20,7 @@ class TestPhantomReader(object):
 
     def test_read_all(self):
         phantom_reader = PhantomReader(self.multireader.get_file(), cache_size=1024)
-        reader = _ShootExecReader(phantom_reader, DataPoller(poll_period=0.1, max_wait=2))
+        reader = _ShootExecReader(phantom_reader)
         df = pd.DataFrame()
         sdf = pd.DataFrame()
         for chunk in reader:
@@ -32,3 +32,4 @@ class TestPhantomReader(object):
         assert len(sdf['ts'].unique()) == 12
         assert sdf['ts'].min() == 1482159938
         assert sdf['ts'].max() == 1482159949
+        assert sum(item['reqps'] for item in sdf['metrics']) == 200
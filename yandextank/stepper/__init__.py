@@ -1,4 +1,11 @@
 #
 from .main import Stepper, StepperWrapper  # noqa
 from .info import StepperInfo  # noqa
-from .format import StpdReader  # noqa
+from .format import (  # noqa
+    StpdReader,
+    BinaryStpdReader,
+    is_binary_stpd,
+    stpd_reader,
+    stpd_to_binary,
+    binary_to_stpd,
+)
@@ -0,0 +1,209 @@
+'''
+Stepper cache management.
+
+Cache directory keeps two kinds of entries:
+ * stpd files with their stepper info jsons, they depend on the whole stepper config;
+ * ammo payloads: one loop of read, marked and filtered missiles saved as binary stpd
+   parts, they do not depend on load profile, so a schedule change reuses them.
+   A payload is a copy of the ammo, so it is kept only when cache size is limited.
+
+Entries are locked exclusively while they are generated, so concurrent tanks on one
+host wait for each other instead of generating the same entry twice. Stpd files are
+locked shared while they are used, until the test ends. Last use time of an entry is
+its modification time, least recently used entries that are not locked are removed
+when the cache exceeds its size limit.
+'''
+
+import errno
+import fcntl
+import logging
+import os
+import re
+import shutil
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# cache file names end with md5 of the config
+ENTRY_RE = re.compile(r'_[0-9a-f]{32}\.(stpd|bstpd|payload)$')
+STEPPER_INFO_SUFFIX = '_si.json'
+LOCK_SUFFIX = '.lock'
+
+
+class StepperCache(object):
+    def __init__(self, cache_dir, size_limit=0):
+        '''
+        :param size_limit: cache size limit in bytes, 0 for no limit
+        '''
+        self.cache_dir = cache_dir
+        self.size_limit = size_limit
+
+    @contextmanager
+    def lock(self, path):
+        '''
+        Exclusive lock of a cache entry, waits for other tanks holding it
+        '''
+        lock_file = _lock(path, blocking=False)
+        if not lock_file:
+            log.info('Waiting for cache entry generated by another tank: %s', path)
+            lock_file = _lock(path)
+        try:
+            yield
+        finally:
+            _unlock(path, lock_file)
+
+    @staticmethod
+    def use(path):
+        '''
+        Shared lock of a cache entry for the time it is used, waits for a tank generating it
+        :rtype: EntryLock
+        '''
+        return EntryLock(path)
+
+    @staticmethod
+    def touch(path):
+        '''
+        Mark an entry as recently used
+        '''
+        if os.path.exists(path):
+            os.utime(path, None)
+
+    def entries(self):
+        '''
+        :returns: list of (last use time, size, path) of cache entries
+        '''
+        result = []
+        for name in os.listdir(self.cache_dir):
+            if not ENTRY_RE.search(name):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                result.append((os.path.getmtime(path), _size(path), path))
+            except OSError:
+                # removed by another tank
+                continue
+        return result
+
+    def evict(self, keep=()):
+        '''
+        Remove least recently used entries until cache fits into the size limit.
+        Locked entries and entries listed in keep are not removed.
+        '''
+        if not self.size_limit:
+            return
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        keep = {os.path.abspath(path) for path in keep}
+        for _, size, path in entries:
+            if total <= self.size_limit:
+                break
+            if os.path.abspath(path) in keep:
+                continue
+            lock_file = _lock(path, blocking=False)
+            if not lock_file:
+                continue
+            try:
+                log.info('Removing least recently used stepper cache entry: %s', path)
+                _remove(path)
+                _remove(path + STEPPER_INFO_SUFFIX)
+                total -= size
+            finally:
+                _unlock(path, lock_file)
+        if total > self.size_limit:
+            log.warning('Stepper cache size %d exceeds the limit %d, entries are in use', total, self.size_limit)
+
+
+class EntryLock(object):
+    '''
+    Shared lock of a cache entry, it is made exclusive to generate the entry.
+    Lock file is removed by the last tank that releases the lock.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_file = _lock(path, blocking=False, shared=True)
+        if not self.lock_file:
+            log.info('Waiting for cache entry generated by another tank: %s', path)
+            self.lock_file = _lock(path, shared=True)
+
+    def exclusive(self):
+        '''
+        Wait for other tanks using the entry. Lock is not held while waiting
+        '''
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        if not _is_current(self.path, self.lock_file):
+            # removed by another tank while the lock was not held
+            self.lock_file.close()
+            self.lock_file = _lock(self.path)
+
+    def share(self):
+        fcntl.flock(self.lock_file, fcntl.LOCK_SH)
+
+    def release(self):
+        if self.lock_file is None:
+            return
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError) as e:
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            # still used by another tank
+            self.lock_file.close()
+        else:
+            if _is_current(self.path, self.lock_file):
+                _unlock(self.path, self.lock_file)
+            else:
+                self.lock_file.close()
+        self.lock_file = None
+
+
+def _lock(path, blocking=True, shared=False):
+    '''
+    Lock files are removed on unlock, so the file is reopened if it was removed while waiting
+    :returns: locked file or None if it is locked by another process and blocking is False
+    '''
+    lock_path = path + LOCK_SUFFIX
+    operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+    if not blocking:
+        operation |= fcntl.LOCK_NB
+    while True:
+        lock_file = open(lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, operation)
+        except (IOError, OSError) as e:
+            lock_file.close()
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            return None
+        if _is_current(path, lock_file):
+            return lock_file
+        lock_file.close()
+
+
+def _is_current(path, lock_file):
+    try:
+        return os.path.samestat(os.fstat(lock_file.fileno()), os.stat(path + LOCK_SUFFIX))
+    except OSError:
+        return False
+
+
+def _unlock(path, lock_file):
+    os.remove(path + LOCK_SUFFIX)
+    lock_file.close()
+
+
+def _size(path):
+    if not os.path.isdir(path):
+        size = os.path.getsize(path)
+        si = path + STEPPER_INFO_SUFFIX
+        return size + (os.path.getsize(si) if os.path.exists(si) else 0)
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names
+    )
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
@@ -3,9 +3,19 @@ Ammo formatters
 '''
 
 import logging
+import mmap
+import struct
+from array import array
+
+import numpy as np
 
 from .module_exceptions import StpdFileError
 
+BINARY_STPD_MAGIC = b'STPDBIN1'
+# index_offset, count, markers_offset, markers_size, magic
+BINARY_STPD_TRAILER = struct.Struct('<QQQQ8s')
+BINARY_STPD_RECORD = np.dtype([('timestamp', '<i8'), ('offset', '<u8'), ('length', '<u4'), ('marker', '<u4')])
+
 
 class Stpd(object):
     '''
@@ -17,7 +27,58 @@ class Stpd(object):
 
     def __iter__(self):
         for timestamp, marker, missile in self.af:
-            yield b"%s %s %s\n%s\n" % (str(len(missile)).encode('utf8'), str(timestamp).encode('utf8'), marker, missile)
+            yield b"%d %d %s\n%s\n" % (len(missile), timestamp, marker, missile)
+
+    def header(self):
+        return b''
+
+    def footer(self):
+        return b''
+
+
+class BinaryStpd(object):
+    '''
+    Binary indexed STPD ammo formatter.
+
+    File layout: magic, missiles payload blob, fixed-width record index
+    (timestamp, offset, length, marker id), newline separated marker dictionary
+    and a trailer with their positions. Iteration yields raw missiles, which
+    should be written between header() and footer().
+    '''
+
+    def __init__(self, ammo_factory):
+        self.af = ammo_factory
+        self.timestamps = array('q')
+        self.offsets = array('Q')
+        self.lengths = array('L')
+        self.marker_ids = array('L')
+        self.markers = {}
+        self.offset = len(BINARY_STPD_MAGIC)
+
+    def __iter__(self):
+        for timestamp, marker, missile in self.af:
+            self.timestamps.append(timestamp)
+            self.offsets.append(self.offset)
+            self.lengths.append(len(missile))
+            self.marker_ids.append(self.markers.setdefault(marker, len(self.markers)))
+            self.offset += len(missile)
+            yield missile
+
+    def header(self):
+        return BINARY_STPD_MAGIC
+
+    def footer(self):
+        index = np.empty(len(self.timestamps), dtype=BINARY_STPD_RECORD)
+        index['timestamp'] = self.timestamps
+        index['offset'] = self.offsets
+        index['length'] = self.lengths
+        index['marker'] = self.marker_ids
+        padding = -self.offset % 8
+        index_offset = self.offset + padding
+        markers = b'\n'.join(sorted(self.markers, key=self.markers.get))
+        markers_offset = index_offset + index.nbytes
+        trailer = BINARY_STPD_TRAILER.pack(index_offset, len(index), markers_offset, len(markers), BINARY_STPD_MAGIC)
+        return b'\0' * padding + index.tobytes() + markers + trailer
 
 
 class StpdReader(object):
@@ -59,3 +120,93 @@ class StpdReader(object):
                     )
                 chunk_header = read_chunk_header(ammo_file)
         self.log.info("Reached the end of stpd file")
+
+
+class BinaryStpdReader(object):
+    '''
+    Read missiles from binary stpd file.
+
+    The file is memory mapped, missiles are yielded as memoryview slices of the
+    mapping. Iteration starts from the position set by seek().
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.log = logging.getLogger(__name__)
+        self.log.info("Loading binary stepped missiles from '%s'" % filename)
+        with open(filename, 'rb') as ammo_file:
+            try:
+                self._mmap = mmap.mmap(ammo_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise StpdFileError("Can't map binary stpd file %s: %s" % (filename, e))
+        if len(self._mmap) < len(BINARY_STPD_MAGIC) + BINARY_STPD_TRAILER.size:
+            raise StpdFileError("Binary stpd file %s is truncated" % filename)
+        index_offset, count, markers_offset, markers_size, magic = BINARY_STPD_TRAILER.unpack_from(
+            self._mmap, len(self._mmap) - BINARY_STPD_TRAILER.size
+        )
+        if magic != BINARY_STPD_MAGIC or self._mmap[: len(BINARY_STPD_MAGIC)] != BINARY_STPD_MAGIC:
+            raise StpdFileError("%s is not a binary stpd file" % filename)
+        self.index = np.frombuffer(self._mmap, dtype=BINARY_STPD_RECORD, count=count, offset=index_offset)
+        markers = self._mmap[markers_offset : markers_offset + markers_size]
+        self.markers = markers.decode('utf8').split('\n') if count else []
+        self.position = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        timestamp, offset, length, marker = self.index[i].tolist()
+        return timestamp, memoryview(self._mmap)[offset : offset + length], self.markers[marker]
+
+    def seek(self, timestamp):
+        '''
+        Continue iteration from the first missile scheduled at or after timestamp
+        :returns: missile position in file
+        '''
+        self.position = int(np.searchsorted(self.index['timestamp'], timestamp, side='left'))
+        return self.position
+
+    def __iter__(self):
+        payload = memoryview(self._mmap)
+        markers = self.markers
+        for timestamp, offset, length, marker in self.index[self.position :].tolist():
+            yield timestamp, payload[offset : offset + length], markers[marker]
+        self.log.info("Reached the end of binary stpd file")
+
+    def shard(self, shard, shards):
+        '''
+        Iterate over every shards-th missile starting from shard-th one
+        '''
+        payload = memoryview(self._mmap)
+        markers = self.markers
+        for timestamp, offset, length, marker in self.index[shard::shards].tolist():
+            yield timestamp, payload[offset : offset + length], markers[marker]
+
+
+def is_binary_stpd(filename):
+    with open(filename, 'rb') as ammo_file:
+        return ammo_file.read(len(BINARY_STPD_MAGIC)) == BINARY_STPD_MAGIC
+
+
+def stpd_reader(filename):
+    '''Reader for stpd file of any format'''
+    return BinaryStpdReader(filename) if is_binary_stpd(filename) else StpdReader(filename)
+
+
+def _write(ammo, dst):
+    with open(dst, 'wb') as ammo_file:
+        ammo_file.write(ammo.header())
+        for chunk in ammo:
+            ammo_file.write(chunk)
+        ammo_file.write(ammo.footer())
+
+
+def stpd_to_binary(src, dst):
+    '''Convert legacy stpd file to binary format'''
+    _write(BinaryStpd((ts, marker.encode('utf8'), missile) for ts, missile, marker in StpdReader(src)), dst)
+
+
+def binary_to_stpd(src, dst):
+    '''Convert binary stpd file to legacy format'''
+    missiles = BinaryStpdReader(src)
+    _write(Stpd((ts, marker.encode('utf8'), missile.tobytes()) for ts, missile, marker in missiles), dst)
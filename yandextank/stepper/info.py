@@ -85,6 +85,14 @@ class StepperStatus(object):
     def inc_loop_count(self):
         self.loop_count += 1
 
+    def set_progress(self, ammo_count, loop_count):
+        '''
+        Set counters of ammo generated outside of this process, limits are not checked
+        '''
+        self._ammo_count = ammo_count
+        self._loop_count = loop_count
+        self.update_lp_progress()
+
     def get_info(self):
         self.info['ammo_count'] = self._ammo_count
         self.info['loop_count'] = self._loop_count
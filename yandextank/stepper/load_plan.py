@@ -5,9 +5,24 @@ Load Plan generators
 import re
 from itertools import chain, groupby
 from builtins import range
+
+import numpy as np
+
 from . import info
 from .util import parse_duration, solve_quadratic, proper_round
 
+BLOCK_SIZE = 1 << 16
+
+
+def iter_blocks(blocks):
+    '''Iterate over timestamps of int64 blocks as python ints'''
+    return chain.from_iterable(block.tolist() for block in blocks)
+
+
+def _ranges(size, block_size):
+    for start in range(0, size, block_size):
+        yield np.arange(start, min(start + block_size, size), dtype=np.int64)
+
 
 class Const(object):
     '''
@@ -19,10 +34,17 @@ class Const(object):
         self.duration = duration
 
     def __iter__(self):
+        return iter_blocks(self.blocks())
+
+    def blocks(self, block_size=BLOCK_SIZE):
+        '''
+        :return: timestamps for each charge, as int64 arrays of at most block_size items
+        '''
         if self.rps == 0:
-            return iter([])
+            return
         interval = 1000.0 / self.rps
-        return (int(i * interval) for i in range(0, int(self.rps * self.duration / 1000)))
+        for n in _ranges(int(self.rps * self.duration / 1000), block_size):
+            yield (n * interval).astype(np.int64)
 
     def rps_at(self, t):
         '''Return rps for second t'''
@@ -77,7 +99,23 @@ class Line(object):
 
         :return: timestamps for each charge
         """
-        return (self.ts(n) for n in range(0, self.__len__()))
+        return iter_blocks(self.blocks())
+
+    def blocks(self, block_size=BLOCK_SIZE):
+        """
+        Same as ts() for every charge, computed for a block of charges at once
+
+        :return: timestamps for each charge, as int64 arrays of at most block_size items
+        """
+        a = self.slope / 2.0
+        for n in _ranges(self.__len__(), block_size):
+            if a == 0:
+                root2 = n / self.minrps
+            else:
+                # same operations order as in solve_quadratic, so results are equal to ts()
+                disc_root = np.sqrt(self.minrps * self.minrps - 4 * a * -n)
+                root2 = (-self.minrps + disc_root) / (2 * a)
+            yield (root2 * 1000).astype(np.int64)
 
     def rps_at(self, t):
         '''Return rps for second t'''
@@ -123,10 +161,16 @@ class Composite(object):
         self.steps = steps
 
     def __iter__(self):
+        return iter_blocks(self.blocks())
+
+    def blocks(self, block_size=BLOCK_SIZE):
+        '''
+        Blocks of every step shifted by durations of previous steps, generated lazily
+        '''
         base = 0
         for step in self.steps:
-            for ts in step:
-                yield ts + base
+            for block in step.blocks(block_size):
+                yield block + base
             base += step.get_duration()
 
     def get_duration(self):
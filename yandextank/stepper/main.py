@@ -8,12 +8,14 @@ import logging
 import os
 import shutil
 from builtins import zip
-from pathlib import Path
 
 from . import format as fmt
 from . import info
+from .cache import StepperCache
 from .config import ComponentFactory
-from .module_exceptions import DiskLimitError, StepperConfigurationError
+from .module_exceptions import StepperConfigurationError
+from .parallel import ParallelWriter
+from .util import check_free_space
 
 
 class AmmoFactory(object):
@@ -53,14 +55,22 @@ class AmmoFactory(object):
 
 
 class Stepper(object):
-    def __init__(self, core, **kwargs):
+    FORMATS = {'stpd': fmt.Stpd, 'binary': fmt.BinaryStpd}
+
+    def __init__(self, core, stpd_format='stpd', **kwargs):
         info.status = info.StepperStatus()
         info.status.core = core
         self.af = AmmoFactory(ComponentFactory(**kwargs))
-        self.ammo = fmt.Stpd(self.af)
+        self.ammo = self.FORMATS[stpd_format](self.af)
         self.first_loop_done = False
 
-    def write(self, f):
+    def write(self, f, workers=1, payload_dir=None):
+        '''
+        :param payload_dir: directory to cache read ammo in, it is reused by stepping with another load profile
+        '''
+        if (workers > 1 or payload_dir) and ParallelWriter(self, workers, payload_dir).write(f):
+            return
+        f.write(self.ammo.header())
         for missile in self.ammo:
             f.write(missile)
             try:
@@ -87,6 +97,7 @@ class Stepper(object):
                         info.status.ammo_limit = info.status.loop_limit * info.status.ammo_count
                         assert info.status.max_ammo is not None
                     self._check_whole_file_can_be_written(f)
+        f.write(self.ammo.footer())
 
     @staticmethod
     def _check_whole_file_can_be_written(file_descriptor):
@@ -95,15 +106,7 @@ class Stepper(object):
             return
         written_bytes = file_descriptor.tell()
         expected_file_size = (1.0 / info.status.calculate_lp_progress()) * written_bytes
-        need_to_write_more_bytes = expected_file_size - written_bytes
-        available_bytes = shutil.disk_usage(Path(file_descriptor.name).parent).free
-
-        reserve = 10 * 000 * 000  # 10 мегабайт
-        if available_bytes < need_to_write_more_bytes + reserve:
-            raise DiskLimitError(
-                'File system has not enough free space for ammo file. '
-                f'Ammo file expected file size is {expected_file_size} bytes.'
-            )
+        check_free_space(file_descriptor.name, expected_file_size - written_bytes, expected_file_size)
 
 
 class LoadProfile(object):
@@ -150,6 +153,7 @@ class StepperWrapper(object):
         self.cfg = cfg
 
         self.cache_dir = '.'
+        self.cache_size_limit = 0
 
         # per-shoot params
         self.instances = 1000
@@ -163,9 +167,12 @@ class StepperWrapper(object):
         self.enum_ammo = False
         self.force_stepping = None
         self.chosen_cases = []
+        self.stpd_format = 'stpd'
+        self.stepping_workers = 1
 
         # out params
         self.stpd = None
+        self.cache_entry = None
         self.steps = []
         self.ammo_count = 1
         self.duration = 0
@@ -197,7 +204,16 @@ class StepperWrapper(object):
             "ammo_type",
             "ammo_limit",
         ]
-        opts += ["use_caching", "cache_dir", "force_stepping", "file_cache", "chosen_cases"]
+        opts += [
+            "use_caching",
+            "cache_dir",
+            "force_stepping",
+            "file_cache",
+            "chosen_cases",
+            "stpd_format",
+            "stepping_workers",
+            "cache_size_limit",
+        ]
         return opts
 
     def read_config(self):
@@ -225,7 +241,11 @@ class StepperWrapper(object):
         self.file_cache = self.get_option('file_cache')
         cache_dir = self.get_option("cache_dir") or self.core.artifacts_base_dir
         self.cache_dir = os.path.expanduser(cache_dir)
+        self.cache_size_limit = self.get_option("cache_size_limit") * 1024 * 1024
         self.force_stepping = self.get_option("force_stepping")
+        self.stepping_workers = self.get_option("stepping_workers")
+        # binary stpd can be read by BFG only, so the option is not defined for other generators
+        self.stpd_format = self.cfg.get("stpd_format", "stpd")
         if self.get_option(self.OPTION_LOAD)[self.OPTION_LOAD_TYPE] == 'stpd_file':
             self.stpd = self.get_option(self.OPTION_LOAD)[self.OPTION_SCHEDULE]
 
@@ -253,23 +273,16 @@ class StepperWrapper(object):
 
         if not self.stpd:
             self.stpd = self.__get_stpd_filename()
-            if (
-                self.use_caching
-                and not self.force_stepping
-                and os.path.exists(self.stpd)
-                and os.path.exists(self.__si_filename())
-            ):
-                self.log.info("Using cached stpd-file: %s", self.stpd)
-                stepper_info = self.__read_cached_options()
-                if self.instances and self.load_profile.is_rps():
-                    self.log.info(
-                        "rps_schedule is set. Overriding cached instances param from config: %s", self.instances
-                    )
-                    stepper_info = stepper_info._replace(instances=self.instances)
-                publish_info(stepper_info)
+            if self.use_caching:
+                cache = StepperCache(self.cache_dir, self.cache_size_limit)
+                self.cache_entry = cache.use(self.stpd)
+                try:
+                    stepper_info = self.__get_cached_stpd(cache, publish_info)
+                except Exception:
+                    self.release_stpd()
+                    raise
+                cache.evict(keep=[self.stpd, self.__get_payload_dirname()])
             else:
-                if self.force_stepping and os.path.exists(self.__si_filename()):
-                    os.remove(self.__si_filename())
                 self.__make_stpd_file()
                 stepper_info = info.status.get_info()
                 self.__write_cached_options(stepper_info)
@@ -284,6 +297,51 @@ class StepperWrapper(object):
         if stepper_info.instances:
             self.instances = stepper_info.instances
 
+    def release_stpd(self):
+        '''Let other tanks evict or regenerate cached stpd-file, call it when the test is over'''
+        if self.cache_entry:
+            self.cache_entry.release()
+            self.cache_entry = None
+
+    def __get_cached_stpd(self, cache, publish_info):
+        '''Read stpd-file info from cache or make it, entry should be locked'''
+        if not self.force_stepping and self.__is_cached():
+            return self.__read_cached_stpd(cache, publish_info)
+        self.cache_entry.exclusive()
+        try:
+            # stpd-file could be made by another tank while waiting
+            if not self.force_stepping and self.__is_cached():
+                return self.__read_cached_stpd(cache, publish_info)
+            if os.path.exists(self.__si_filename()):
+                os.remove(self.__si_filename())
+            if self.cache_size_limit:
+                payload_dir = self.__get_payload_dirname()
+                with cache.lock(payload_dir):
+                    if self.force_stepping and os.path.exists(payload_dir):
+                        shutil.rmtree(payload_dir)
+                    cache.touch(payload_dir)
+                    self.__make_stpd_file(payload_dir)
+            else:
+                # payload is a copy of ammo, it is kept only when old cache entries are evicted
+                self.__make_stpd_file()
+            stepper_info = info.status.get_info()
+            self.__write_cached_options(stepper_info)
+            return stepper_info
+        finally:
+            self.cache_entry.share()
+
+    def __is_cached(self):
+        return os.path.exists(self.stpd) and os.path.exists(self.__si_filename())
+
+    def __read_cached_stpd(self, cache, publish_info):
+        self.log.info("Using cached stpd-file: %s", self.stpd)
+        cache.touch(self.stpd)
+        stepper_info = self.__read_cached_options()
+        if self.instances and self.load_profile.is_rps():
+            self.log.info("rps_schedule is set. Overriding cached instances param from config: %s", self.instances)
+            stepper_info = stepper_info._replace(instances=self.instances)
+        return publish_info(stepper_info)
+
     def __si_filename(self):
         '''Return name for stepper_info json file'''
         return "%s_si.json" % self.stpd
@@ -292,41 +350,59 @@ class StepperWrapper(object):
         '''Choose the name for stepped data file'''
         if self.use_caching:
             sep = "|"
-            hasher = hashlib.md5()
-            hashed_str = "cache version 6" + sep + ';'.join(self.load_profile.schedule) + sep + str(self.loop_limit)
-            hashed_str += (
-                sep + str(self.ammo_limit) + sep + ';'.join(self.load_profile.schedule) + sep + str(self.autocases)
-            )
-            hashed_str += (
-                sep
-                + ";".join(self.uris)
-                + sep
-                + ";".join(self.headers)
-                + sep
-                + self.http_ver
-                + sep
-                + b';'.join(self.chosen_cases).decode('utf8')
-            )
-            hashed_str += sep + str(self.enum_ammo) + sep + str(self.ammo_type)
+            hashed_str = "cache version 7" + sep + ';'.join(self.load_profile.schedule) + sep + str(self.loop_limit)
+            hashed_str += sep + str(self.ammo_limit) + sep + ';'.join(self.load_profile.schedule)
+            hashed_str += sep + self.__ammo_hash_source()
+            if self.stpd_format != 'stpd':
+                hashed_str += sep + self.stpd_format
             if self.load_profile.is_instances():
                 hashed_str += sep + str(self.instances)
-            if self.ammo_file:
-                opener = self.core.resource_manager.get_opener(self.ammo_file)
-                hashed_str += sep + opener.hash
-            else:
-                if not self.uris:
-                    raise RuntimeError("Neither ammofile nor uris specified")
-                hashed_str += sep + ';'.join(self.uris) + sep + ';'.join(self.headers)
             self.log.debug("stpd-hash source: %s", hashed_str)
-            hasher.update(hashed_str.encode('utf8'))
-            if not os.path.exists(self.cache_dir):
-                os.makedirs(self.cache_dir)
-            stpd = self.cache_dir + '/' + os.path.basename(self.ammo_file) + "_" + hasher.hexdigest() + ".stpd"
+            stpd = self.__cache_filename(hashed_str, self.__stpd_ext())
         else:
-            stpd = os.path.realpath("ammo.stpd")
+            stpd = os.path.realpath("ammo" + self.__stpd_ext())
         self.log.debug("Generated cache file name: %s", stpd)
         return stpd
 
+    def __get_payload_dirname(self):
+        '''Choose the name for read ammo directory, it does not depend on load profile'''
+        hashed_str = "payload version 1|" + self.__ammo_hash_source()
+        self.log.debug("payload-hash source: %s", hashed_str)
+        return self.__cache_filename(hashed_str, ".payload")
+
+    def __ammo_hash_source(self):
+        sep = "|"
+        hashed_str = str(self.autocases)
+        hashed_str += (
+            sep
+            + ";".join(self.uris)
+            + sep
+            + ";".join(self.headers)
+            + sep
+            + self.http_ver
+            + sep
+            + b';'.join(self.chosen_cases).decode('utf8')
+        )
+        hashed_str += sep + str(self.enum_ammo) + sep + str(self.ammo_type)
+        if self.ammo_file:
+            opener = self.core.resource_manager.get_opener(self.ammo_file)
+            hashed_str += sep + opener.hash
+        else:
+            if not self.uris:
+                raise RuntimeError("Neither ammofile nor uris specified")
+            hashed_str += sep + ';'.join(self.uris) + sep + ';'.join(self.headers)
+        return hashed_str
+
+    def __cache_filename(self, hashed_str, ext):
+        hasher = hashlib.md5()
+        hasher.update(hashed_str.encode('utf8'))
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        return self.cache_dir + '/' + os.path.basename(self.ammo_file) + "_" + hasher.hexdigest() + ext
+
+    def __stpd_ext(self):
+        return ".bstpd" if self.stpd_format == 'binary' else ".stpd"
+
     def __read_cached_options(self):
         '''
         Read stepper info from json
@@ -344,7 +420,7 @@ class StepperWrapper(object):
         with open(self.__si_filename(), 'w') as si_file:
             json.dump(si._asdict(), si_file, indent=4)
 
-    def __make_stpd_file(self):
+    def __make_stpd_file(self, payload_dir=None):
         '''stpd generation using Stepper class'''
         self.log.info("Making stpd-file: %s", self.stpd)
         stepper = Stepper(
@@ -364,6 +440,7 @@ class StepperWrapper(object):
             chosen_cases=self.chosen_cases,
             use_cache=self.use_caching,
             resource_manager=self.core.resource_manager,
+            stpd_format=self.stpd_format,
         )
         with open(self.stpd, 'wb', self.file_cache) as os:
-            stepper.write(os)
+            stepper.write(os, workers=self.stepping_workers, payload_dir=payload_dir)
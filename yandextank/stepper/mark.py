@@ -94,3 +94,10 @@ def get_marker(marker_type, enum_ammo=False):
     if enum_ammo:
         marker = __Enumerator(marker)
     return marker
+
+
+def is_stateless(marker):
+    '''
+    True if marker depends on missile only, so missiles can be marked in any order or more than once
+    '''
+    return not isinstance(marker, __Enumerator) and marker is not __markers['uniq']
@@ -4,7 +4,9 @@ Missile object and generators
 You should update Stepper.status.ammo_count and Stepper.status.loop_count in your custom generators!
 '''
 
+import io
 import logging
+import os
 from itertools import cycle
 
 from yandextank.contrib.netort.netort.resource import manager as resource, open_file
@@ -83,15 +85,86 @@ class UriStyleGenerator(object):
 
 
 class Reader(object):
+    # reader can read a part of ammo file on its own, see read_range
+    splittable = False
+
     def __init__(self, filename, use_cache=True, resource_manager=None, **kwargs):
         self.filename = filename
         self.use_cache = use_cache
         self.resource_manager = resource_manager or resource
 
+    def split(self, parts):
+        '''
+        Split ammo file into ranges for read_range. Ranges start at entry boundaries,
+        they are found by a single pass in the calling process, see _index
+        :returns: list of (start, end, state) tuples or None if ammo file can not be read from the middle
+        '''
+        if not self.splittable:
+            return None
+        opener = self.resource_manager.get_opener(self.filename)
+        with open_file(opener, self.use_cache) as ammo_file:
+            # compressed files and streams are not seekable by offset
+            if not isinstance(ammo_file, io.BufferedReader):
+                return None
+            size = os.fstat(ammo_file.fileno()).st_size
+            step = size // parts + 1
+            starts = self._index(ammo_file, range(0, size, step))
+        if starts is None:
+            return None
+        ends = [start for start, _ in starts[1:]] + [size]
+        return [(start, end, state) for (start, state), end in zip(starts, ends)]
+
+    def _index(self, ammo_file, points):
+        '''
+        :returns: list of (start, state) for the first entry at or after every point,
+            state is what read_range needs to read from start on its own,
+            or None if ammo can not be read by parts
+        '''
+        starts = []
+        for point in points:
+            if point:
+                ammo_file.seek(point - 1)
+                ammo_file.readline()
+            start = ammo_file.tell()
+            if not starts or start > starts[-1][0]:
+                starts.append((start, None))
+        return starts
+
+    def read_range(self, start, end, state=None):
+        '''
+        Single pass over ammo entries, that start at byte offsets in [start, end).
+        Stepper status is not updated. None marks the end of ammo loop, if it is
+        in this range.
+        :param start: entry boundary, as given by split
+        :param state: reader state at start, as given by split
+        '''
+        for line in self._read_lines(start, end):
+            ammo = self.parse_line(line)
+            if ammo is not None:
+                yield ammo
+
+    def parse_line(self, line):
+        '''
+        :returns: (missile, marker) tuple or None if line is not a missile
+        '''
+        raise NotImplementedError
+
+    def _read_lines(self, start, end):
+        opener = self.resource_manager.get_opener(self.filename)
+        with open_file(opener, self.use_cache) as ammo_file:
+            ammo_file.seek(start)
+            while ammo_file.tell() < end:
+                line = ammo_file.readline()
+                if not line:
+                    break
+                yield line
+
 
 class AmmoFileReader(Reader):
     """Read missiles from ammo file"""
 
+    splittable = True
+
     def __init__(self, filename, use_cache=True, resource_manager=None, **kwargs):
         super(AmmoFileReader, self).__init__(filename, use_cache, resource_manager)
         self.log = logging.getLogger(__name__)
@@ -149,6 +222,73 @@ class AmmoFileReader(Reader):
                     chunk_header = self.read_chunk_header(ammo_file)
                 info.status.af_position = ammo_file.tell()
 
+    def _index(self, ammo_file, points):
+        '''
+        Chunks are not delimited, so chunk headers are walked through from the beginning
+        and payloads are skipped. Chunks after a zero-sized one are never read.
+        '''
+        starts = []
+        points = iter(points)
+        point = next(points, None)
+        # chunk starts right after the previous payload, blank lines before its header belong to it
+        chunk_start = position = 0
+        readline, seek = ammo_file.readline, ammo_file.seek
+        while point is not None:
+            line = readline()
+            if not line:
+                break
+            position += len(line)
+            chunk_header = line.strip(b'\r\n')
+            if not chunk_header:
+                continue
+            chunk_size, _ = self._parse_chunk_header(chunk_header, position)
+            if chunk_start >= point:
+                starts.append((chunk_start, None))
+                while point is not None and point <= chunk_start:
+                    point = next(points, None)
+            if chunk_size == 0:
+                break
+            seek(chunk_size, os.SEEK_CUR)
+            chunk_start = position = position + chunk_size
+        return starts
+
+    @staticmethod
+    def _parse_chunk_header(chunk_header, position):
+        '''
+        :returns: (chunk size, marker) tuple
+        '''
+        try:
+            fields = chunk_header.split()
+            return int(fields[0]), fields[1] if len(fields) > 1 else None
+        except (IndexError, ValueError) as e:
+            raise AmmoFileError(
+                "Error while reading ammo file. Position: %s, header: '%s', original exception: %s"
+                % (position, chunk_header, e)
+            )
+
+    def read_range(self, start, end, state=None):
+        '''
+        Chunk belongs to range if it starts in it, see _index
+        '''
+        opener = self.resource_manager.get_opener(self.filename)
+        with open_file(opener, self.use_cache) as ammo_file:
+            ammo_file.seek(start)
+            while ammo_file.tell() < end:
+                chunk_header = self.read_chunk_header(ammo_file)
+                if not chunk_header:
+                    return
+                chunk_size, marker = self._parse_chunk_header(chunk_header, ammo_file.tell())
+                if chunk_size == 0:
+                    # reader starts over here, the rest of file is never read
+                    yield None
+                    return
+                missile = ammo_file.read(chunk_size)
+                if len(missile) < chunk_size:
+                    raise AmmoFileError(
+                        "Unexpected end of file: read %s bytes instead of %s" % (len(missile), chunk_size)
+                    )
+                yield (missile, marker)
+
 
 class SlowLogReader(Reader):
     """Read missiles from SQL slow log. Not usable with Phantom"""
@@ -180,6 +320,13 @@ class SlowLogReader(Reader):
 class LineReader(Reader):
     """One line -- one missile"""
 
+    splittable = True
+
+    def parse_line(self, line):
+        return (
+            (line.rstrip(b'\r\n'), None) if isinstance(line, bytes) else (line.rstrip('\r\n').encode('utf8'), None)
+        )
+
     def __iter__(self):
         opener = self.resource_manager.get_opener(self.filename)
         with open_file(opener, self.use_cache) as ammo_file:
@@ -187,11 +334,7 @@ class LineReader(Reader):
             while True:
                 for line in ammo_file:
                     info.status.af_position = ammo_file.tell()
-                    yield (
-                        (line.rstrip(b'\r\n'), None)
-                        if isinstance(line, bytes)
-                        else (line.rstrip('\r\n').encode('utf8'), None)
-                    )
+                    yield self.parse_line(line)
                 ammo_file.seek(0)
                 info.status.af_position = 0
                 try:
@@ -203,6 +346,17 @@ class LineReader(Reader):
 class CaseLineReader(Reader):
     """One line -- one missile with case, tab separated"""
 
+    splittable = True
+
+    def parse_line(self, line):
+        parts = line.rstrip(b'\r\n').split(b'\t', 1)
+        if len(parts) == 2:
+            return (parts[1], parts[0])
+        elif len(parts) == 1:
+            return (parts[0], None)
+        else:
+            raise RuntimeError("Unreachable branch")
+
     def __iter__(self):
         opener = self.resource_manager.get_opener(self.filename)
         with open_file(opener, self.use_cache) as ammo_file:
@@ -210,13 +364,7 @@ class CaseLineReader(Reader):
             while True:
                 for line in ammo_file:
                     info.status.af_position = ammo_file.tell()
-                    parts = line.rstrip(b'\r\n').split(b'\t', 1)
-                    if len(parts) == 2:
-                        yield (parts[1], parts[0])
-                    elif len(parts) == 1:
-                        yield (parts[0], None)
-                    else:
-                        raise RuntimeError("Unreachable branch")
+                    yield self.parse_line(line)
                 ammo_file.seek(0)
                 info.status.af_position = 0
                 try:
@@ -228,6 +376,8 @@ class CaseLineReader(Reader):
 class AccessLogReader(Reader):
     """Missiles from access log"""
 
+    splittable = True
+
     def __init__(self, filename, headers=None, http_ver='1.1', use_cache=True, resource_manager=None, **kwargs):
         super(AccessLogReader, self).__init__(filename, use_cache, resource_manager)
         self.warned = False
@@ -240,6 +390,27 @@ class AccessLogReader(Reader):
             self.log.warning("There are some skipped lines. See full log for details.")
         self.log.debug(message)
 
+    def parse_line(self, line):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        try:
+            request = line.split('"')[1]
+            method, uri, proto = request.split()
+            http_ver = proto.split('/')[1]
+            if method == "GET":
+                return (
+                    HttpAmmo(
+                        uri,
+                        headers=self.headers,
+                        http_ver=http_ver,
+                    ).to_s(),
+                    None,
+                )
+            else:
+                self.warn("Skipped line: %s (unsupported method)" % line)
+        except (ValueError, IndexError) as e:
+            self.warn("Skipped line: %s (%s)" % (line, e))
+
     def __iter__(self):
         opener = self.resource_manager.get_opener(self.filename)
         with open_file(opener, self.use_cache) as ammo_file:
@@ -247,25 +418,9 @@ class AccessLogReader(Reader):
             while True:
                 for line in ammo_file:
                     info.status.af_position = ammo_file.tell()
-                    if isinstance(line, bytes):
-                        line = line.decode('utf-8')
-                    try:
-                        request = line.split('"')[1]
-                        method, uri, proto = request.split()
-                        http_ver = proto.split('/')[1]
-                        if method == "GET":
-                            yield (
-                                HttpAmmo(
-                                    uri,
-                                    headers=self.headers,
-                                    http_ver=http_ver,
-                                ).to_s(),
-                                None,
-                            )
-                        else:
-                            self.warn("Skipped line: %s (unsupported method)" % line)
-                    except (ValueError, IndexError) as e:
-                        self.warn("Skipped line: %s (%s)" % (line, e))
+                    ammo = self.parse_line(line)
+                    if ammo is not None:
+                        yield ammo
                 ammo_file.seek(0)
                 info.status.af_position = 0
                 try:
@@ -279,6 +434,8 @@ def _parse_header(header):
 
 
 class UriReader(Reader):
+    splittable = True
+
     def __init__(self, filename, headers=None, http_ver='1.1', use_cache=True, resource_manager=None, **kwargs):
         super(UriReader, self).__init__(filename, use_cache, resource_manager)
         self.headers = (
@@ -288,6 +445,62 @@ class UriReader(Reader):
         self.log = logging.getLogger(__name__)
         self.log.info("Loading ammo from '%s' using URI format." % filename)
 
+    def parse_line(self, line):
+        if line.startswith(b'['):
+            self.headers.update(_parse_header(line.strip(b'\r\n[]\t ')))
+        elif len(line.rstrip(b'\r\n')):
+            fields = line.split()
+            uri = fields[0]
+            if len(fields) > 1:
+                marker = fields[1]
+            else:
+                marker = None
+            return (
+                HttpAmmo(
+                    uri,
+                    headers=[': '.join(header) for header in self.headers.items()],
+                    http_ver=self.http_ver,
+                ).to_s(),
+                marker,
+            )
+
+    def _index(self, ammo_file, points):
+        '''
+        Headers are collected by a pass over the whole file, so that every range
+        starts with the headers declared before it.
+        :returns: None if headers are declared after uris, __iter__ applies them
+            to the preceding uris in the next loops, which ranges can not do
+        '''
+        starts = []
+        headers = dict(self.headers)
+        position = 0
+        uri_seen = False
+        points = iter(points)
+        point = next(points, None)
+        for line in iter(ammo_file.readline, b''):
+            while point is not None and point <= position:
+                # range starts at the first line at or after its point
+                if not starts or starts[-1][0] < position:
+                    starts.append((position, dict(headers)))
+                point = next(points, None)
+            position += len(line)
+            if line.startswith(b'['):
+                if uri_seen:
+                    self.log.info('Headers are declared after uris in %s, it can not be read by parts', self.filename)
+                    return None
+                headers.update(_parse_header(line.strip(b'\r\n[]\t ')))
+            elif line.strip():
+                uri_seen = True
+        return starts
+
+    def read_range(self, start, end, state=None):
+        '''
+        :param state: headers declared before the range
+        '''
+        if state is not None:
+            self.headers = dict(state)
+        return super(UriReader, self).read_range(start, end)
+
     def __iter__(self):
         opener = self.resource_manager.get_opener(self.filename)
         with open_file(opener, self.use_cache) as ammo_file:
@@ -295,25 +508,9 @@ class UriReader(Reader):
             while True:
                 for line in ammo_file:
                     info.status.af_position = ammo_file.tell()
-                    # if isinstance(line, bytes):
-                    #     line = line.decode('utf-8')
-                    if line.startswith(b'['):
-                        self.headers.update(_parse_header(line.strip(b'\r\n[]\t ')))
-                    elif len(line.rstrip(b'\r\n')):
-                        fields = line.split()
-                        uri = fields[0]
-                        if len(fields) > 1:
-                            marker = fields[1]
-                        else:
-                            marker = None
-                        yield (
-                            HttpAmmo(
-                                uri,
-                                headers=[': '.join(header) for header in self.headers.items()],
-                                http_ver=self.http_ver,
-                            ).to_s(),
-                            marker,
-                        )
+                    ammo = self.parse_line(line)
+                    if ammo is not None:
+                        yield ammo
                 if info.status.ammo_count == 0:
                     self.log.error("No ammo in uri-style file")
                     raise AmmoFileError("No ammo! Cover me!")
@@ -0,0 +1,245 @@
+'''
+Parallel stepping.
+
+Stepping is done in two passes by a pool of worker processes:
+ 1. ammo file is split into byte ranges at entry boundaries by a single pass, every
+   worker reads, marks and filters missiles of its range and saves them into binary stpd part;
+ 2. output is split into shards of missile numbers, every worker knows the ammo loop
+   position of its first missile from part sizes, takes timestamps for its shard
+   from the load plan and formats the missiles.
+Formatted shards are concatenated in order, so the result is the same as
+sequential stepping gives.
+
+Parts of the first pass do not depend on load plan, they are kept in payload
+directory when it is given and reused by the next stepping with another schedule.
+'''
+
+import json
+import logging
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+from bisect import bisect_right
+
+from . import format as fmt
+from . import info
+from .mark import is_stateless
+from .util import check_free_space
+
+log = logging.getLogger(__name__)
+
+# shards per worker, so that workers finished earlier are not idle
+SHARDS_PER_WORKER = 4
+
+# stepper of the running parallel write, workers get it on fork
+_stepper = None
+
+PAYLOAD_INDEX = 'index.json'
+
+
+def unsupported_reason(stepper):
+    '''
+    :type stepper: yandextank.stepper.main.Stepper
+    :returns: why stepper can not be run in parallel or None
+    '''
+    af = stepper.af
+    if not isinstance(stepper.ammo, fmt.Stpd):
+        return 'only text stpd is supported'
+    if not hasattr(af.load_plan, 'blocks'):
+        return 'load plan is not rps schedule'
+    if not getattr(af.ammo_generator, 'splittable', False):
+        return '%s can not read a part of ammo' % type(af.ammo_generator).__name__
+    if not is_stateless(af.marker):
+        return 'marker depends on missiles order'
+    return None
+
+
+class ParallelWriter(object):
+    def __init__(self, stepper, workers, payload_dir=None):
+        '''
+        :type stepper: yandextank.stepper.main.Stepper
+        :param payload_dir: directory to keep ammo read by the first pass in
+        '''
+        self.stepper = stepper
+        self.af = stepper.af
+        self.workers = workers
+        self.payload_dir = payload_dir
+        self.parts = []
+        self.part_starts = []
+        self.loop_size = 0
+
+    def write(self, f):
+        '''
+        :returns: False if stepping should be done sequentially
+        '''
+        reason = unsupported_reason(self.stepper)
+        if reason:
+            log.info('Stepping in one process: %s', reason)
+            return False
+        payload_ready = self._load_payload()
+        ranges = None
+        if not payload_ready:
+            ranges = self.af.ammo_generator.split(self.workers * SHARDS_PER_WORKER)
+            if not ranges:
+                log.info('Stepping in one process: ammo file can not be read by parts')
+                return False
+        global _stepper
+        _stepper = self.stepper
+        # parts are kept next to the output file, it is checked for free space
+        tmp_dir = tempfile.mkdtemp(prefix='stepper_', dir=os.path.dirname(os.path.abspath(getattr(f, 'name', '.'))))
+        pool = mp.get_context('fork').Pool(self.workers) if self.workers > 1 else None
+        imap = pool.imap if pool else map
+        try:
+            if not payload_ready:
+                self._read_ammo(imap, ranges, self.payload_dir or tmp_dir)
+            if not self.loop_size:
+                return False
+            self._write_missiles(imap, f, tmp_dir)
+            return True
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+            _stepper = None
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _load_payload(self):
+        '''
+        :returns: True if ammo parts are read from payload directory
+        '''
+        if not self.payload_dir:
+            return False
+        index = os.path.join(self.payload_dir, PAYLOAD_INDEX)
+        if not os.path.exists(index):
+            return False
+        with open(index) as index_file:
+            payload = json.load(index_file)
+        self.parts = [os.path.join(self.payload_dir, name) for name in payload['parts']]
+        self.part_starts = payload['starts']
+        self.loop_size = payload['loop_size']
+        log.info('Using cached ammo payload: %s', self.payload_dir)
+        return True
+
+    def _save_payload(self):
+        payload = {
+            'parts': [os.path.basename(path) for path in self.parts],
+            'starts': self.part_starts,
+            'loop_size': self.loop_size,
+        }
+        # index is written last, payload without index is incomplete
+        with open(os.path.join(self.payload_dir, PAYLOAD_INDEX), 'w') as index_file:
+            json.dump(payload, index_file)
+
+    def _read_ammo(self, imap, ranges, parts_dir):
+        if self.payload_dir:
+            shutil.rmtree(self.payload_dir, ignore_errors=True)
+            os.makedirs(self.payload_dir)
+        tasks = [
+            (start, end, state, os.path.join(parts_dir, 'ammo_%d.bstpd' % i))
+            for i, (start, end, state) in enumerate(ranges)
+        ]
+        for path, count, loop_end in imap(_read_ammo_range, tasks):
+            self.part_starts.append(self.loop_size)
+            self.parts.append(path)
+            self.loop_size += count
+            if loop_end:
+                break
+        log.info('Ammo read in %d parts, %d missiles in loop', len(self.parts), self.loop_size)
+        if self.payload_dir:
+            self._save_payload()
+
+    def _total(self):
+        '''
+        Missiles count and loops count the sequential stepping would end with
+        '''
+        status = info.status
+        lp_len = sum(len(block) for block in self.af.load_plan.blocks())
+        total = lp_len
+        if status.ammo_limit:
+            # sequential stepping writes a missile before limit is checked
+            total = min(total, status.ammo_limit + 1)
+        if status.loop_limit and status.loop_limit * self.loop_size < total:
+            return status.loop_limit * self.loop_size, status.loop_limit
+        return total, (total - 1) // self.loop_size if total else 0
+
+    def _write_missiles(self, imap, f, tmp_dir):
+        total, loop_count = self._total()
+        if hasattr(f, 'name'):
+            expected_file_size = self._expected_size(total)
+            check_free_space(f.name, expected_file_size, expected_file_size)
+        shards = self.workers * SHARDS_PER_WORKER
+        step = total // shards + 1
+        tasks = [
+            (start, min(start + step, total), os.path.join(tmp_dir, 'stpd_%d' % i), self.parts, self.part_starts)
+            for i, start in enumerate(range(0, total, step))
+        ]
+        written = 0
+        for path, count in imap(_write_shard, tasks):
+            with open(path, 'rb') as part:
+                shutil.copyfileobj(part, f)
+            os.remove(path)
+            written += count
+            info.status.set_progress(written, (written - 1) // self.loop_size)
+        info.status.set_progress(total, loop_count)
+
+    def _expected_size(self, total):
+        payload = sum(os.path.getsize(path) for path in self.parts)
+        # header: size, timestamp and marker separated by spaces, both header and missile end with newline
+        per_missile = payload / self.loop_size + len(str(self.af.load_plan.get_duration())) + 8
+        return int(per_missile * total)
+
+
+def _read_ammo_range(task):
+    start, end, state, path = task
+    af = _stepper.af
+    result = {'count': 0, 'loop_end': False}
+
+    def missiles():
+        for ammo in af.ammo_generator.read_range(start, end, state):
+            if ammo is None:
+                result['loop_end'] = True
+                return
+            missile, marker = ammo
+            ammo = (missile, marker or af.marker(missile))
+            if af.filter(ammo):
+                result['count'] += 1
+                yield 0, ammo[1], missile
+
+    ammo = fmt.BinaryStpd(missiles())
+    with open(path, 'wb') as part:
+        part.write(ammo.header())
+        for missile in ammo:
+            part.write(missile)
+        part.write(ammo.footer())
+    return path, result['count'], result['loop_end']
+
+
+def _missiles(start, stop, parts, part_starts):
+    '''
+    (timestamp, marker, missile) for missiles from start to stop, missiles of a loop are saved in parts
+    '''
+    readers = [fmt.BinaryStpdReader(path) for path in parts]
+    loop_size = part_starts[-1] + len(readers[-1])
+    position = 0
+    for block in _stepper.af.load_plan.blocks():
+        block_start = position
+        position += len(block)
+        if position <= start:
+            continue
+        first = max(start, block_start)
+        for i, timestamp in enumerate(block[first - block_start : stop - block_start].tolist(), first):
+            n = i % loop_size
+            part = bisect_right(part_starts, n) - 1
+            _, missile, marker = readers[part][n - part_starts[part]]
+            yield timestamp, marker.encode('utf8'), missile
+        if position >= stop:
+            return
+
+
+def _write_shard(task):
+    start, stop, path, parts, part_starts = task
+    with open(path, 'wb') as part:
+        for chunk in fmt.Stpd(_missiles(start, stop, parts, part_starts)):
+            part.write(chunk)
+    return path, stop - start
@@ -0,0 +1,92 @@
+import fcntl
+import os
+
+import pytest
+
+from yandextank.stepper import info
+from yandextank.stepper.cache import StepperCache
+from yandextank.stepper.tests.test_parallel import make_stepper
+
+MD5 = '0123456789abcdef0123456789abcdef'
+
+
+def make_entry(cache_dir, name, size, mtime):
+    path = os.path.join(str(cache_dir), '%s_%s.stpd' % (name, MD5))
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_evict_lru(tmp_path):
+    old = make_entry(tmp_path, 'old', 100, 1000)
+    kept = make_entry(tmp_path, 'kept', 100, 1001)
+    used = make_entry(tmp_path, 'used', 100, 1002)
+    new = make_entry(tmp_path, 'new', 100, 1003)
+    (tmp_path / 'not_cache.txt').write_bytes(b'x' * 1000)
+    cache = StepperCache(str(tmp_path), 150)
+    cache.touch(used)
+    with open(new + '.lock', 'a') as lock:
+        # another tank is using it
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        cache.evict(keep=[kept])
+    assert [os.path.exists(path) for path in (old, kept, used, new)] == [False, True, False, True]
+    assert (tmp_path / 'not_cache.txt').exists()
+
+
+def test_used_entry_kept(tmp_path):
+    used = make_entry(tmp_path, 'used', 100, 1000)
+    cache = StepperCache(str(tmp_path), 50)
+    entry = cache.use(used)
+    # another tank uses it too
+    other = cache.use(used)
+    cache.evict()
+    assert os.path.exists(used)
+    entry.release()
+    cache.evict()
+    assert os.path.exists(used)
+    other.release()
+    assert not os.path.exists(used + '.lock')
+    cache.evict()
+    assert not os.path.exists(used)
+
+
+def test_used_entry_made_exclusive(tmp_path):
+    path = make_entry(tmp_path, 'ammo', 100, 1000)
+    entry = StepperCache.use(path)
+    entry.exclusive()
+    with open(path + '.lock', 'a') as lock:
+        with pytest.raises(BlockingIOError):
+            fcntl.flock(lock, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        entry.share()
+        fcntl.flock(lock, fcntl.LOCK_SH | fcntl.LOCK_NB)
+    entry.release()
+    assert not os.path.exists(path + '.lock')
+
+
+def test_no_limit(tmp_path):
+    entry = make_entry(tmp_path, 'ammo', 100, 1000)
+    StepperCache(str(tmp_path)).evict()
+    assert os.path.exists(entry)
+
+
+def test_payload_reused(tmp_path, monkeypatch):
+    payload = str(tmp_path / 'ammo.payload')
+    first = tmp_path / 'first.stpd'
+    with open(str(first), 'wb') as f:
+        make_stepper().write(f, payload_dir=payload)
+    assert os.path.exists(os.path.join(payload, 'index.json'))
+
+    schedule = ["line(1,100,20s)"]
+    expected = tmp_path / 'expected.stpd'
+    with open(str(expected), 'wb') as f:
+        make_stepper(rps_schedule=schedule).write(f)
+    expected_count = info.status.ammo_count
+
+    stepper = make_stepper(rps_schedule=schedule)
+    monkeypatch.setattr(stepper.af.ammo_generator, 'split', None)
+    reused = tmp_path / 'reused.stpd'
+    with open(str(reused), 'wb') as f:
+        stepper.write(f, payload_dir=payload)
+    assert reused.read_bytes() == expected.read_bytes()
+    assert info.status.ammo_count == expected_count
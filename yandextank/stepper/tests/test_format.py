@@ -0,0 +1,91 @@
+import os
+import threading
+
+import pytest
+
+from yandextank.common.util import get_test_path
+from yandextank.common.interfaces import TankInfo
+from yandextank.core import TankCore
+from yandextank.stepper import Stepper
+from yandextank.stepper.format import (
+    BinaryStpdReader,
+    StpdReader,
+    binary_to_stpd,
+    stpd_reader,
+    stpd_to_binary,
+)
+from yandextank.stepper.module_exceptions import StpdFileError
+
+EXPECTED_STPD = os.path.join(get_test_path(), 'yandextank/stepper/tests/caseline-expected.stpd')
+
+
+def legacy_missiles(filename):
+    return [(ts, missile, marker) for ts, missile, marker in StpdReader(filename)]
+
+
+def binary_missiles(filename):
+    return [(ts, missile.tobytes(), marker) for ts, missile, marker in BinaryStpdReader(filename)]
+
+
+def test_convert(tmp_path):
+    binary = str(tmp_path / 'ammo.bstpd')
+    legacy = str(tmp_path / 'ammo.stpd')
+    stpd_to_binary(EXPECTED_STPD, binary)
+    assert binary_missiles(binary) == legacy_missiles(EXPECTED_STPD)
+    binary_to_stpd(binary, legacy)
+    assert legacy_missiles(legacy) == legacy_missiles(EXPECTED_STPD)
+
+
+def test_reader(tmp_path):
+    binary = str(tmp_path / 'ammo.bstpd')
+    stpd_to_binary(EXPECTED_STPD, binary)
+    expected = legacy_missiles(EXPECTED_STPD)
+    reader = stpd_reader(binary)
+    assert isinstance(reader, BinaryStpdReader)
+    assert isinstance(stpd_reader(EXPECTED_STPD), StpdReader)
+    assert len(reader) == len(expected)
+    ts, missile, marker = reader[3]
+    assert isinstance(missile, memoryview)
+    assert (ts, missile.tobytes(), marker) == expected[3]
+    timestamp = expected[len(expected) // 2][0]
+    position = reader.seek(timestamp)
+    assert expected[position][0] == timestamp
+    assert position == 0 or expected[position - 1][0] < timestamp
+    assert [(ts, m.tobytes(), mk) for ts, m, mk in reader] == expected[position:]
+
+
+def test_shard_reader(tmp_path):
+    filename = str(tmp_path / 'ammo.bstpd')
+    stpd_to_binary(EXPECTED_STPD, filename)
+    expected = legacy_missiles(EXPECTED_STPD)
+    reader = BinaryStpdReader(filename)
+    shards = [[(ts, bytes(missile), marker) for ts, missile, marker in reader.shard(shard, 3)] for shard in range(3)]
+    for shard in range(3):
+        assert shards[shard] == expected[shard::3]
+
+
+def test_stepper_binary(tmp_path):
+    kwargs = dict(
+        rps_schedule=["const(10,10s)"],
+        http_ver="1.1",
+        instances_schedule=None,
+        instances=10,
+        loop_limit=1000,
+        ammo_limit=1000,
+        enum_ammo=False,
+        ammo_type='caseline',
+        ammo_file=os.path.join(get_test_path(), 'yandextank/stepper/tests/test-caseline.txt'),
+    )
+    binary = str(tmp_path / 'ammo.bstpd')
+    with open(binary, 'wb') as f:
+        Stepper(TankCore([{}], threading.Event(), TankInfo({})), stpd_format='binary', **kwargs).write(f)
+    assert binary_missiles(binary) == legacy_missiles(EXPECTED_STPD)
+
+
+def test_not_binary(tmp_path):
+    empty = tmp_path / 'empty.bstpd'
+    empty.write_bytes(b'')
+    with pytest.raises(StpdFileError):
+        BinaryStpdReader(str(empty))
+    with pytest.raises(StpdFileError):
+        BinaryStpdReader(EXPECTED_STPD)
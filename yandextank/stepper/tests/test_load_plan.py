@@ -2,6 +2,7 @@ import io
 import os
 import threading
 
+import numpy as np
 import pytest
 
 from yandextank.stepper.main import LoadProfile
@@ -268,3 +269,47 @@ def test_loop_limit(stepper_kwargs, expected_stpd):
 def test_load_profile(load_type, schedule, expected):
     schedule = LoadProfile(load_type, schedule).schedule
     assert schedule == expected
+
+
+@pytest.mark.parametrize(
+    'plan, expected',
+    [
+        (Const(7, 3000), [int(i * 1000.0 / 7) for i in range(21)]),
+        (Line(1, 100, 60000), None),
+        (Line(100, 1, 60000), None),
+        (Line(10, 10, 5000), None),
+    ],
+)
+def test_blocks_same_as_scalar(plan, expected):
+    if expected is None:
+        expected = [plan.ts(n) for n in range(len(plan))]
+    blocks = list(plan.blocks(block_size=100))
+    assert all(block.dtype == np.int64 and len(block) <= 100 for block in blocks)
+    assert np.concatenate(blocks).tolist() == expected
+    assert list(plan) == expected
+
+
+def test_composite_blocks():
+    plan = Composite([Const(10, 2000), Line(1, 10, 3000), Stairway(5, 15, 5, 1000)])
+    blocks = plan.blocks(block_size=7)
+    assert not isinstance(blocks, list), "Blocks should be generated lazily"
+    base = 0
+    expected = []
+    for step in plan.steps:
+        expected += [ts + base for ts in step]
+        base += step.get_duration()
+    assert np.concatenate(list(blocks)).tolist() == expected
+
+
+@pytest.mark.benchmark(group='load plan')
+@pytest.mark.parametrize('method', ['scalar', 'blocks'])
+def test_line_benchmark(benchmark, method):
+    plan = Line(1, 100000, 60000)
+
+    def scalar():
+        return [plan.ts(n) for n in range(len(plan))]
+
+    def blocks():
+        return list(plan.blocks())
+
+    benchmark.pedantic(locals()[method], rounds=3)
@@ -0,0 +1,104 @@
+import io
+import os
+import threading
+
+import pytest
+
+from yandextank.common.util import get_test_path
+from yandextank.common.interfaces import TankInfo
+from yandextank.core import TankCore
+from yandextank.stepper import Stepper
+from yandextank.stepper import info
+from yandextank.stepper.missile import AmmoFileReader, UriReader
+from yandextank.stepper.parallel import unsupported_reason
+
+TEST_DIR = os.path.join(get_test_path(), 'yandextank/stepper/tests')
+
+
+def make_stepper(**kwargs):
+    config = dict(
+        rps_schedule=["const(10,10s)", "line(1,50,10s)"],
+        http_ver="1.1",
+        instances_schedule=None,
+        instances=10,
+        loop_limit=-1,
+        ammo_limit=-1,
+        enum_ammo=False,
+        ammo_file=os.path.join(TEST_DIR, 'test-ammo.txt'),
+    )
+    config.update(kwargs)
+    return Stepper(TankCore([{}], threading.Event(), TankInfo({})), **config)
+
+
+def step(tmp_path, workers, **kwargs):
+    stpd = tmp_path / ('%d.stpd' % workers)
+    with open(str(stpd), 'wb') as f:
+        make_stepper(**kwargs).write(f, workers=workers)
+    return stpd.read_bytes(), info.status.ammo_count, info.status.loop_count
+
+
+@pytest.mark.parametrize(
+    'kwargs',
+    [
+        {},
+        {'ammo_limit': 25},
+        {'loop_limit': 2},
+        {'ammo_type': 'caseline', 'ammo_file': os.path.join(TEST_DIR, 'test-caseline.txt')},
+        {'ammo_type': 'uri', 'ammo_file': os.path.join(TEST_DIR, 'test-unicode.txt'), 'headers': ['[Host: ya.ru]']},
+        {'autocases': 2},
+    ],
+)
+def test_same_as_sequential(tmp_path, kwargs):
+    assert step(tmp_path, 3, **kwargs) == step(tmp_path, 1, **kwargs)
+
+
+def test_split(tmp_path):
+    ammo = AmmoFileReader(os.path.join(TEST_DIR, 'test-ammo.txt'))
+    ranges = ammo.split(7)
+    assert [start for start, _, _ in ranges] == [0, 611, 708]
+    assert [end for _, end, _ in ranges[:-1]] == [start for start, _, _ in ranges[1:]]
+    missiles = [missile for start, end, state in ranges for missile in ammo.read_range(start, end, state)]
+    assert [marker for _, marker in missiles] == [b'case1', b'case2', b'case3']
+    assert missiles == list(ammo.read_range(0, ranges[-1][1]))
+
+    # blank lines between chunks
+    spaced_ammo = tmp_path / 'spaced.txt'
+    spaced_ammo.write_bytes(b''.join(b'%d %d\n%s\n\n' % (len(missile), i, missile) for i, (missile, _) in enumerate(missiles * 10)))
+    spaced = AmmoFileReader(str(spaced_ammo))
+    ranges = spaced.split(7)
+    assert len(ranges) == 7
+    missiles = [missile for start, end, state in ranges for missile in spaced.read_range(start, end, state)]
+    assert [int(marker) for _, marker in missiles] == list(range(30))
+
+    uri_ammo = tmp_path / 'uri.txt'
+    uri_ammo.write_bytes(b'[Host: a]\n[Accept: */*]\n/1\n/2\n/3\n')
+    uris = UriReader(str(uri_ammo))
+    ranges = uris.split(4)
+    assert [start for start, _, _ in ranges] == [0, 10, 24, 27]
+    assert [len(state) for _, _, state in ranges] == [0, 1, 2, 2]
+    missiles = [missile for start, end, state in ranges for missile in uris.read_range(start, end, state)]
+    assert [missile for missile, _ in missiles] == [missile for missile, _ in uris.read_range(0, ranges[-1][1])]
+    # these headers apply to /1 in the next loops
+    uri_ammo.write_bytes(b'/1\n[Host: b]\n/2\n')
+    assert UriReader(str(uri_ammo)).split(4) is None
+
+
+def test_headers_after_uris(tmp_path):
+    ammo = tmp_path / 'uri.txt'
+    ammo.write_bytes(b'/a\n[Host: x]\n/b\n')
+    kwargs = dict(ammo_type='uri', ammo_file=str(ammo), rps_schedule=['const(10,2s)'])
+    expected = io.BytesIO()
+    make_stepper(**kwargs).write(expected)
+    assert expected.getvalue().count(b'GET /a HTTP/1.1\r\nHost: x\r\n') == 9
+    for write_kwargs in ({'payload_dir': str(tmp_path / 'payload')}, {'workers': 3}):
+        out = io.BytesIO()
+        make_stepper(**kwargs).write(out, **write_kwargs)
+        assert out.getvalue() == expected.getvalue()
+
+
+def test_fallback(tmp_path):
+    assert unsupported_reason(make_stepper(enum_ammo=True)) == 'marker depends on missiles order'
+    assert unsupported_reason(make_stepper(stpd_format='binary')) == 'only text stpd is supported'
+    out = io.BytesIO()
+    make_stepper(enum_ammo=True).write(out, workers=2)
+    assert out.getvalue() == step(tmp_path, 1, enum_ammo=True)[0]
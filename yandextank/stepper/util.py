@@ -5,9 +5,11 @@ Utilities: parsers, converters, etc.
 import re
 import logging
 import math
+import os
+import shutil
 from itertools import islice
 
-from .module_exceptions import StepperConfigurationError
+from .module_exceptions import DiskLimitError, StepperConfigurationError
 
 logging.getLogger("requests").setLevel(logging.WARNING)
 
@@ -71,3 +73,16 @@ def proper_round(n):
     :param n: float
     """
     return int(n) + (n / abs(n)) * int(abs(n - int(n)) >= 0.5) if n != 0 else 0
+
+
+def check_free_space(filename, need_bytes, expected_file_size):
+    '''
+    Raise DiskLimitError if file system of filename has no space for need_bytes more
+    '''
+    available_bytes = shutil.disk_usage(os.path.dirname(os.path.abspath(filename))).free
+    reserve = 10 * 000 * 000  # 10 мегабайт
+    if available_bytes < need_bytes + reserve:
+        raise DiskLimitError(
+            'File system has not enough free space for ammo file. '
+            f'Ammo file expected file size is {expected_file_size} bytes.'
+        )
@@ -79,6 +79,7 @@ PHANTOM_SCHEMA_V_G = {
                     'ignore_lock': False,
                     'debug': False,
                     'aggregator_max_termination_timeout': 60,
+                    'aggregator_histogram_digits': 0,
                     'aggregator_max_wait': 31,
                     'skip_generator_check': False,
                 },
@@ -124,6 +125,7 @@ PHANTOM_SCHEMA_V_G = {
                     'ammofile': '',
                     'autocases': 0,
                     'cache_dir': None,
+                    'cache_size_limit': 0,
                     'chosen_cases': '',
                     'client_certificate': '',
                     'client_cipher_suites': '',
@@ -131,6 +133,7 @@ PHANTOM_SCHEMA_V_G = {
                     'connection_test': True,
                     'file_cache': 8192,
                     'force_stepping': 0,
+                    'stepping_workers': 1,
                     'headers': [],
                     'loop': -1,
                     'port': '',
@@ -187,6 +190,7 @@ PHANTOM_SCHEMA_V_G = {
                     'ammofile': '',
                     'autocases': 0,
                     'cache_dir': None,
+                    'cache_size_limit': 0,
                     'chosen_cases': '',
                     'client_certificate': '',
                     'client_cipher_suites': '',
@@ -194,6 +198,7 @@ PHANTOM_SCHEMA_V_G = {
                     'connection_test': True,
                     'file_cache': 8192,
                     'force_stepping': 0,
+                    'stepping_workers': 1,
                     'headers': [],
                     'port': '',
                     'use_caching': True,
@@ -209,6 +214,7 @@ PHANTOM_SCHEMA_V_G = {
                     'ignore_lock': False,
                     'debug': False,
                     'aggregator_max_termination_timeout': 60,
+                    'aggregator_histogram_digits': 0,
                     'aggregator_max_wait': 31,
                     'skip_generator_check': False,
                 },
@@ -353,6 +359,7 @@ def test_load_multiple(configs, expected):
                     'ignore_lock': False,
                     'debug': False,
                     'aggregator_max_termination_timeout': 60,
+                    'aggregator_histogram_digits': 0,
                     'aggregator_max_wait': 31,
                     'skip_generator_check': False,
                 },
@@ -398,6 +405,7 @@ def test_load_multiple(configs, expected):
                     'ammofile': '',
                     'autocases': 0,
                     'cache_dir': None,
+                    'cache_size_limit': 0,
                     'chosen_cases': '',
                     'client_certificate': '',
                     'client_cipher_suites': '',
@@ -405,6 +413,7 @@ def test_load_multiple(configs, expected):
                     'connection_test': True,
                     'file_cache': 8192,
                     'force_stepping': 0,
+                    'stepping_workers': 1,
                     'headers': [],
                     'loop': -1,
                     'port': '',